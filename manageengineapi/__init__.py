@@ -1,5 +1,10 @@
+__version__ = '0.1'
+
 from .manageengineapi import NFApi
 from .ipgroup import IPNetwork, IPRange, IPGroup
-from .billing import BillPlan
-from .device import Device
-
+from .billing import BillPlan, BillingIndex
+from .device import Device, DeviceRegistry
+from .ratelimit import AdaptiveLimiter
+from .retry import RetryPolicy
+from .snapshot import Snapshot
+from .query import StatQuery
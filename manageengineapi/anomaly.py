@@ -0,0 +1,240 @@
+'''
+Online anomaly detection for IP group traffic. Each watched series keeps a fixed amount
+of state (an exponentially weighted mean and variance, optionally one per time-of-day
+slot) that is updated in constant time per sample, so thousands of groups can be
+watched from a single collector process instead of post-processing daily dumps.
+
+Usage::
+
+    monitor = AnomalyMonitor(on_anomaly=print)
+    for group in session.get_ip_groups():
+        monitor.add_series(group.ID, series_points(session.get_group_traffic_data(group.ID, payload)), unit=1000)
+'''
+
+from __future__ import division
+from .query import point_time
+from collections import namedtuple, deque
+import math
+import threading
+
+#Detected deviation: series key, sample time and value, baseline mean and z-score
+Anomaly = namedtuple('Anomaly', ('key', 'timestamp', 'value', 'expected', 'score'))
+
+
+class _Baseline(object):
+    '''Exponentially weighted mean and variance.'''
+
+    __slots__ = ('mean', 'var', 'count')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def score(self, value, min_std):
+        std = max(math.sqrt(self.var), min_std)
+        return (value - self.mean) / std if std else 0.0
+
+    def update(self, value, alpha):
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        #Plain average until 1/alpha samples, so early samples aren't overweighted
+        rate = max(alpha, 1.0 / self.count)
+        diff = value - self.mean
+        increment = rate * diff
+        self.mean += increment
+        self.var = (1 - rate) * (self.var + diff * increment)
+
+
+class EWMADetector(object):
+    '''
+    Flags samples more than threshold standard deviations away from an
+    exponentially weighted baseline. Anomalous samples are folded in clipped to
+    the threshold, so a spike doesn't drag the baseline along with it while a
+    lasting level shift is still learned.
+
+    :param alpha: weight of newest sample, smaller adapts slower
+    :type alpha: float
+    :param threshold: z-score above which a sample is anomalous
+    :type threshold: float
+    :param warmup: samples seen before anything is flagged
+    :type warmup: int
+    :param min_std: floor for standard deviation, keeps flat series from
+        flagging tiny changes
+    :type min_std: float
+    '''
+
+    __slots__ = ('alpha', 'threshold', 'warmup', 'min_std', '_baseline', 'last_score')
+
+    def __init__(self, alpha=0.05, threshold=4.0, warmup=20, min_std=1.0):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_std = min_std
+        self._baseline = _Baseline()
+        self.last_score = None
+
+    def __repr__(self):
+        return '<EWMADetector - Mean:{0:.4g} Samples:{1}>'.format(
+            self._baseline.mean,
+            self._baseline.count
+        )
+
+    def _baseline_for(self, timestamp):
+        return self._baseline
+
+    def update(self, timestamp, value):
+        '''
+        Fold one sample in.
+
+        :param timestamp: epoch seconds
+        :type timestamp: float
+        :param value: sample value
+        :type value: float
+        :returns: (expected value, z-score, whether sample is anomalous)
+        :rtype: tuple
+        '''
+
+        baseline = self._baseline_for(timestamp)
+        expected = baseline.mean
+        ready = baseline.count >= self.warmup
+        score = baseline.score(value, self.min_std) if ready else 0.0
+        self.last_score = score if ready else None
+
+        anomalous = ready and abs(score) > self.threshold
+        if anomalous:
+            std = max(math.sqrt(baseline.var), self.min_std)
+            value = expected + math.copysign(self.threshold * std, score)
+        baseline.update(value, self.alpha)
+        return expected, score, anomalous
+
+
+class SeasonalDetector(EWMADetector):
+    '''
+    EWMADetector with a separate baseline per slot of a repeating period, IE: one
+    per hour of the day, so the nightly dip and the morning peak are both normal.
+    State is one baseline per slot no matter how long the series runs.
+
+    :param period: season length in seconds
+    :type period: int
+    :param slot: slot length in seconds, period must be a multiple of it
+    :type slot: int
+
+    Other arguments are those of EWMADetector. warmup counts samples per slot.
+    '''
+
+    __slots__ = ('period', 'slot', '_slots')
+
+    def __init__(self, period=86400, slot=3600, alpha=0.2, threshold=4.0, warmup=24, min_std=1.0):
+        if period % slot:
+            raise ValueError('SeasonalDetector period must be a multiple of slot')
+        EWMADetector.__init__(self, alpha, threshold, warmup, min_std)
+        self.period = period
+        self.slot = slot
+        self._slots = [_Baseline() for _ in range(period // slot)]
+
+    def __repr__(self):
+        return '<SeasonalDetector - Slots:{0} Samples:{1}>'.format(
+            len(self._slots),
+            sum(b.count for b in self._slots)
+        )
+
+    def _baseline_for(self, timestamp):
+        return self._slots[int(timestamp % self.period // self.slot)]
+
+
+class AnomalyMonitor(object):
+    '''
+    Detectors for many series keyed by name, IE: IP group ID. Samples at or before
+    the newest timestamp already seen for a series are skipped, so overlapping
+    polls (IE: TimeFrame 'today' every five minutes) can be fed in whole.
+
+    :param detector: callable returning a new detector for a series
+    :type detector: function
+    :param on_anomaly: callable receiving each Anomaly as it is detected
+    :type on_anomaly: function
+    :param keep: most recent anomalies kept in recent
+    :type keep: int
+    '''
+
+    def __init__(self, detector=EWMADetector, on_anomaly=None, keep=1000):
+        self.detector = detector
+        self.on_anomaly = on_anomaly
+        self.keep = keep
+        self.detectors = {}
+        self.recent = deque(maxlen=keep)
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<AnomalyMonitor - Series:{0} Anomalies:{1}>'.format(
+            len(self.detectors),
+            len(self.recent)
+        )
+
+    def add(self, key, timestamp, value):
+        '''
+        Fold one sample into series key.
+
+        :returns: Anomaly or None
+        '''
+
+        with self._lock:
+            latest = self._latest.get(key)
+            if latest is not None and timestamp <= latest:
+                return None
+            self._latest[key] = timestamp
+
+            detector = self.detectors.get(key)
+            if detector is None:
+                detector = self.detectors[key] = self.detector()
+            expected, score, anomalous = detector.update(timestamp, value)
+            if not anomalous:
+                return None
+
+            anomaly = Anomaly(key, timestamp, value, expected, score)
+            self.recent.append(anomaly)
+
+        if self.on_anomaly is not None:
+            self.on_anomaly(anomaly)
+        return anomaly
+
+    def add_series(self, key, points, timestamp=point_time, value=lambda p: p[1], unit=1):
+        '''
+        Fold data points as returned by get_group_traffic_data/get_group_traffic_series.
+
+        :param key: series key
+        :param points: list of data points, oldest first
+        :type points: list
+        :param timestamp: callable extracting timestamp from a point
+        :type timestamp: function
+        :param value: callable extracting value from a point
+        :type value: function
+        :param unit: timestamp units per second, 1000 for epoch milliseconds
+        :type unit: int
+        :returns: anomalies found in points
+        :rtype: list
+        '''
+
+        found = []
+        for point in points:
+            anomaly = self.add(key, timestamp(point) / unit, float(value(point)))
+            if anomaly is not None:
+                found.append(anomaly)
+        return found
+
+    def forget(self, keys):
+        '''Drop detectors of series that no longer exist.'''
+
+        with self._lock:
+            for key in keys:
+                self.detectors.pop(key, None)
+                self._latest.pop(key, None)
+
+    def scores(self):
+        '''Latest z-score per series, None while warming up.'''
+
+        with self._lock:
+            return dict((key, d.last_score) for key, d in self.detectors.items())
@@ -0,0 +1,292 @@
+'''
+Transactional batches of IP group and bill plan changes. Operations are ordered by
+dependency (groups are created before plans that reference them, plans stop referencing
+groups before those are deleted), independent operations run concurrently, and the
+server copy of every touched object is snapshotted first so a failure rolls completed
+operations back instead of leaving NFA half reconfigured.
+
+Usage::
+
+    batch = Batch(session)
+    batch.add(new_group)
+    plan.link_groups([new_group, existing_group])
+    batch.modify(plan)
+    batch.delete(old_group)
+    result = batch.apply()
+    if not result.ok:
+        print(result.error, result.rollback_errors)
+
+Rollback is best effort: objects deleted by the batch are added back with their old
+definition, but NFA assigns them new IDs. Bill plans restored by the rollback are linked
+to the new IDs of groups added back before them.
+'''
+
+from .ipgroup import IPGroup
+from .billing import BillPlan
+from .exceptions import NFApiError
+from concurrent.futures import ThreadPoolExecutor
+import copy
+
+ADD = 'add'
+MODIFY = 'modify'
+DELETE = 'delete'
+
+
+class BatchError(NFApiError):
+    '''Operation of a batch failed, carries the operation and server response.'''
+
+    def __init__(self, operation, response):
+        NFApiError.__init__(self, '{0} failed: {1}'.format(operation, response))
+        self.operation = operation
+        self.response = response
+
+
+class Operation(object):
+    '''
+    One step of a batch.
+
+    :param action: 'add', 'modify' or 'delete'
+    :type action: str
+    :param obj: IPGroup or BillPlan
+    '''
+
+    def __init__(self, action, obj):
+        self.action = action
+        self.obj = obj
+        self.kind = 'ipgroup' if isinstance(obj, IPGroup) else 'billplan'
+        self.response = None
+
+        #Server copy before the batch ran, None for adds
+        self.prior = None
+
+    def __repr__(self):
+        return '<Operation - {0} {1} Name:{2}>'.format(self.action, self.kind, self.obj.name)
+
+
+class BatchResult(object):
+    '''Outcome of Batch.apply.'''
+
+    def __init__(self):
+        self.applied = []
+        self.error = None
+        self.rolled_back = []
+        self.rollback_errors = []
+
+    def __repr__(self):
+        return '<BatchResult - OK:{0} Applied:{1} RolledBack:{2}>'.format(
+            self.ok,
+            len(self.applied),
+            len(self.rolled_back)
+        )
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _failed(response):
+    #add/modify/delete answer JSON with an error key, delete_ip_group answers plain text
+    if isinstance(response, dict):
+        return bool(response.get('error'))
+    return 'success' not in str(response).lower()
+
+
+class Batch(object):
+    '''
+    Collects operations and applies them as one unit.
+
+    :param session: logged in API session. With workers above 1 it should be
+        created with thread_safe=True.
+    :type session: manageengineapi.NFApi
+    :param workers: concurrent requests within a phase
+    :type workers: int
+    '''
+
+    def __init__(self, session, workers=4):
+        self.session = session
+        self.workers = workers
+        self.operations = []
+
+    def __repr__(self):
+        return '<Batch - Operations:{0}>'.format(len(self.operations))
+
+    def _queue(self, action, obj):
+        if not isinstance(obj, (IPGroup, BillPlan)):
+            raise TypeError('Batch operations take IPGroup or BillPlan objects')
+        self.operations.append(Operation(action, obj))
+
+    def add(self, obj):
+        '''Queue adding an IPGroup or BillPlan.'''
+
+        self._queue(ADD, obj)
+
+    def modify(self, obj):
+        '''Queue modifying an IPGroup or BillPlan.'''
+
+        self._queue(MODIFY, obj)
+
+    def delete(self, obj):
+        '''Queue deleting an IPGroup or BillPlan.'''
+
+        self._queue(DELETE, obj)
+
+    def phases(self):
+        '''
+        Operations grouped in the order they run. Operations within one phase
+        don't depend on each other.
+
+        :rtype: list
+        '''
+
+        groups_in = [o for o in self.operations if o.kind == 'ipgroup' and o.action != DELETE]
+        plans = [o for o in self.operations if o.kind == 'billplan']
+        groups_out = [o for o in self.operations if o.kind == 'ipgroup' and o.action == DELETE]
+        return [phase for phase in (groups_in, plans, groups_out) if phase]
+
+    #=================================================================
+    # Applying
+    #=================================================================
+
+    def _snapshot(self):
+        #One list call per touched kind, copies so later edits can't reach them
+        kinds = set(o.kind for o in self.operations if o.action != ADD)
+        current = {}
+        if 'ipgroup' in kinds:
+            current['ipgroup'] = dict((g.name, g) for g in self.session.get_ip_groups())
+        if 'billplan' in kinds:
+            current['billplan'] = dict((str(p.plan_id), p) for p in self.session.get_bill_plans())
+
+        for operation in self.operations:
+            if operation.action == ADD:
+                continue
+            key = operation.obj.name if operation.kind == 'ipgroup' else str(operation.obj.plan_id)
+            prior = current[operation.kind].get(key)
+            if prior is None:
+                raise LookupError('{0} {1} does not exist on server'.format(operation.kind, key))
+            operation.prior = copy.deepcopy(prior)
+
+    def _call(self, action, kind, obj):
+        session = self.session
+        if kind == 'ipgroup':
+            if action == ADD:
+                return session.add_ip_group(obj)
+            if action == MODIFY:
+                return session.modify_ip_group(obj, force=True)
+            return session.delete_ip_group(obj)
+        if action == ADD:
+            return session.add_bill_plan(obj)
+        if action == MODIFY:
+            return session.modify_bill_plan(obj, force=True)
+        return session.delete_bill_plan(obj)
+
+    def _run(self, operation):
+        try:
+            response = self._call(operation.action, operation.kind, operation.obj)
+        except Exception as e:
+            return operation, e
+        operation.response = response
+        if _failed(response):
+            return operation, BatchError(operation, response)
+        return operation, None
+
+    def _relink(self, added):
+        #Plans linked to group objects added in this batch get their new IDs
+        for operation in self.operations:
+            if operation.kind == 'billplan' and operation.action != DELETE and \
+                    any(g in added for g in operation.obj.ip_groups):
+                operation.obj.link_groups(operation.obj.ip_groups)
+
+    def _readd_group(self, prior, readded):
+        #Server hands out new IDs, for the base group and for any sub-groups
+        old_ids = [str(g.ID) for g in [prior] + list(prior.parts)]
+        prior.ID = None
+        prior.parts = []
+        response = self._call(ADD, 'ipgroup', prior)
+        if _failed(response):
+            return response
+        if prior.ID is None:
+            raise LookupError('IP group {0} was added back but its new ID was not found'.format(prior.name))
+        for gid in old_ids:
+            readded[gid] = prior
+        return response
+
+    def _relink_prior(self, plan, readded):
+        #Swap IDs of groups deleted and added back for their new ones
+        if not any(gid in readded for gid in plan.ipg_ids):
+            return
+        ids = []
+        linked = set()
+        for gid in plan.ipg_ids:
+            group = readded.get(gid)
+            if group is None:
+                ids.append(gid)
+            elif id(group) not in linked:
+                linked.add(id(group))
+                ids.extend(str(g.ID) for g in [group] + list(group.parts))
+        plan.ipg_id = ','.join(ids)
+
+    def _undo(self, operation, readded):
+        obj, prior = operation.obj, operation.prior
+        if operation.action == ADD:
+            return self._call(DELETE, operation.kind, obj)
+        if operation.kind == 'billplan':
+            self._relink_prior(prior, readded)
+        elif operation.action == DELETE:
+            return self._readd_group(prior, readded)
+        if operation.action == MODIFY:
+            return self._call(MODIFY, operation.kind, prior)
+        return self._call(ADD, operation.kind, prior)
+
+    def rollback(self, applied, result):
+        '''
+        Undo applied operations, newest first. Group deletes ran last, so deleted
+        groups are added back before plans that referenced them are restored.
+        Failures are collected, not raised.
+        '''
+
+        readded = {}
+        for operation in reversed(applied):
+            try:
+                response = self._undo(operation, readded)
+                if _failed(response):
+                    raise BatchError(operation, response)
+                result.rolled_back.append(operation)
+            except Exception as e:
+                result.rollback_errors.append((operation, e))
+
+    def apply(self):
+        '''
+        Snapshot touched objects, run all phases and roll back on the first failure.
+        The phase a failure happens in is finished before rolling back, so no
+        request is left in flight.
+
+        :rtype: manageengineapi.batch.BatchResult
+        '''
+
+        result = BatchResult()
+        try:
+            self._snapshot()
+        except Exception as e:
+            result.error = e
+            return result
+
+        added = set()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            for phase in self.phases():
+                failure = None
+                for operation, error in pool.map(self._run, phase):
+                    if error is None:
+                        result.applied.append(operation)
+                        if operation.kind == 'ipgroup' and operation.action == ADD:
+                            added.add(operation.obj)
+                    elif failure is None:
+                        failure = error
+
+                if failure is not None:
+                    result.error = failure
+                    self.rollback(result.applied, result)
+                    return result
+
+                if added:
+                    self._relink(added)
+        return result
@@ -0,0 +1,387 @@
+'''
+Benchmark and profiling harness for the NFApi client. Drives the public NFApi methods
+and the IPGroup parser against synthetic or recorded responses, so no NFA server is
+needed, and writes a JSON report that can be compared across package versions.
+
+Usage::
+
+    python -m manageengineapi.bench --groups 2000 --output bench.json
+    python -m manageengineapi.bench --mode cprofile --recorded ./responses
+    python -m manageengineapi.bench --mode tracemalloc
+    python -m manageengineapi.bench --cassette nfa.cassette.json
+
+Recorded response directories hold one file per endpoint, named after the last part
+of its URI (IE: listIPGroup.json, listBillPlan.json, listDevForMultiSel.json). Cassettes
+written by transport.RecordingAdapter can be used as well.
+'''
+
+from __future__ import print_function, division
+from . import __version__
+from .manageengineapi import NFApi
+from .ipgroup import IPGroup, IPNetwork
+from .billing import BillPlan
+import argparse
+import cProfile
+import gc
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+import requests
+
+try:
+    import tracemalloc
+except ImportError:
+    #Python 2.x has no tracemalloc
+    tracemalloc = None
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    #Python 2.x
+    from urlparse import urlsplit
+
+
+#=================================================================
+# Synthetic responses
+#=================================================================
+
+def synthetic_ip_groups(groups, entries=4):
+    '''
+    listIPGroup response body with given number of groups, each with entries
+    IP definitions mixing networks, addresses and ranges.
+
+    :rtype: dict
+    '''
+
+    ipg_list = []
+    for g in range(groups):
+        ips = []
+        for e in range(entries):
+            octet = '10.{0}.{1}'.format((g >> 8) & 255, g & 255)
+            kind = e % 3
+            if kind == 0:
+                ips.append(['IPNetwork', 'Include', '{0}.{1}'.format(octet, e * 16), '255.255.255.240'])
+            elif kind == 1:
+                ips.append(['IPAddress', 'Include', '{0}.{1}'.format(octet, e)])
+            else:
+                ips.append(['IPRange', 'Exclude', '{0}.{1} to {0}.{2}'.format(octet, e, e + 8),
+                            '255.255.255.0'])
+        ipg_list.append({
+            'app': 'All',
+            'dscp': 'All',
+            'base': {
+                'Name': 'bench-group-{0}'.format(g),
+                'desc': 'synthetic group',
+                'speed': 10000000,
+                'status': 'Enabled',
+                'ID': 2500000 + g,
+            },
+            'Asso_Device': 'All Interfaces',
+            'Asso_Dev_id': -1,
+            'ip': ips,
+        })
+    return {'IPGroup_List': ipg_list}
+
+
+def synthetic_bill_plans(plans, groups):
+    '''listBillPlan response body with plans spread over groups.'''
+
+    bp_list = []
+    for p in range(plans):
+        bp_list.append({
+            'name': 'bench-plan-{0}'.format(p),
+            'desc': 'synthetic plan',
+            'coustunit': 'USD',
+            'period': 'monthly',
+            'billDate': 1,
+            'tzone': 'US/Eastern',
+            'basespd1': 500000,
+            'basecost1': 50,
+            'addspd1': 50,
+            'addcost1': 100,
+            'type': 'speed',
+            'perc': 40,
+            'bussList': '',
+            'emailid': 'bench@example.com',
+            'emailSubject': 'bench',
+            'planid': 1000 + p,
+            'ipgList': [['bench-group-{0}'.format(g), 2500000 + g]
+                        for g in range(p % max(groups, 1), groups, max(plans, 1))],
+        })
+    return {'bpList': bp_list}
+
+
+def synthetic_devices(devices, interfaces=48):
+    '''listDevForMultiSel response body.'''
+
+    return [
+        {
+            'rName': 'bench-router-{0}'.format(d),
+            'rIP': '192.0.{0}.{1}'.format(d >> 8 & 255, d & 255),
+            'interface': [[str(d * 1000 + i), 'Gi0/{0}'.format(i)] for i in range(interfaces)],
+        }
+        for d in range(devices)
+    ]
+
+
+class BenchSession(object):
+    '''
+    Stand-in for requests.Session answering NFApi calls from canned bodies
+    keyed by URI path.
+    '''
+
+    def __init__(self, bodies):
+        self.bodies = dict((uri, self._encode(body)) for uri, body in bodies.items())
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.headers = {}
+
+    @staticmethod
+    def _encode(body):
+        if isinstance(body, bytes):
+            return body
+        return json.dumps(body).encode('utf-8')
+
+    def _respond(self, url):
+        path = '/' + url.split('://', 1)[-1].split('/', 1)[-1].split('?')[0]
+        body = self.bodies.get(path, b'{"message": "ok"}')
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.raw = io.BytesIO(body)
+
+        #Body is already read, streamed reads iterate over _content like a downloaded response
+        response._content = body
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        return response
+
+    def get(self, url, **kwargs):
+        return self._respond(url)
+
+    def post(self, url, **kwargs):
+        return self._respond(url)
+
+
+def load_recorded(directory):
+    '''Canned bodies keyed by URI from a directory of recorded responses.'''
+
+    bodies = {}
+    for uri in (NFApi.LISTIPGROUP_URI, NFApi.LISTBILLPLAN_URI, NFApi.LISTDEVLIST_URI,
+                NFApi.CONVERSATION_URI, NFApi.TRAFFICDATA_URI):
+        path = os.path.join(directory, uri.rsplit('/', 1)[-1] + '.json')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                bodies[uri] = f.read()
+    return bodies
+
+
+def load_cassette(path):
+    '''Canned bodies keyed by URI from the GET exchanges of a recorded cassette.'''
+
+    from .transport import Cassette
+
+    bodies = {}
+    for exchange in Cassette.load(path).exchanges:
+        uri = urlsplit(exchange['url']).path
+        if exchange['method'] == 'GET' and uri.startswith('/api/') and 'text' in exchange['body']:
+            bodies[uri] = exchange['body']['text'].encode('utf-8')
+    return bodies
+
+
+def bench_session(bodies, **kwargs):
+    '''NFApi instance logged in against canned bodies.'''
+
+    session = NFApi('bench.invalid', 'bench-api-key', 'bench', 'bench', **kwargs)
+    session.request = BenchSession(bodies)
+    session.logged_in = True
+    return session
+
+
+#=================================================================
+# Benchmarks
+#=================================================================
+
+def _cases(session, bodies):
+    '''Named zero-argument callables and number of parsed groups per call.'''
+
+    ipg_list = json.loads(BenchSession._encode(bodies[NFApi.LISTIPGROUP_URI]).decode('utf-8'))['IPGroup_List']
+    groups = len(ipg_list)
+
+    def parse_groups():
+        for ipg in ipg_list:
+            IPGroup().process_api_group_list(ipg['ip'])
+
+    group = IPGroup(name='bench-add', speed=1000)
+    for i in range(256):
+        group.add_ip(IPNetwork(u'172.16.{0}.0/24'.format(i)))
+    plan = BillPlan(name='bench-plan', base_speed=1, base_cost=1, add_speed=1, add_cost=1)
+
+    return [
+        ('process_api_group_list', parse_groups, groups),
+        ('get_ip_groups', session.get_ip_groups, groups),
+        ('get_bill_plans', session.get_bill_plans, 0),
+        ('get_dev_list', session.get_dev_list, 0),
+        ('get_billing_index', session.get_billing_index, groups),
+        #Adds alone, without the list download capturing the new ID
+        ('add_ip_group', lambda: session.add_ip_group(group, capture_id=False), 0),
+        ('modify_ip_group', lambda: session.modify_ip_group(group, force=True), 0),
+        ('add_bill_plan', lambda: session.add_bill_plan(plan, capture_id=False), 0),
+    ]
+
+
+def run_time(func, repeat):
+    '''Wall clock per call over repeat calls.'''
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter() if hasattr(time, 'perf_counter') else time.time()
+        func()
+        ended = time.perf_counter() if hasattr(time, 'perf_counter') else time.time()
+        samples.append(ended - started)
+    samples.sort()
+    return {
+        'calls': repeat,
+        'min': samples[0],
+        'median': samples[len(samples) // 2],
+        'mean': sum(samples) / len(samples),
+        'max': samples[-1],
+    }
+
+
+def run_cprofile(func, repeat, top=15):
+    '''cProfile totals and most expensive functions by cumulative time.'''
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for _ in range(repeat):
+        func()
+    profiler.disable()
+
+    stats = pstats.Stats(profiler, stream=io.StringIO() if sys.version_info[0] > 2 else io.BytesIO())
+    rows = []
+    for (filename, line, name), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            'function': '{0}:{1}({2})'.format(os.path.basename(filename), line, name),
+            'calls': nc,
+            'tottime': tt,
+            'cumtime': ct,
+        })
+    rows.sort(key=lambda r: r['cumtime'], reverse=True)
+    return {
+        'calls': repeat,
+        'total_calls': stats.total_calls,
+        'per_call': stats.total_tt / repeat,
+        'top': rows[:top],
+    }
+
+
+def run_tracemalloc(func, repeat, groups):
+    '''Peak memory and allocations retained by a call.'''
+
+    if tracemalloc is None:
+        raise RuntimeError('tracemalloc mode requires Python 3.4+')
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = [func() for _ in range(repeat)]
+    after = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+
+    diff = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in diff)
+    size = sum(stat.size_diff for stat in diff)
+    report = {
+        'calls': repeat,
+        'peak_bytes': peak,
+        'retained_bytes_per_call': size / repeat,
+        'allocations_per_call': blocks / repeat,
+    }
+    if groups:
+        report['allocations_per_group'] = blocks / repeat / groups
+        report['bytes_per_group'] = size / repeat / groups
+    return report
+
+
+def run(bodies, mode='time', repeat=5, only=None):
+    '''
+    Run all benchmarks in given mode.
+
+    :param bodies: canned response bodies keyed by URI
+    :type bodies: dict
+    :param mode: time, cprofile or tracemalloc
+    :type mode: str
+    :param repeat: calls per benchmark
+    :type repeat: int
+    :param only: benchmark names to run, all if empty
+    :type only: list
+    :returns: report
+    :rtype: dict
+    '''
+
+    session = bench_session(bodies)
+    results = {}
+    for name, func, groups in _cases(session, bodies):
+        if only and name not in only:
+            continue
+        if mode == 'cprofile':
+            results[name] = run_cprofile(func, repeat)
+        elif mode == 'tracemalloc':
+            results[name] = run_tracemalloc(func, repeat, groups)
+        else:
+            results[name] = run_time(func, repeat)
+            if groups:
+                results[name]['per_group'] = results[name]['median'] / groups
+
+    return {
+        'package_version': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'mode': mode,
+        'repeat': repeat,
+        'created': time.time(),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m manageengineapi.bench', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mode', choices=('time', 'cprofile', 'tracemalloc'), default='time')
+    parser.add_argument('--groups', type=int, default=1000, help='synthetic IP groups')
+    parser.add_argument('--entries', type=int, default=4, help='IP entries per synthetic group')
+    parser.add_argument('--plans', type=int, default=100, help='synthetic bill plans')
+    parser.add_argument('--devices', type=int, default=50, help='synthetic devices')
+    parser.add_argument('--recorded', help='directory of recorded responses, replaces synthetic ones')
+    parser.add_argument('--cassette', help='cassette recorded with transport.RecordingAdapter, replaces synthetic responses')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', action='append', help='benchmark name to run, repeatable')
+    parser.add_argument('--output', help='write JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    bodies = {
+        NFApi.LISTIPGROUP_URI: synthetic_ip_groups(args.groups, args.entries),
+        NFApi.LISTBILLPLAN_URI: synthetic_bill_plans(args.plans, args.groups),
+        NFApi.LISTDEVLIST_URI: synthetic_devices(args.devices),
+    }
+    if args.recorded:
+        bodies.update(load_recorded(args.recorded))
+    if args.cassette:
+        bodies.update(load_cassette(args.cassette))
+
+    report = run(bodies, args.mode, args.repeat, args.only)
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,9 @@ Object to represent and facilitate Billing operations. All get, add, modify, and
 of API session will return objects defined here instead of JSON. 
 '''
 
-class BillPlan(object):
+from .tracking import ChangeTracking
+
+class BillPlan(ChangeTracking):
     '''
     BillPlan object. 
     
@@ -35,6 +37,8 @@ class BillPlan(object):
     :type intf_id: str
     :param ipg_id: comma seperated, IPGroup IDs bill plan will apply to (IE: '2500033,2500027,2500034,2500025')
     :type ipg_id: str
+    :param ip_groups: IPGroup objects behind ipg_id, see link_groups
+    :type ip_groups: list
     :param buss_id: ???
     :type buss_id: str
     :param email_id: Email address for bill (IE: 'someonewhocares@somecompany.com')
@@ -44,8 +48,16 @@ class BillPlan(object):
 
     More info:
     https://www.manageengine.com/products/netflow/help/admin-operations/billing.html
+
+    Assignments to attributes are tracked, see changed and is_dirty.
     '''
 
+    TRACKED = (
+        'name', 'description', 'cost_unit', 'period_type', 'gen_date', 'time_zone',
+        'base_speed', 'base_cost', 'add_speed', 'add_cost', 'type', 'percent', 'buss_id',
+        'email_id', 'email_sub', 'intf_id', 'ipg_id', 'plan_id'
+    )
+
     def __init__(self, **kwargs):
         self.name = kwargs.get('name')
         self.description = kwargs.get('description')
@@ -69,6 +81,9 @@ class BillPlan(object):
         #IP Group IDs bill plan applies to
         self.ipg_id = kwargs.get('ipg_id', '')
 
+        #IPGroup objects behind ipg_id, populated when plan is resolved against group list
+        self.ip_groups = kwargs.get('ip_groups', [])
+
         #Plan ID, NOT provided at creation!
         self.plan_id = kwargs.get('plan_id', '')
 
@@ -78,3 +93,196 @@ class BillPlan(object):
             self.type
         )
 
+    def _encode_payload(self, variant):
+        payload = {
+            'name': self.name,
+            'desc': self.description,
+            'baseSpeed': self.base_speed,
+            'baseCost': self.base_cost,
+            'addSpeed': self.add_speed,
+            'addCost': self.add_cost,
+            'type': self.type,
+            'perc': self.percent,
+            'intfID': self.intf_id,
+            'ipgID': self.ipg_id,
+            'bussID': self.buss_id,
+            'emailID': self.email_id,
+            'emailsub': self.email_sub
+        }
+
+        #Modify endpoint takes plan ID instead of billing period settings
+        if variant == 'modify':
+            payload['planid'] = self.plan_id
+        else:
+            payload.update({
+                'costUnit': self.cost_unit,
+                'periodType': self.period_type,
+                'genDate': self.gen_date,
+                'timezone': self.time_zone,
+            })
+        return payload
+
+    @classmethod
+    def from_api(cls, bp):
+        '''
+        Build BillPlan from a single entry of listBillPlan JSON response['bpList'].
+
+        :param bp: bill plan dict from API
+        :type bp: dict
+        :rtype: manageengineapi.BillPlan
+        '''
+
+        plan = cls(
+            name = bp['name'],
+            description = bp['desc'],
+            cost_unit = bp['coustunit'], #YEA, THEY REALLY HAVE THIS TYPO
+            period_type = bp['period'],
+            gen_date = bp['billDate'],
+            time_zone = bp['tzone'],
+            base_speed = bp['basespd1'], #1 returns int instead of str
+            base_cost = bp['basecost1'], #1 returns int instead of str
+            add_speed = bp['addspd1'],
+            add_cost = bp['addcost1'],
+            type = bp['type'],
+            percent = bp['perc'],
+            buss_id = bp['bussList'],
+            email_id = bp['emailid'],
+            email_sub = bp['emailSubject'],
+            plan_id = bp['planid'],
+            ipg_id = ','.join([str(x[1]) for x in bp['ipgList']])
+        )
+        plan.mark_clean()
+        return plan
+
+    @property
+    def ipg_ids(self):
+        '''IPGroup IDs from ipg_id as list of str.'''
+
+        return [i.strip() for i in str(self.ipg_id).split(',') if i.strip()]
+
+    def link_groups(self, ip_groups):
+        '''
+        Apply bill plan to given IPGroup objects, keeping ipg_id in sync. Sub-groups of
+        chunked groups are billed along with their base group.
+
+        :param ip_groups: IPGroup objects bill plan applies to
+        :type ip_groups: list
+        '''
+
+        self.ip_groups = list(ip_groups)
+        self.ipg_id = ','.join([
+            str(group.ID)
+            for g in self.ip_groups
+            for group in [g] + list(g.parts)
+        ])
+
+    def relink_group(self, ipgroup, old_ids):
+        '''
+        Swap IDs IP group was billed under for its current base and sub-group IDs,
+        IE: after a chunked group gained or lost sub-groups.
+
+        :param ipgroup: IPGroup with current ID and parts
+        :type ipgroup: manageengineapi.IPGroup
+        :param old_ids: IDs of base group and sub-groups before the change
+        :type old_ids: list
+        :returns: whether plan billed the group and ipg_id changed
+        :rtype: bool
+        '''
+
+        old_ids = [str(i) for i in old_ids]
+        current = self.ipg_ids
+        if old_ids[0] not in current:
+            return False
+        ids = []
+        for gid in current:
+            if gid == old_ids[0]:
+                ids.extend(str(g.ID) for g in [ipgroup] + list(ipgroup.parts))
+            elif gid not in old_ids:
+                ids.append(gid)
+        if ids == current:
+            return False
+        self.ipg_id = ','.join(ids)
+        return True
+
+
+class BillingIndex(object):
+    '''
+    Bill plans with resolved IPGroup references, plus reverse index from IP group
+    to the bill plans that apply to it. Groups are shared between plans, so a group
+    reached through one plan is the same object reached through any other.
+
+    :param bill_plans: list of BillPlan, ip_groups attribute populated
+    :type bill_plans: list
+    :param ip_groups: list of IPGroup
+    :type ip_groups: list
+    '''
+
+    def __init__(self, bill_plans, ip_groups, plans_by_group):
+        self.bill_plans = bill_plans
+        self.ip_groups = ip_groups
+        self.groups_by_id = dict((str(g.ID), g) for g in ip_groups)
+        self.plans_by_group = plans_by_group
+
+    def __repr__(self):
+        return '<BillingIndex - Plans:{0} Groups:{1}>'.format(
+            len(self.bill_plans),
+            len(self.ip_groups)
+        )
+
+    @classmethod
+    def build(cls, bp_list, ip_groups):
+        '''
+        Parse listBillPlan entries and resolve their IP groups in a single pass.
+
+        :param bp_list: JSON response['bpList'] from listBillPlan
+        :type bp_list: list
+        :param ip_groups: list of IPGroup from get_ip_groups
+        :type ip_groups: list
+        :rtype: manageengineapi.billing.BillingIndex
+        '''
+
+        groups_by_id = dict((str(g.ID), g) for g in ip_groups)
+        plans_by_group = dict((gid, []) for gid in groups_by_id)
+        bill_plans = []
+
+        for bp in bp_list:
+            plan = BillPlan.from_api(bp)
+            for gid in plan.ipg_ids:
+                group = groups_by_id.get(gid)
+
+                #Plans can reference groups that have since been deleted
+                if group is not None:
+                    plan.ip_groups.append(group)
+                    plans_by_group[gid].append(plan)
+            bill_plans.append(plan)
+
+        return cls(bill_plans, ip_groups, plans_by_group)
+
+    def plans_for(self, ipgroup):
+        '''
+        Bill plans that apply to IP group.
+
+        :param ipgroup: IPGroup object or its ID
+        :type ipgroup: manageengineapi.IPGroup or str
+        :rtype: list
+        '''
+
+        gid = ipgroup.ID if hasattr(ipgroup, 'ID') else ipgroup
+        return self.plans_by_group.get(str(gid), [])
+
+    def groups_for(self, billplan):
+        '''
+        IP groups bill plan applies to.
+
+        :param billplan: existing bill plan
+        :type billplan: manageengineapi.BillPlan
+        :rtype: list
+        '''
+
+        return billplan.ip_groups
+
+    def unbilled_groups(self):
+        '''IP groups not referenced by any bill plan.'''
+
+        return [g for g in self.ip_groups if not self.plans_by_group.get(str(g.ID))]
+
@@ -0,0 +1,486 @@
+'''
+Bulk import of IP groups and bill plans from CSV or YAML. Rows are parsed and validated
+one at a time, IP group rows are merged by group name, device/interface names are
+resolved through a single get_dev_list call, and objects are pushed with bounded
+concurrency. Every finished push is appended to a checkpoint file, so an interrupted
+import can be started again and continues with what is left.
+
+IP group columns: group, description, speed, ip, status, netmask, interfaces. One row per
+IP definition, ip is a CIDR network, a single address or a range written as
+'10.0.0.1-10.0.0.9' or '10.0.0.1 to 10.0.0.9'.
+
+Bill plan columns: plan, description, base_speed, base_cost, add_speed, add_cost, type,
+percent, cost_unit, period_type, gen_date, time_zone, email_id, email_sub, interfaces,
+groups. One row per plan.
+
+interfaces holds 'device:interface' names and groups holds IP group names, both
+separated by ';'. Empty or 'all' interfaces means all interfaces.
+
+Usage::
+
+    NFA_HOST=nfa.example.com NFA_API_KEY=... NFA_USER=... NFA_PASSWORD=... \\
+        python -m manageengineapi.bulk --ip-groups groups.csv --bill-plans plans.yaml \\
+        --checkpoint onboarding.checkpoint
+'''
+
+from __future__ import print_function
+from .ipgroup import IPGroup, IPNetwork, IPRange
+from .billing import BillPlan
+from .device import DeviceRegistry
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import threading
+
+try:
+    import yaml
+except ImportError:
+    #YAML input is optional
+    yaml = None
+
+GROUP_FIELDS = ('description', 'speed')
+
+PLAN_FIELDS = (
+    'description', 'base_speed', 'base_cost', 'add_speed', 'add_cost', 'type', 'percent',
+    'cost_unit', 'period_type', 'gen_date', 'time_zone', 'email_id', 'email_sub'
+)
+
+DEFAULT_RANGE_NETMASK = '255.255.255.0'
+
+
+class RowError(ValueError):
+    '''
+    Invalid input row.
+
+    :param line: line (CSV) or item number (YAML) of row
+    :type line: int
+    :param message: what is wrong
+    :type message: str
+    '''
+
+    def __init__(self, line, message):
+        ValueError.__init__(self, 'Row {0}: {1}'.format(line, message))
+        self.line = line
+        self.message = message
+
+
+#=================================================================
+# Reading
+#=================================================================
+
+def read_rows(path, format=None):
+    '''
+    Rows of a CSV or YAML file as (line, dict) pairs. CSV is read lazily, row by row.
+    YAML needs PyYAML and holds either a list of rows or a mapping with the rows
+    under 'rows'.
+
+    :param path: input file
+    :type path: str
+    :param format: 'csv' or 'yaml', guessed from file extension if None
+    :type format: str
+    :rtype: iterator
+    '''
+
+    if format is None:
+        format = 'yaml' if path.lower().endswith(('.yaml', '.yml')) else 'csv'
+
+    if format == 'yaml':
+        if yaml is None:
+            raise RuntimeError('YAML import requires PyYAML (pip install pyyaml)')
+        with open(path) as f:
+            data = yaml.safe_load(f) or []
+        if isinstance(data, dict):
+            data = data.get('rows', [])
+        for number, row in enumerate(data, 1):
+            if not isinstance(row, dict):
+                raise RowError(number, 'YAML rows must be mappings')
+            yield number, dict((k, '' if v is None else str(v)) for k, v in row.items())
+        return
+
+    if sys.version_info[0] > 2:
+        f = io.open(path, newline='', encoding='utf-8-sig')
+    else:
+        f = open(path, 'rb')
+    with f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, dict(
+                (k.strip(), (v or '').strip()) for k, v in row.items() if k is not None
+            )
+
+
+def parse_ip(text, status='include', netmask=None):
+    '''
+    IPNetwork or IPRange from a network, address or 'start-end'/'start to end' range.
+
+    :rtype: manageengineapi.ipgroup.IPSpan
+    '''
+
+    text = text.strip()
+    for separator in (' to ', '-'):
+        if separator in text:
+            start, end = [part.strip() for part in text.split(separator, 1)]
+            return IPRange(rangestart=start, rangeend=end, status=status,
+                           netmask=netmask or DEFAULT_RANGE_NETMASK)
+    return IPNetwork(text, status=status)
+
+
+def _int(field, value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('{0} must be a whole number, got {1!r}'.format(field, value))
+
+
+def _names(text):
+    return [name.strip() for name in text.split(';') if name.strip()]
+
+
+#=================================================================
+# Import
+#=================================================================
+
+class Checkpoint(object):
+    '''
+    Append-only record of finished pushes, one JSON line per object. Lines are
+    flushed as they are written, a line cut short by a crash is ignored on load.
+
+    :param path: checkpoint file
+    :type path: str
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            line = ''
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('status') == 'done':
+                        self.done.add((entry['kind'], entry['name']))
+
+            #End a line cut short by a crash, or the next record would be glued onto it
+            if line and not line.endswith('\n'):
+                with open(path, 'a') as f:
+                    f.write('\n')
+
+    def __repr__(self):
+        return '<Checkpoint - Path:{0} Done:{1}>'.format(self.path, len(self.done))
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def record(self, kind, name, error=None):
+        entry = {'kind': kind, 'name': name, 'status': 'failed' if error else 'done'}
+        if error:
+            entry['error'] = error
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            if not error:
+                self.done.add((kind, name))
+
+
+class ImportReport(object):
+    '''Outcome of an import run.'''
+
+    def __init__(self):
+        self.rows = 0
+        self.errors = []
+        self.pushed = []
+        self.skipped = []
+        self.failed = {}
+
+    def __repr__(self):
+        return '<ImportReport - Rows:{0} Invalid:{1} Pushed:{2} Skipped:{3} Failed:{4}>'.format(
+            self.rows,
+            len(self.errors),
+            len(self.pushed),
+            len(self.skipped),
+            len(self.failed)
+        )
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'invalid': [str(e) for e in self.errors],
+            'pushed': len(self.pushed),
+            'skipped': len(self.skipped),
+            'failed': self.failed,
+        }
+
+
+class BulkImporter(object):
+    '''
+    Build IPGroup/BillPlan objects from rows and push them.
+
+    :param session: logged in API session. With workers above 1 it should be
+        created with thread_safe=True.
+    :type session: manageengineapi.NFApi
+    :param checkpoint: checkpoint file path, pushes are not recorded if None
+    :type checkpoint: str
+    :param workers: concurrent add requests
+    :type workers: int
+    :param registry: device registry, built from one get_dev_list call when first needed
+    :type registry: manageengineapi.device.DeviceRegistry
+    '''
+
+    def __init__(self, session, checkpoint=None, workers=4, registry=None):
+        self.session = session
+        self.checkpoint = Checkpoint(checkpoint) if checkpoint else None
+        self.workers = workers
+        self._registry = registry
+        self.report = ImportReport()
+
+    def __repr__(self):
+        return '<BulkImporter - Workers:{0} {1}>'.format(self.workers, self.report)
+
+    @property
+    def registry(self):
+        if self._registry is None:
+            self._registry = DeviceRegistry.from_session(self.session)
+        return self._registry
+
+    def resolve_interfaces(self, text):
+        '''
+        Interface IDs for 'device:interface;...' names, -1 for all interfaces.
+
+        :rtype: str or int
+        '''
+
+        names = _names(text)
+        if not names or [n.lower() for n in names] == ['all']:
+            return -1
+
+        ids = []
+        for name in names:
+            device, _, interface = name.rpartition(':')
+            if not device:
+                raise ValueError('Interface {0} must be written as device:interface'.format(name))
+            if self.registry.device(device) is None:
+                raise ValueError('Unknown device {0}'.format(device))
+            found = self.registry.interface_ids(interface, device)
+            if not found:
+                raise ValueError('Unknown interface {0}'.format(name))
+            ids.extend(found)
+        return ','.join(ids)
+
+    def load_ip_groups(self, rows):
+        '''
+        Merge IP group rows into IPGroup objects by group name. Invalid rows are
+        recorded in report.errors and their group is left out.
+
+        :param rows: (line, dict) pairs, see read_rows
+        :type rows: iterable
+        :returns: group name -> IPGroup, in order of first appearance
+        :rtype: collections.OrderedDict
+        '''
+
+        groups = OrderedDict()
+        invalid = set()
+        for line, row in rows:
+            self.report.rows += 1
+            name = row.get('group')
+            try:
+                if not name:
+                    raise ValueError('group name is missing')
+                group = groups.get(name)
+                if group is None:
+                    group = groups[name] = IPGroup(name=name)
+                    group.asso_dev_id = self.resolve_interfaces(row.get('interfaces', ''))
+                elif row.get('interfaces') and \
+                        self.resolve_interfaces(row['interfaces']) != group.asso_dev_id:
+                    raise ValueError('interfaces differ from earlier rows of group {0}'.format(name))
+
+                for field in GROUP_FIELDS:
+                    value = row.get(field)
+                    if not value:
+                        continue
+                    if field == 'speed':
+                        value = _int(field, value)
+                    current = getattr(group, field)
+                    if current is not None and current != value:
+                        raise ValueError('{0} differs from earlier rows of group {1}'.format(field, name))
+                    setattr(group, field, value)
+
+                if row.get('ip'):
+                    group.add_ip(parse_ip(row['ip'], row.get('status') or 'include', row.get('netmask')))
+            except ValueError as e:
+                self.report.errors.append(RowError(line, str(e)))
+                if name:
+                    invalid.add(name)
+
+        for name in invalid:
+            groups.pop(name, None)
+        for name, group in list(groups.items()):
+            if not group.ip:
+                self.report.errors.append(RowError(0, 'group {0} has no IP definitions'.format(name)))
+                del groups[name]
+        return groups
+
+    def load_bill_plans(self, rows):
+        '''
+        BillPlan objects from bill plan rows. Group names are resolved to IDs with a
+        single get_ip_groups call after IP groups have been pushed, see push.
+
+        :param rows: (line, dict) pairs, see read_rows
+        :type rows: iterable
+        :returns: plan name -> (BillPlan, list of IP group names)
+        :rtype: collections.OrderedDict
+        '''
+
+        plans = OrderedDict()
+        for line, row in rows:
+            self.report.rows += 1
+            name = row.get('plan')
+            try:
+                if not name:
+                    raise ValueError('plan name is missing')
+                if name in plans:
+                    raise ValueError('plan {0} is defined more than once'.format(name))
+                kwargs = dict((field, row[field]) for field in PLAN_FIELDS if row.get(field))
+                for field in ('base_speed', 'base_cost', 'add_speed', 'add_cost', 'percent'):
+                    if field in kwargs:
+                        kwargs[field] = _int(field, kwargs[field])
+                for field in ('base_speed', 'base_cost', 'add_speed', 'add_cost'):
+                    if field not in kwargs:
+                        raise ValueError('{0} is missing'.format(field))
+                interfaces = self.resolve_interfaces(row.get('interfaces', ''))
+                kwargs['intf_id'] = '' if interfaces == -1 else interfaces
+                plans[name] = (BillPlan(name=name, **kwargs), _names(row.get('groups', '')))
+            except ValueError as e:
+                self.report.errors.append(RowError(line, str(e)))
+        return plans
+
+    def _push_one(self, kind, name, add, obj):
+        try:
+            response = add(obj)
+            error = response.get('error') if isinstance(response, dict) else None
+        except Exception as e:
+            error = '{0}: {1}'.format(type(e).__name__, e)
+        if error:
+            self.report.failed[name] = str(error)
+        else:
+            self.report.pushed.append(name)
+        if self.checkpoint is not None:
+            self.checkpoint.record(kind, name, str(error) if error else None)
+
+    def _push(self, kind, objects, add):
+        pending = []
+        for name, obj in objects.items():
+            if self.checkpoint is not None and (kind, name) in self.checkpoint:
+                self.report.skipped.append(name)
+            else:
+                pending.append((name, obj))
+
+        if self.workers <= 1:
+            for name, obj in pending:
+                self._push_one(kind, name, add, obj)
+            return
+
+        #Keep at most a couple of requests queued per worker
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = set()
+            for name, obj in pending:
+                if len(in_flight) >= self.workers * 2:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight.add(pool.submit(self._push_one, kind, name, add, obj))
+            wait(in_flight)
+
+    def push(self, groups=None, plans=None):
+        '''
+        Push loaded IP groups, then bill plans, skipping anything the checkpoint
+        records as done.
+
+        :param groups: result of load_ip_groups
+        :type groups: dict
+        :param plans: result of load_bill_plans
+        :type plans: dict
+        :rtype: manageengineapi.bulk.ImportReport
+        '''
+
+        if groups:
+            #IDs are read back in bulk below, not with one list download per add
+            self._push('ipgroup', groups, lambda group: self.session.add_ip_group(group, capture_id=False))
+
+        if plans:
+            #Group IDs only exist once groups are on the server
+            ids = {}
+            if any(names for _, names in plans.values()):
+                ids = dict((g.name, str(g.ID)) for g in self.session.get_ip_groups())
+
+            ready = OrderedDict()
+            for name, (plan, group_names) in plans.items():
+                missing = [g for g in group_names if g not in ids]
+                if missing:
+                    self.report.failed[name] = 'Unknown IP groups: {0}'.format(', '.join(missing))
+                    continue
+                plan.ipg_id = ','.join(ids[g] for g in group_names)
+                ready[name] = plan
+            self._push('billplan', ready, lambda plan: self.session.add_bill_plan(plan, capture_id=False))
+
+        return self.report
+
+    def import_files(self, ip_groups=None, bill_plans=None):
+        '''
+        Read, validate and push IP group and bill plan files.
+
+        :param ip_groups: IP group CSV/YAML path
+        :type ip_groups: str
+        :param bill_plans: bill plan CSV/YAML path
+        :type bill_plans: str
+        :rtype: manageengineapi.bulk.ImportReport
+        '''
+
+        groups = self.load_ip_groups(read_rows(ip_groups)) if ip_groups else None
+        plans = self.load_bill_plans(read_rows(bill_plans)) if bill_plans else None
+        return self.push(groups, plans)
+
+
+def main(argv=None):
+    from .manageengineapi import NFApi
+
+    parser = argparse.ArgumentParser(prog='python -m manageengineapi.bulk', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--ip-groups', help='IP group CSV/YAML file')
+    parser.add_argument('--bill-plans', help='bill plan CSV/YAML file')
+    parser.add_argument('--checkpoint', help='resumable checkpoint file')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--dry-run', action='store_true', help='validate rows and resolve names only')
+    args = parser.parse_args(argv)
+
+    #Credentials come from environment so they stay out of process listings
+    session = NFApi(
+        os.environ['NFA_HOST'],
+        os.environ['NFA_API_KEY'],
+        os.environ['NFA_USER'],
+        os.environ['NFA_PASSWORD'],
+        thread_safe=args.workers > 1
+    )
+    session.login()
+
+    importer = BulkImporter(session, args.checkpoint, args.workers)
+    if args.dry_run:
+        groups = importer.load_ip_groups(read_rows(args.ip_groups)) if args.ip_groups else {}
+        plans = importer.load_bill_plans(read_rows(args.bill_plans)) if args.bill_plans else {}
+        report = dict(importer.report.as_dict(), groups=len(groups), plans=len(plans))
+    else:
+        report = importer.import_files(args.ip_groups, args.bill_plans).as_dict()
+
+    session.logout()
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+'''
+Content-hash cache for list responses. Polling a stable configuration returns the same
+bytes over and over, so the raw body and every group/plan sub-document are hashed and
+objects built from unchanged entries are handed out again instead of being rebuilt.
+'''
+
+import hashlib
+import json
+import threading
+
+
+class _ParsedList(object):
+    '''Objects built from the last body seen for one kind of list response.'''
+
+    __slots__ = ('digest', 'objects', 'by_entry')
+
+    def __init__(self, digest, objects, by_entry):
+        self.digest = digest
+        self.objects = objects
+        self.by_entry = by_entry
+
+
+class ParseCache(object):
+    '''
+    Cache of objects built from list responses, keyed by content hash. Returned
+    objects are shared between calls. Objects changed locally and not pushed
+    (see IPGroup.is_dirty) are never handed out again, they are rebuilt from
+    the server copy instead.
+    '''
+
+    def __init__(self):
+        self._lists = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<ParseCache - Hits:{0} Misses:{1}>'.format(
+            self.hits,
+            self.misses
+        )
+
+    def clear(self):
+        '''Drop all cached objects.'''
+
+        self._lists = {}
+
+    @staticmethod
+    def _digest(data):
+        return hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def _entry_digest(entry):
+        return hashlib.sha1(
+            json.dumps(entry, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        ).hexdigest()
+
+    def parse(self, kind, body, entries, build, build_many=None):
+        '''
+        Build objects for a list response, reusing whatever is unchanged.
+
+        :param kind: name of list, IE: 'ipgroups'
+        :type kind: str
+        :param body: raw response body
+        :type body: bytes
+        :param entries: callable returning list of entries from decoded body
+        :type entries: function
+        :param build: callable building one object from one entry
+        :type build: function
+        :param build_many: optional callable building list of objects from list of entries
+        :type build_many: function
+        :returns: list of objects in response order
+        :rtype: list
+        '''
+
+        #One parse at a time, threads sharing a session would race on _lists
+        with self._lock:
+            return self._parse(kind, body, entries, build, build_many)
+
+    def _parse(self, kind, body, entries, build, build_many=None):
+        digest = ParseCache._digest(body)
+        previous = self._lists.get(kind)
+
+        #Whole body unchanged, nothing to decode at all
+        if previous is not None and previous.digest == digest and \
+                not any(getattr(o, 'is_dirty', False) for o in previous.objects):
+            self.hits += len(previous.objects)
+            return list(previous.objects)
+
+        reuse = previous.by_entry if previous is not None else {}
+        objects = []
+        digests = []
+        missing = []
+        for entry in entries(json.loads(body.decode('utf-8'))):
+            entry_digest = ParseCache._entry_digest(entry)
+            obj = reuse.get(entry_digest)
+            if obj is not None and getattr(obj, 'is_dirty', False):
+                obj = None
+            if obj is None:
+                missing.append((len(objects), entry))
+            objects.append(obj)
+            digests.append(entry_digest)
+
+        #Build changed entries in one batch so they can be parsed in parallel
+        if build_many is not None:
+            built = build_many([entry for _, entry in missing])
+        else:
+            built = [build(entry) for _, entry in missing]
+        for (index, _), obj in zip(missing, built):
+            objects[index] = obj
+
+        self.misses += len(missing)
+        self.hits += len(objects) - len(missing)
+        self._lists[kind] = _ParsedList(digest, objects, dict(zip(digests, objects)))
+        return list(objects)
@@ -0,0 +1,178 @@
+'''
+Splitting of IP groups whose form payload is too large for NFA to accept in one POST.
+An oversized group is stored as its base group, holding the name and ID callers know,
+plus numbered sub-groups named '<name>__nfapi_part2', '<name>__nfapi_part3', ... each
+under the size limit. Reading the list back folds the parts into the base group again,
+so callers see one logical group. Group names ending in '__nfapi_part<number>' are
+reserved for sub-groups.
+
+Modify calls replace a group's whole IP list, so a large group can't be staged in
+through several modifies of one group, it has to be spread over several groups.
+Bill plans billing a chunked group list the sub-group IDs too (see BillPlan.link_groups),
+plans in the session registry are relinked when a modify adds or drops sub-groups.
+
+Usage::
+
+    session = NFApi(host, api_key, user, password, max_payload=64 * 1024)
+    session.add_ip_group(huge_group)      #Posted as huge_group plus huge_group__nfapi_part2...
+    session.get_ip_group(huge_group.name) #Comes back as one group, parts in .parts
+'''
+
+from .ipgroup import IPGroup
+import re
+
+#Python3/2.x
+try:
+    from urllib.parse import urlencode, quote_plus
+except ImportError:
+    from urllib import urlencode, quote_plus
+
+#Form bodies much above this were seen timing out
+DEFAULT_MAX_BYTES = 64 * 1024
+
+#Separator is reserved, so groups users name like 'x__part2' are never folded into 'x'
+PART_FORMAT = '{0}__nfapi_part{1}'
+PART_PATTERN = re.compile(r'^(?P<base>.+)__nfapi_part(?P<index>[0-9]+)$')
+
+#Group attributes copied from a base group onto its parts and merged groups
+_SHARED = ('app', 'dscp', 'description', 'speed', 'status', 'asso_device', 'asso_dev_id')
+
+
+def payload_size(payload):
+    '''
+    Length of payload once form encoded the way requests sends it.
+
+    :param payload: form payload, IE: IPGroup.api_payload()
+    :type payload: dict
+    :rtype: int
+    '''
+
+    #requests leaves out None values
+    return len(urlencode([(k, v) for k, v in payload.items() if v is not None]))
+
+
+def part_name(name, index):
+    '''Name of index-th sub-group of group name, numbered from 2.'''
+
+    return PART_FORMAT.format(name, index)
+
+
+def is_part_name(name):
+    '''Whether name is a sub-group name, see PART_FORMAT.'''
+
+    return PART_PATTERN.match(name or '') is not None
+
+
+def _entry_size(ip):
+    #IPData is joined by '-', status and IPType by ',' which encodes to 3 bytes
+    return (
+        len(quote_plus(ip.api_format)) + 1 +
+        len(quote_plus(ip.status)) + len(quote_plus(',')) +
+        len(quote_plus(ip.type.lower())) + len(quote_plus(','))
+    )
+
+
+class GroupChunker(object):
+    '''
+    Splits oversized IPGroups into parts and merges parts read back from the API.
+
+    :param max_bytes: largest encoded add/modify payload sent for one group
+    :type max_bytes: int
+    '''
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+
+    def __repr__(self):
+        return '<GroupChunker - MaxBytes:{0}>'.format(self.max_bytes)
+
+    def oversized(self, ipgroup):
+        '''Whether group's payload is over the limit. Between groups are never split.'''
+
+        if ipgroup.is_between:
+            return False
+        return payload_size(ipgroup.api_payload()) > self.max_bytes
+
+    def _part(self, ipgroup, name, ID, ip):
+        part = IPGroup(name=name, ID=ID)
+        for attr in _SHARED:
+            setattr(part, attr, getattr(ipgroup, attr))
+        part.ip = ip
+        return part
+
+    def split(self, ipgroup):
+        '''
+        Groups to store ipgroup as. The first is the base group carrying ipgroup's name
+        and ID, parts reuse the IDs of ipgroup.parts where they already exist. A group
+        under the limit comes back as a single group.
+
+        :param ipgroup: group to split
+        :type ipgroup: manageengineapi.IPGroup
+        :rtype: list
+        '''
+
+        if not self.oversized(ipgroup):
+            return [self._part(ipgroup, ipgroup.name, ipgroup.ID, list(ipgroup.ip))]
+
+        #Fixed part of the payload, sized with the longest name a part will get
+        empty = self._part(ipgroup, part_name(ipgroup.name, len(ipgroup.ip) + 1), None, [])
+        fixed = payload_size(empty.api_payload())
+
+        chunks = [[]]
+        size = fixed
+        for ip in ipgroup.ip:
+            cost = _entry_size(ip)
+            if fixed + cost > self.max_bytes:
+                raise ValueError('IP definition {0} alone exceeds {1} byte payload limit'.format(
+                    ip.api_format, self.max_bytes))
+            if size + cost > self.max_bytes:
+                chunks.append([])
+                size = fixed
+            chunks[-1].append(ip)
+            size += cost
+
+        old_parts = ipgroup.parts
+        groups = [self._part(ipgroup, ipgroup.name, ipgroup.ID, chunks[0])]
+        for index, chunk in enumerate(chunks[1:], 2):
+            ID = old_parts[index - 2].ID if index - 2 < len(old_parts) else None
+            groups.append(self._part(ipgroup, part_name(ipgroup.name, index), ID, chunk))
+        return groups
+
+    def merge(self, groups):
+        '''
+        Fold sub-groups into their base group. Bases that have parts are returned as
+        new IPGroup objects with the IP definitions of all parts and the parts in
+        parts, everything else is passed through as is. Parts whose base group is
+        missing are left alone.
+
+        :param groups: IPGroup objects as listed by the API
+        :type groups: list
+        :rtype: list
+        '''
+
+        names = set(g.name for g in groups)
+        parts = {}
+        for group in groups:
+            match = PART_PATTERN.match(group.name or '')
+            if match and match.group('base') in names:
+                parts.setdefault(match.group('base'), []).append((int(match.group('index')), group))
+        if not parts:
+            return groups
+
+        merged = []
+        for group in groups:
+            match = PART_PATTERN.match(group.name or '')
+            if match and match.group('base') in names:
+                continue
+            if group.name not in parts:
+                merged.append(group)
+                continue
+
+            ordered = [part for index, part in sorted(parts[group.name], key=lambda p: p[0])]
+            whole = self._part(group, group.name, group.ID, list(group.ip))
+            for part in ordered:
+                whole.ip.extend(part.ip)
+            whole.parts = ordered
+            whole.mark_clean()
+            merged.append(whole)
+        return merged
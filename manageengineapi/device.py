@@ -1,3 +1,5 @@
+from bisect import bisect_left
+
 class Device(object):
     '''
     Device object. Contains all interfaces and unique IDs that apply to a device.
@@ -26,3 +28,182 @@ class Device(object):
             self.IP
         )
 
+
+class DeviceRegistry(object):
+    '''
+    Hash indexes over Device objects returned by get_dev_list. Lookups by device IP,
+    device name, interface ID and interface name are constant time, and interface
+    names can be searched by prefix. Interface IDs are always keyed as strings since
+    NFA returns them as either int or str depending on the endpoint.
+
+    :param devices: list of Device objects to index
+    :type devices: list
+    '''
+
+    def __init__(self, devices=None):
+        self.by_ip = {}
+        self.by_name = {}
+
+        #Interface ID -> (Device, interface name)
+        self.by_interface_id = {}
+
+        #Interface name -> list of (Device, interface ID), names aren't unique across devices
+        self.by_interface_name = {}
+
+        #Sorted interface names for prefix search, rebuilt lazily after updates
+        self._sorted_names = None
+
+        if devices:
+            self.update(devices)
+
+    def __repr__(self):
+        return '<DeviceRegistry - Devices:{0} Interfaces:{1}>'.format(
+            len(self.by_ip),
+            len(self.by_interface_id)
+        )
+
+    def __len__(self):
+        return len(self.by_ip)
+
+    def __iter__(self):
+        return iter(self.by_ip.values())
+
+    @classmethod
+    def from_session(cls, session):
+        '''
+        Build registry from a single get_dev_list call.
+
+        :param session: logged in API session
+        :type session: manageengineapi.NFApi
+        :rtype: manageengineapi.device.DeviceRegistry
+        '''
+
+        return cls(session.get_dev_list())
+
+    def refresh(self, session):
+        '''
+        Re-query device list and apply only what changed.
+
+        :param session: logged in API session
+        :type session: manageengineapi.NFApi
+        :returns: IPs of added/changed devices and IPs of removed devices
+        :rtype: tuple
+        '''
+
+        return self.update(session.get_dev_list(), prune=True)
+
+    def update(self, devices, prune=False):
+        '''
+        Index new or changed devices. Devices whose interface list is unchanged are
+        left alone, so refreshing a large, stable inventory only touches what moved.
+
+        :param devices: list of Device objects
+        :type devices: list
+        :param prune: drop indexed devices missing from devices
+        :type prune: bool
+        :returns: IPs of added/changed devices and IPs of removed devices
+        :rtype: tuple
+        '''
+
+        changed = []
+        seen = set()
+        for dev in devices:
+            seen.add(dev.IP)
+            current = self.by_ip.get(dev.IP)
+            if current is not None:
+                if current.name == dev.name and current.interfaces == dev.interfaces:
+                    continue
+                self._remove(current)
+            self._add(dev)
+            changed.append(dev.IP)
+
+        removed = []
+        if prune:
+            removed = [ip for ip in self.by_ip if ip not in seen]
+            for ip in removed:
+                self._remove(self.by_ip[ip])
+
+        return changed, removed
+
+    def _add(self, dev):
+        self.by_ip[dev.IP] = dev
+        self.by_name[dev.name] = dev
+        for intf in dev.interfaces:
+            self.by_interface_id[str(intf[0])] = (dev, intf[1])
+            self.by_interface_name.setdefault(intf[1], []).append((dev, str(intf[0])))
+        self._sorted_names = None
+
+    def _remove(self, dev):
+        del self.by_ip[dev.IP]
+        if self.by_name.get(dev.name) is dev:
+            del self.by_name[dev.name]
+        for intf in dev.interfaces:
+            self.by_interface_id.pop(str(intf[0]), None)
+            entries = [e for e in self.by_interface_name.get(intf[1], []) if e[0] is not dev]
+            if entries:
+                self.by_interface_name[intf[1]] = entries
+            else:
+                self.by_interface_name.pop(intf[1], None)
+        self._sorted_names = None
+
+    def device(self, key):
+        '''
+        Device by IP or name.
+
+        :param key: device IP or name
+        :type key: str
+        :rtype: manageengineapi.Device or None
+        '''
+
+        return self.by_ip.get(key) or self.by_name.get(key)
+
+    def interface(self, intf_id):
+        '''
+        Resolve interface ID to its device and interface name.
+
+        :param intf_id: unique interface identifier
+        :type intf_id: str or int
+        :returns: (Device, interface name) or None
+        :rtype: tuple
+        '''
+
+        return self.by_interface_id.get(str(intf_id))
+
+    def interface_ids(self, name, device=None):
+        '''
+        IDs of interfaces with given name, optionally limited to one device.
+
+        :param name: interface name
+        :type name: str
+        :param device: device IP or name
+        :type device: str
+        :rtype: list
+        '''
+
+        entries = self.by_interface_name.get(name, [])
+        if device is not None:
+            dev = self.device(device)
+            entries = [e for e in entries if e[0] is dev]
+        return [e[1] for e in entries]
+
+    def search(self, prefix):
+        '''
+        All interfaces whose name starts with prefix.
+
+        :param prefix: beginning of interface name
+        :type prefix: str
+        :returns: list of (interface name, Device, interface ID)
+        :rtype: list
+        '''
+
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self.by_interface_name)
+
+        results = []
+        index = bisect_left(self._sorted_names, prefix)
+        while index < len(self._sorted_names) and self._sorted_names[index].startswith(prefix):
+            name = self._sorted_names[index]
+            for dev, intf_id in self.by_interface_name[name]:
+                results.append((name, dev, intf_id))
+            index += 1
+        return results
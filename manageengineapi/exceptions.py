@@ -3,3 +3,6 @@ class NFApiError(Exception):
     
     def __init__(self, *args, **kwargs):
         Exception.__init__(self, *args, **kwargs)
+
+class NFApiSessionExpired(NFApiError):
+    '''Raised when NFA rejects a call because the NFA__SSO session is no longer valid.'''
@@ -0,0 +1,343 @@
+'''
+Embedded Prometheus exporter for NFA traffic statistics. A background collector polls
+getTrafficData per IP group on its own schedule and keeps the latest values in memory,
+scrapes are answered from memory in the Prometheus text exposition format. Scrape
+frequency and scrape latency no longer translate into load on NFA.
+
+Usage::
+
+    NFA_HOST=nfa.example.com NFA_API_KEY=... NFA_USER=... NFA_PASSWORD=... \\
+        python -m manageengineapi.exporter --port 9418 --interval 300
+'''
+
+from __future__ import print_function
+from .query import series_points, DEFAULT_PAYLOAD
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import math
+import os
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    #Python 2.x
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def latest_value(response):
+    '''Value of newest data point in a getTrafficData response, or None.'''
+
+    points = series_points(response)
+    if not points:
+        return None
+    point = points[-1]
+    if isinstance(point, (list, tuple)):
+        return float(point[1])
+    for key in ('value', 'y', 'Value'):
+        if key in point:
+            return float(point[key])
+    return None
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _value(value):
+    #Exposition format spells non-finite samples NaN, +Inf and -Inf
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class TrafficCollector(object):
+    '''
+    Polls traffic data for IP groups in a background thread.
+
+    :param session: logged in API session
+    :type session: manageengineapi.NFApi
+    :param groups: IPGroup objects to poll, all groups from get_ip_groups if None
+    :type groups: list
+    :param interval: seconds between collection cycles
+    :type interval: float
+    :param payload: getTrafficData query parameters, DeviceID is filled in per group
+    :type payload: dict
+    :param value: callable turning a response into a number
+    :type value: function
+    :param workers: concurrent getTrafficData requests per cycle
+    :type workers: int
+    :param monitor: anomaly monitor fed every collected series, keyed by group ID.
+        Timestamps are taken as epoch milliseconds.
+    :type monitor: manageengineapi.anomaly.AnomalyMonitor
+    '''
+
+    #Shared with loadtest, defined in query
+    DEFAULT_PAYLOAD = DEFAULT_PAYLOAD
+
+    def __init__(self, session, groups=None, interval=300, payload=None, value=latest_value, workers=4,
+                 monitor=None):
+        self.session = session
+        self.groups = groups
+        self.interval = interval
+        self.payload = payload or TrafficCollector.DEFAULT_PAYLOAD
+        self.value = value
+        self.workers = workers
+        self.monitor = monitor
+
+        #Group ID -> (group name, value, collected at)
+        self.values = {}
+        self.cycles = 0
+        self.errors = 0
+        self.last_success = None
+        self.last_duration = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return '<TrafficCollector - Groups:{0} Interval:{1}>'.format(
+            len(self.values),
+            self.interval
+        )
+
+    def _collect_group(self, group):
+        payload = dict(self.payload)
+        payload['DeviceID'] = group.ID
+        try:
+            response = self.session.get_group_traffic_data(group.ID, payload)
+            value = self.value(response)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return
+        if self.monitor is not None:
+            self.monitor.add_series(str(group.ID), series_points(response), unit=1000)
+        if value is not None:
+            with self._lock:
+                self.values[str(group.ID)] = (group.name, value, time.time())
+
+    def collect_once(self):
+        '''Run a single collection cycle in the calling thread.'''
+
+        started = time.time()
+        try:
+            groups = self.groups if self.groups is not None else self.session.get_ip_groups()
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return
+
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(self._collect_group, groups))
+        else:
+            for group in groups:
+                self._collect_group(group)
+
+        #Deleted groups stop being exported
+        current = set(str(group.ID) for group in groups)
+        with self._lock:
+            for gid in [gid for gid in self.values if gid not in current]:
+                del self.values[gid]
+        if self.monitor is not None:
+            self.monitor.forget([key for key in self.monitor.scores() if key not in current])
+
+        with self._lock:
+            self.cycles += 1
+            self.last_success = time.time()
+            self.last_duration = self.last_success - started
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.collect_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        '''Start collecting in a daemon thread.'''
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop background collection after the current cycle.'''
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def render(self):
+        '''
+        Latest values in Prometheus text exposition format.
+
+        :rtype: str
+        '''
+
+        with self._lock:
+            values = sorted(self.values.items())
+            stats = (self.cycles, self.errors, self.last_success, self.last_duration)
+
+        lines = [
+            '# HELP nfa_ipgroup_traffic Latest getTrafficData value per IP group.',
+            '# TYPE nfa_ipgroup_traffic gauge',
+        ]
+        for gid, (name, value, _) in values:
+            lines.append('nfa_ipgroup_traffic{{id="{0}",group="{1}",type="{2}"}} {3}'.format(
+                _label(gid), _label(name), _label(self.payload.get('Type', '')), _value(value)))
+
+        lines.extend([
+            '# HELP nfa_ipgroup_traffic_collected_timestamp_seconds When value was collected.',
+            '# TYPE nfa_ipgroup_traffic_collected_timestamp_seconds gauge',
+        ])
+        for gid, (name, _, collected) in values:
+            lines.append('nfa_ipgroup_traffic_collected_timestamp_seconds{{id="{0}",group="{1}"}} {2:.3f}'.format(
+                _label(gid), _label(name), collected))
+
+        cycles, errors, last_success, last_duration = stats
+        lines.extend([
+            '# HELP nfa_collector_cycles_total Completed collection cycles.',
+            '# TYPE nfa_collector_cycles_total counter',
+            'nfa_collector_cycles_total {0}'.format(cycles),
+            '# HELP nfa_collector_errors_total Failed NFA requests.',
+            '# TYPE nfa_collector_errors_total counter',
+            'nfa_collector_errors_total {0}'.format(errors),
+        ])
+        if last_success is not None:
+            lines.extend([
+                '# HELP nfa_collector_last_success_timestamp_seconds End of last completed cycle.',
+                '# TYPE nfa_collector_last_success_timestamp_seconds gauge',
+                'nfa_collector_last_success_timestamp_seconds {0:.3f}'.format(last_success),
+                '# HELP nfa_collector_duration_seconds Duration of last completed cycle.',
+                '# TYPE nfa_collector_duration_seconds gauge',
+                'nfa_collector_duration_seconds {0:.3f}'.format(last_duration),
+            ])
+
+        if self.monitor is not None:
+            scores = sorted((k, v) for k, v in self.monitor.scores().items() if v is not None)
+            lines.extend([
+                '# HELP nfa_ipgroup_anomaly_score z-score of newest sample against its baseline.',
+                '# TYPE nfa_ipgroup_anomaly_score gauge',
+            ])
+            for gid, score in scores:
+                lines.append('nfa_ipgroup_anomaly_score{{id="{0}"}} {1}'.format(_label(gid), _value(score)))
+
+        #Adaptive limiter state, if session has one
+        limiter = getattr(self.session, 'limiter', None)
+        if limiter is not None:
+            metrics = sorted(limiter.metrics().items())
+            for name, key, kind in (('concurrency_limit', 'concurrency_limit', 'gauge'),
+                                    ('rate_limit', 'rate_limit', 'gauge'),
+                                    ('error_rate', 'error_rate', 'gauge'),
+                                    ('requests_total', 'requests', 'counter')):
+                lines.append('# TYPE nfa_limiter_{0} {1}'.format(name, kind))
+                for endpoint, values in metrics:
+                    lines.append('nfa_limiter_{0}{{endpoint="{1}"}} {2}'.format(
+                        name, _label(endpoint), _value(values[key])))
+
+        return '\n'.join(lines) + '\n'
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsExporter(object):
+    '''
+    HTTP server answering /metrics from a TrafficCollector.
+
+    :param collector: collector holding latest values
+    :type collector: manageengineapi.exporter.TrafficCollector
+    :param host: address to listen on
+    :type host: str
+    :param port: port to listen on
+    :type port: int
+    '''
+
+    def __init__(self, collector, host='0.0.0.0', port=9418):
+        self.collector = collector
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] not in ('/metrics', '/'):
+                    handler.send_error(404)
+                    return
+                body = collector.render().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', CONTENT_TYPE)
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    def __repr__(self):
+        return '<MetricsExporter - Address:{0}:{1}>'.format(*self.server.server_address[:2])
+
+    def start(self):
+        '''Start collector and serve in daemon threads.'''
+
+        self.collector.start()
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop serving and collecting.'''
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.collector.stop()
+
+
+def main(argv=None):
+    from .manageengineapi import NFApi
+
+    parser = argparse.ArgumentParser(prog='python -m manageengineapi.exporter',
+                                     description='Serve cached NFA traffic stats to Prometheus.')
+    parser.add_argument('--listen', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9418)
+    parser.add_argument('--interval', type=float, default=300)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--type', default='speed', help='getTrafficData Type parameter')
+    args = parser.parse_args(argv)
+
+    #Credentials come from environment so they stay out of process listings
+    session = NFApi(
+        os.environ['NFA_HOST'],
+        os.environ['NFA_API_KEY'],
+        os.environ['NFA_USER'],
+        os.environ['NFA_PASSWORD'],
+        thread_safe=True
+    )
+    session.login()
+
+    payload = dict(DEFAULT_PAYLOAD, Type=args.type)
+    exporter = MetricsExporter(
+        TrafficCollector(session, interval=args.interval, payload=payload, workers=args.workers),
+        args.listen,
+        args.port
+    )
+    exporter.start()
+    print('Serving metrics on {0}:{1}'.format(args.listen, args.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        exporter.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+'''
+Conversation flow graph. getConvData records from any number of IP groups are folded into
+one graph: addresses and applications are interned to small integers and edges aggregated
+by (source, destination, application) into flat arrays, so millions of conversations fit
+in a few arrays instead of millions of dicts. Neighbor, top edge and subnet queries run
+over those arrays, and memory stays bounded by keeping only the heaviest edges once
+max_edges is reached.
+
+Usage::
+
+    graph = FlowGraph(max_edges=2000000)
+    for group in session.get_ip_groups():
+        graph.add_records(session.iter_group_conversation_data(group.ID, payload))
+    graph.talkers('10.1.0.0/16', top=20)
+'''
+
+from __future__ import division
+from array import array
+from bisect import bisect_left, bisect_right
+from ipaddress import ip_address, ip_network
+import heapq
+import re
+
+#Record keys tried, in order, for each conversation field
+SOURCE_KEYS = ('src', 'srcIP', 'source', 'Source', 'SourceIP', 'srcip')
+DESTINATION_KEYS = ('dst', 'dstIP', 'destination', 'Destination', 'DestinationIP', 'dstip')
+APP_KEYS = ('app', 'application', 'Application', 'appName', 'App')
+BYTES_KEYS = ('bytes', 'Bytes', 'traffic', 'Traffic', 'volume', 'Volume', 'octets')
+
+_UNITS = {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12}
+_QUANTITY = re.compile(r'^\s*([0-9.,]+)\s*([KMGT]?)i?B?\s*$', re.IGNORECASE)
+
+_LOW = (1 << 64) - 1
+
+#Unsigned 64 bit array typecode, Python 2 only has 'L' (64 bit on LP64 platforms)
+try:
+    array('Q')
+    _U64 = 'Q'
+except ValueError:
+    _U64 = 'L'
+
+
+def parse_quantity(value):
+    '''Number from a number or a string like '1.5 MB' or '1,024'.'''
+
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _QUANTITY.match(str(value))
+    if match is None:
+        raise ValueError('Not a quantity: {0!r}'.format(value))
+    return float(match.group(1).replace(',', '')) * _UNITS[match.group(2).upper()]
+
+
+def _field(record, keys):
+    for key in keys:
+        if key in record:
+            return record[key]
+    raise KeyError('Conversation record has none of {0}'.format(keys))
+
+
+class FlowGraph(object):
+    '''
+    Aggregated conversation graph.
+
+    :param max_edges: edge count above which the graph is compacted to the heaviest
+        three quarters of that, None for no limit. Once compacted, totals are lower
+        bounds, see dropped_bytes.
+    :type max_edges: int
+    :param fields: optional (source, destination, application, bytes) key
+        tuples overriding SOURCE_KEYS etc. for add_record
+    :type fields: tuple
+    '''
+
+    def __init__(self, max_edges=None, fields=None):
+        self.max_edges = max_edges
+        self.fields = fields or (SOURCE_KEYS, DESTINATION_KEYS, APP_KEYS, BYTES_KEYS)
+
+        #Interned nodes: address text -> node ID, plus version and 128 bit value split
+        #in two 64 bit halves so IPv6 fits in arrays as well
+        self._node_ids = {}
+        self.addresses = []
+        self._version = array('B')
+        self._high = array(_U64)
+        self._low = array(_U64)
+
+        #Interned applications
+        self._app_ids = {}
+        self.apps = []
+
+        #Edges: packed (src, dst, app) key -> edge index, columns in arrays
+        self._edge_ids = {}
+        self._src = array('L')
+        self._dst = array('L')
+        self._app = array('L')
+        self._bytes = array('d')
+        self._count = array('L')
+
+        #Bytes of edges dropped to stay under max_edges
+        self.dropped_bytes = 0.0
+        self.records = 0
+
+        #Lazily built query indexes, reset by every change
+        self._by_address = None
+        self._adjacency = None
+
+    def __repr__(self):
+        return '<FlowGraph - Nodes:{0} Edges:{1} Records:{2}>'.format(
+            len(self.addresses),
+            len(self._src),
+            self.records
+        )
+
+    def __len__(self):
+        return len(self._src)
+
+    #=================================================================
+    # Building
+    #=================================================================
+
+    def _node(self, address):
+        node = self._node_ids.get(address)
+        if node is None:
+            parsed = ip_address(address if not isinstance(address, bytes) else address.decode('ascii'))
+            value = int(parsed)
+            node = self._node_ids[address] = len(self.addresses)
+            self.addresses.append(address)
+            self._version.append(parsed.version)
+            self._high.append(value >> 64)
+            self._low.append(value & _LOW)
+            self._by_address = None
+        return node
+
+    def _app_id(self, app):
+        app_id = self._app_ids.get(app)
+        if app_id is None:
+            app_id = self._app_ids[app] = len(self.apps)
+            self.apps.append(app)
+        return app_id
+
+    def add(self, src, dst, nbytes, app=None, count=1):
+        '''
+        Fold one conversation in.
+
+        :param src: source address
+        :type src: str
+        :param dst: destination address
+        :type dst: str
+        :param nbytes: traffic volume
+        :type nbytes: float
+        :param app: application name
+        :type app: str
+        :param count: conversations this record stands for
+        :type count: int
+        '''
+
+        s = self._node(src)
+        d = self._node(dst)
+        a = self._app_id(app)
+        key = (s << 80) | (d << 32) | a
+        edge = self._edge_ids.get(key)
+        if edge is None:
+            edge = self._edge_ids[key] = len(self._src)
+            self._src.append(s)
+            self._dst.append(d)
+            self._app.append(a)
+            self._bytes.append(nbytes)
+            self._count.append(count)
+            self._adjacency = None
+            if self.max_edges is not None and len(self._src) > self.max_edges:
+                self.compact(self.max_edges * 3 // 4)
+        else:
+            self._bytes[edge] += nbytes
+            self._count[edge] += count
+        self.records += 1
+
+    def add_record(self, record):
+        '''Fold one getConvData record (dict) in, see fields.'''
+
+        src_keys, dst_keys, app_keys, bytes_keys = self.fields
+        try:
+            app = _field(record, app_keys)
+        except KeyError:
+            app = None
+        self.add(
+            _field(record, src_keys),
+            _field(record, dst_keys),
+            parse_quantity(_field(record, bytes_keys)),
+            app
+        )
+
+    def add_records(self, records):
+        '''
+        Fold records in as they arrive, IE: from iter_group_conversation_data.
+
+        :param records: iterable of record dicts
+        :type records: iterable
+        :returns: records folded in
+        :rtype: int
+        '''
+
+        added = 0
+        for record in records:
+            self.add_record(record)
+            added += 1
+        return added
+
+    def compact(self, keep):
+        '''
+        Keep the keep heaviest edges and the nodes they use, drop the rest.
+        Dropped volume is added to dropped_bytes.
+
+        :param keep: edges kept
+        :type keep: int
+        '''
+
+        if len(self._src) <= keep:
+            return
+        kept = sorted(heapq.nlargest(keep, range(len(self._bytes)), key=self._bytes.__getitem__))
+        kept_bytes = sum(self._bytes[e] for e in kept)
+        self.dropped_bytes += sum(self._bytes) - kept_bytes
+
+        old = (self.addresses, self._version, self._high, self._low)
+        columns = [(self._src[e], self._dst[e], self._app[e], self._bytes[e], self._count[e]) for e in kept]
+
+        self._node_ids = {}
+        self.addresses = []
+        self._version = array('B')
+        self._high = array(_U64)
+        self._low = array(_U64)
+        self._edge_ids = {}
+        self._src = array('L')
+        self._dst = array('L')
+        self._app = array('L')
+        self._bytes = array('d')
+        self._count = array('L')
+
+        remap = {}
+
+        def node(old_id):
+            new_id = remap.get(old_id)
+            if new_id is None:
+                new_id = remap[old_id] = len(self.addresses)
+                address = old[0][old_id]
+                self._node_ids[address] = new_id
+                self.addresses.append(address)
+                self._version.append(old[1][old_id])
+                self._high.append(old[2][old_id])
+                self._low.append(old[3][old_id])
+            return new_id
+
+        for s, d, a, nbytes, count in columns:
+            s, d = node(s), node(d)
+            self._edge_ids[(s << 80) | (d << 32) | a] = len(self._src)
+            self._src.append(s)
+            self._dst.append(d)
+            self._app.append(a)
+            self._bytes.append(nbytes)
+            self._count.append(count)
+
+        self._by_address = None
+        self._adjacency = None
+
+    #=================================================================
+    # Queries
+    #=================================================================
+
+    def _sort_key(self, node):
+        return (self._version[node], self._high[node], self._low[node])
+
+    def _address_index(self):
+        if self._by_address is None:
+            order = sorted(range(len(self.addresses)), key=self._sort_key)
+            self._by_address = (order, [self._sort_key(n) for n in order])
+        return self._by_address
+
+    def _subnet_nodes(self, subnet):
+        #Nodes in subnet are a contiguous run of the address sorted index
+        network = ip_network(subnet if not isinstance(subnet, bytes) else subnet.decode('ascii'), strict=False)
+        first = int(network.network_address)
+        last = int(network.broadcast_address)
+        order, keys = self._address_index()
+        lo = bisect_left(keys, (network.version, first >> 64, first & _LOW))
+        hi = bisect_right(keys, (network.version, last >> 64, last & _LOW))
+        return order[lo:hi]
+
+    def _subnet_mask(self, subnet):
+        mask = bytearray(len(self.addresses))
+        for node in self._subnet_nodes(subnet):
+            mask[node] = 1
+        return mask
+
+    def _adjacent(self):
+        #CSR style: edges grouped by source and by destination, offsets per node
+        if self._adjacency is None:
+            n = len(self.addresses)
+            self._adjacency = (self._group_edges(self._src, n), self._group_edges(self._dst, n))
+        return self._adjacency
+
+    @staticmethod
+    def _group_edges(column, n):
+        offsets = array('L', [0]) * (n + 1)
+        for node in column:
+            offsets[node + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        position = array('L', offsets)
+        edges = array('L', [0]) * len(column)
+        for edge, node in enumerate(column):
+            edges[position[node]] = edge
+            position[node] += 1
+        return offsets, edges
+
+    def _edge_tuple(self, edge):
+        return (
+            self.addresses[self._src[edge]],
+            self.addresses[self._dst[edge]],
+            self.apps[self._app[edge]],
+            self._bytes[edge],
+            self._count[edge],
+        )
+
+    def neighbors(self, address, direction='out', top=None):
+        '''
+        Peers of an address with bytes exchanged, summed over applications.
+
+        :param address: host address
+        :type address: str
+        :param direction: 'out' for destinations it sent to, 'in' for sources that
+            sent to it, 'both' for either
+        :type direction: str
+        :param top: only the top heaviest peers
+        :type top: int
+        :returns: list of (peer address, bytes), heaviest first
+        :rtype: list
+        '''
+
+        node = self._node_ids.get(address)
+        if node is None:
+            return []
+        (out_offsets, out_edges), (in_offsets, in_edges) = self._adjacent()
+
+        totals = {}
+        if direction in ('out', 'both'):
+            for edge in out_edges[out_offsets[node]:out_offsets[node + 1]]:
+                peer = self._dst[edge]
+                totals[peer] = totals.get(peer, 0.0) + self._bytes[edge]
+        if direction in ('in', 'both'):
+            for edge in in_edges[in_offsets[node]:in_offsets[node + 1]]:
+                peer = self._src[edge]
+                totals[peer] = totals.get(peer, 0.0) + self._bytes[edge]
+
+        ranked = heapq.nlargest(top, totals.items(), key=lambda i: i[1]) if top else \
+            sorted(totals.items(), key=lambda i: i[1], reverse=True)
+        return [(self.addresses[peer], nbytes) for peer, nbytes in ranked]
+
+    def top_edges(self, n=10, app=None, src=None, dst=None):
+        '''
+        Heaviest edges, optionally limited to one application and source/destination subnets.
+
+        :param n: edges returned
+        :type n: int
+        :param app: application name
+        :type app: str
+        :param src: source subnet (IE: '10.0.0.0/8')
+        :type src: str
+        :param dst: destination subnet
+        :type dst: str
+        :returns: list of (source, destination, application, bytes, conversations)
+        :rtype: list
+        '''
+
+        app_id = self._app_ids.get(app) if app is not None else None
+        if app is not None and app_id is None:
+            return []
+        src_mask = self._subnet_mask(src) if src is not None else None
+        dst_mask = self._subnet_mask(dst) if dst is not None else None
+
+        def wanted():
+            for edge in range(len(self._src)):
+                if app_id is not None and self._app[edge] != app_id:
+                    continue
+                if src_mask is not None and not src_mask[self._src[edge]]:
+                    continue
+                if dst_mask is not None and not dst_mask[self._dst[edge]]:
+                    continue
+                yield edge
+
+        return [self._edge_tuple(e) for e in heapq.nlargest(n, wanted(), key=self._bytes.__getitem__)]
+
+    def talkers(self, subnet, direction='in', top=10, external=True):
+        '''
+        Hosts exchanging the most traffic with a subnet.
+
+        :param subnet: subnet (IE: '10.1.0.0/16')
+        :type subnet: str
+        :param direction: 'in' ranks sources sending into subnet, 'out' ranks
+            destinations subnet sends to
+        :type direction: str
+        :param top: hosts returned
+        :type top: int
+        :param external: leave out hosts inside subnet
+        :type external: bool
+        :returns: list of (address, bytes), heaviest first
+        :rtype: list
+        '''
+
+        mask = self._subnet_mask(subnet)
+        inside, outside = (self._dst, self._src) if direction == 'in' else (self._src, self._dst)
+        totals = {}
+        for edge in range(len(inside)):
+            if not mask[inside[edge]]:
+                continue
+            peer = outside[edge]
+            if external and mask[peer]:
+                continue
+            totals[peer] = totals.get(peer, 0.0) + self._bytes[edge]
+        ranked = heapq.nlargest(top, totals.items(), key=lambda i: i[1])
+        return [(self.addresses[peer], nbytes) for peer, nbytes in ranked]
+
+    def hosts_in(self, subnet):
+        '''Addresses in subnet seen in any conversation, in address order.'''
+
+        return [self.addresses[node] for node in self._subnet_nodes(subnet)]
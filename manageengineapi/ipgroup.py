@@ -4,10 +4,12 @@ modify, and delete methods of API session relating to IP Group will return objec
 here instead of JSON.
 '''
 
-from ipaddress import ip_network, IPv4Address, AddressValueError
+from ipaddress import ip_network, ip_address, IPv6Address
+from functools import total_ordering
+from .tracking import ChangeTracking, TrackedList
 import re
 
-class IPGroup(object):
+class IPGroup(ChangeTracking):
     '''
     IP Group object. Group can either be defined by include/exclude of IPNetwork and IPRange 
     objects or defined as between IPNetwork objects. It can not contain both.
@@ -31,8 +33,16 @@ class IPGroup(object):
     :type ID: str
     :param status: group type. include/exclude for IPs/networks, between for traffic between IPs
     :type status: str
+
+    Assignments to attributes and changes to the ip list are tracked, see changed and
+    is_dirty. In-place edits of IPNetwork/IPRange objects already in the list are not.
     '''
 
+    TRACKED = (
+        'app', 'dscp', 'name', 'description', 'speed', 'ID', 'to_ip_type', 'status',
+        'asso_device', 'asso_dev_id', 'ip', 'is_between'
+    )
+
     def __init__(self, **kwargs):
         self.app = kwargs.get('app', 'All')
         self.dscp = kwargs.get('dscp', 'All')
@@ -55,12 +65,60 @@ class IPGroup(object):
         #Track state of between relationships
         self.is_between = kwargs.get('is_between', False)
 
+        #Sub-groups a large group is stored as, see chunking.GroupChunker
+        self.parts = kwargs.get('parts', [])
+
+    def __setattr__(self, name, value):
+        #Keep ip list tracked no matter how it gets assigned
+        if name == 'ip' and not isinstance(value, TrackedList):
+            value = TrackedList(self, 'ip', value)
+        ChangeTracking.__setattr__(self, name, value)
+
     def __repr__(self):
         return '<IPGroup - Name:{0} ID:{1}>'.format(
             self.name,
             self.ID
         )
 
+    def _encode_payload(self, variant):
+        return {
+            'GroupName': self.name,
+            'Desc': self.description,
+            'speed': self.speed,
+            'DevList': self.asso_dev_id,
+            'status': ','.join([s.status for s in self.ip]),
+            'IPData': '-'.join([i.api_format for i in self.ip]),
+            'IPType': ','.join([t.type.lower() for t in self.ip]),
+            'ToIPType': self.to_ip_type,
+        }
+
+    @classmethod
+    def from_api(cls, ipg):
+        '''
+        Build IPGroup from a single entry of listIPGroup JSON response['IPGroup_List'].
+
+        :param ipg: IP group dict from API
+        :type ipg: dict
+        :rtype: manageengineapi.IPGroup
+        '''
+
+        ip_obj = cls(
+            app = ipg['app'],
+            dscp = ipg['dscp'],
+            name = ipg['base']['Name'],
+            description = ipg['base']['desc'],
+            speed = ipg['base']['speed'],
+            status = ipg['base']['status'],
+            ID = ipg['base']['ID'],
+            asso_device = ipg['Asso_Device'],
+            asso_dev_id = ipg['Asso_Dev_id']
+        )
+
+        #Call method to translate JSON to IP objects
+        ip_obj.process_api_group_list(ipg['ip'])
+        ip_obj.mark_clean()
+        return ip_obj
+
     def add_ip(self, obj):
         '''
         Method to add IPNetwork or IPRange to IPGroup object. Using this method instead of
@@ -169,11 +227,100 @@ class IPGroup(object):
                     ))
  
 
-class IPNetwork(object):
+#Python 2.x IPv6 addresses overflow into long
+try:
+    _INTEGER_TYPES = (int, long)
+except NameError:
+    _INTEGER_TYPES = (int,)
+
+
+def _as_text(value):
+    #ipaddress only accepts unicode strings on python 2.x
+    if isinstance(value, bytes):
+        return value.decode('ascii')
+    return value
+
+
+def _address(version, value):
+    #ip_address picks the family from the integer, small IPv6 values would come back IPv4
+    return ip_address(value) if version == 4 else IPv6Address(value)
+
+
+@total_ordering
+class IPSpan(object):
+    '''
+    Base for IPNetwork and IPRange. Every definition is stored as inclusive integer
+    bounds first/last plus address family version, so membership, overlap, sorting
+    and hashing are plain integer comparisons. IPv4 and IPv6 definitions never
+    contain or overlap each other, and sort IPv4 first. Definitions with the same bounds
+    sort by type then status, the fields equality compares.
+    '''
+
+    @property
+    def bounds(self):
+        '''(version, first, last) tuple'''
+
+        return (self.version, self.first, self.last)
+
+    @property
+    def num_addresses(self):
+        return self.last - self.first + 1
+
+    def __contains__(self, item):
+        if isinstance(item, IPSpan):
+            return item.version == self.version and \
+                self.first <= item.first and item.last <= self.last
+        if isinstance(item, _INTEGER_TYPES) and not isinstance(item, bool):
+            return self.first <= item <= self.last
+        try:
+            address = ip_address(_as_text(item))
+        except ValueError:
+            network = ip_network(_as_text(item))
+            return network.version == self.version and \
+                self.first <= int(network.network_address) and \
+                int(network.broadcast_address) <= self.last
+        return address.version == self.version and self.first <= int(address) <= self.last
+
+    def overlaps(self, other):
+        '''
+        Whether any address is covered by both definitions.
+
+        :param other: IPNetwork or IPRange
+        :type other: manageengineapi.ipgroup.IPSpan
+        :rtype: bool
+        '''
+
+        return self.version == other.version and \
+            self.first <= other.last and other.first <= self.last
+
+    def __eq__(self, other):
+        if not isinstance(other, IPSpan):
+            return NotImplemented
+        return self.type == other.type and self.bounds == other.bounds and \
+            self.status == other.status
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def _order_key(self):
+        #Same fields as __eq__, so total_ordering's <= and >= agree with ==
+        return (self.bounds, self.type, str(self.status))
+
+    def __lt__(self, other):
+        if not isinstance(other, IPSpan):
+            return NotImplemented
+        return self._order_key() < other._order_key()
+
+    def __hash__(self):
+        return hash((self.type, self.bounds, self.status))
+
+
+class IPNetwork(IPSpan):
     '''
     Object for both network and host objects. Hosts should be passed in with /32
-    subnet mask, or else they will be created as network object with appropriate
-    CIDR mask.
+    (/128 for IPv6) subnet mask, or else they will be created as network object with
+    appropriate CIDR mask. Hosts are sent to the API as IPAddress type.
 
     :param cidr: network or host in CIDR format
     :type cidr: str
@@ -185,32 +332,58 @@ class IPNetwork(object):
         
         #Validate CIDR value passed is valid
         try:
-            self.cidr = ip_network(cidr)
+            network = ip_network(_as_text(cidr))
         except ValueError:
             raise ValueError('Invalid CIDR address passed to IPNetwork constructor')
 
+        self._cidr = network
+        self.version = network.version
+        self.prefixlen = network.prefixlen
+        self.first = int(network.network_address)
+        self.last = int(network.broadcast_address)
+        self.status = status
+        self.network = str(network.network_address)
+
+        #IPv6 has no dotted netmask notation, API gets prefix length instead
+        if self.version == 4:
+            self.netmask = str(network.netmask)
+        else:
+            self.netmask = str(network.prefixlen)
+
         #Set boolean for host or network
-        if self.cidr.exploded.split('/') == '32':
+        if network.prefixlen == network.max_prefixlen:
             self.is_host = True
             self.type = 'IPAddress'
+            self.api_format = self.network
         else:
             self.is_host = False
             self.type = 'IPNetwork'
-
-        self.status = status
-        self.network = self.cidr.with_netmask.split('/')[0]
-        self.netmask = self.cidr.with_netmask.split('/')[1]
-        self.api_format = ','.join([self.network, self.netmask])
+            self.api_format = ','.join([self.network, self.netmask])
        
+    @property
+    def cidr(self):
+        '''Network as ipaddress IPv4Network/IPv6Network object.'''
+
+        #Not pickled, rebuilt from integer bounds on first use after unpickling
+        if '_cidr' not in self.__dict__:
+            self._cidr = ip_network(u'{0}/{1}'.format(_address(self.version, self.first), self.prefixlen))
+        return self._cidr
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_cidr', None)
+        return state
+
     def __repr__(self):
         return '<IPNetwork - Network: {0} Netmask: {1}>'.format(
             self.network,
             self.netmask
         )        
  
-class IPRange(object):
+class IPRange(IPSpan):
     '''
-    Object for IP range. Addresses will be stored as IPv4Address objects.
+    Object for IP range. Addresses will be stored as IPv4Address or IPv6Address objects,
+    both ends must be of the same family.
 
     :param rangestart: IP at beginning of range
     :type rangestart: str
@@ -224,21 +397,47 @@ class IPRange(object):
 
     def __init__(self, **kwargs):
         try:
-            self.start = IPv4Address(kwargs.get('rangestart'))
-            self.end = IPv4Address(kwargs.get('rangeend'))
-        except AddressValueError:
+            start = ip_address(_as_text(kwargs.get('rangestart')))
+            end = ip_address(_as_text(kwargs.get('rangeend')))
+        except ValueError:
             raise ValueError('Invalid start/end address passed to IPRange constructor') 
 
+        if start.version != end.version or start > end:
+            raise ValueError('IPRange start/end must be same address family, start before end')
+
+        self._start = start
+        self._end = end
+        self.version = start.version
+        self.first = int(start)
+        self.last = int(end)
+
         self.status = kwargs.get('status')
         self.type = 'IPRange'
         self.netmask = kwargs.get('netmask')
-        self.api_format = ','.join(
-            [
-                self.start.exploded.split('/')[0], 
-                self.end.exploded.split('/')[0], 
-                self.netmask
-            ]
-        )
+        self.api_format = ','.join([str(start), str(end), self.netmask])
+
+    @property
+    def start(self):
+        '''First address as ipaddress object.'''
+
+        #Not pickled, rebuilt from integer bounds on first use after unpickling
+        if '_start' not in self.__dict__:
+            self._start = _address(self.version, self.first)
+        return self._start
+
+    @property
+    def end(self):
+        '''Last address as ipaddress object.'''
+
+        if '_end' not in self.__dict__:
+            self._end = _address(self.version, self.last)
+        return self._end
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_start', None)
+        state.pop('_end', None)
+        return state
 
     def __repr__(self):
         return '<IPRange - Start:{0} End:{1}>'.format(
@@ -0,0 +1,513 @@
+'''
+Load generator for NFA. Simulated clients, each with its own NFApi session and login(),
+run a weighted mix of NFApi calls for a fixed duration against a real server or a local
+stand-in. Throughput, latency percentiles and error rates are reported per method as JSON
+together with the run configuration, so runs can be compared against each other.
+
+Usage::
+
+    NFA_HOST=nfa.example.com NFA_API_KEY=... NFA_USER=... NFA_PASSWORD=... \\
+        python -m manageengineapi.loadtest --clients 20 --duration 60 \\
+        --mix get_ip_groups=5,get_bill_plans=2,get_group_traffic_data=3
+    python -m manageengineapi.loadtest --stand-in --clients 50 --latency 0.05 --output run.json
+    python -m manageengineapi.loadtest --stand-in --clients 100 --compare run.json
+'''
+
+from __future__ import print_function, division
+from . import __version__
+from .manageengineapi import NFApi
+from .bench import synthetic_ip_groups, synthetic_bill_plans, synthetic_devices
+from .query import DEFAULT_PAYLOAD
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    #Python 2.x
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+_clock = time.perf_counter if hasattr(time, 'perf_counter') else time.time
+
+DEFAULT_MIX = 'get_ip_groups=4,get_bill_plans=2,get_dev_list=1,get_group_traffic_data=3'
+
+PERCENTILES = (50, 95, 99)
+
+
+#=================================================================
+# Operations
+#=================================================================
+
+def _group_id(client):
+    return client.rng.choice(client.group_ids)
+
+
+def _traffic(client):
+    gid = _group_id(client)
+    payload = dict(DEFAULT_PAYLOAD, DeviceID=gid)
+    return client.session.get_group_traffic_data(gid, payload)
+
+
+def _conversation(client):
+    gid = _group_id(client)
+    payload = {
+        'DeviceID': gid,
+        'Count': '10',
+        'Data': 'IN',
+        'isNetwork': 'OFF',
+        'ResolveDNS': 'false',
+        'pageCount': '1',
+        'IPGroup': 'true',
+        'rows': '10',
+        'TimeFrame': 'today',
+        'expand': 'true',
+    }
+    return client.session.get_group_conversation_data(gid, payload)
+
+
+#Read-only NFApi calls a mix can be made of: name -> (callable(client), needs group IDs)
+OPERATIONS = {
+    'get_ip_groups': (lambda client: client.session.get_ip_groups(), False),
+    'get_bill_plans': (lambda client: client.session.get_bill_plans(), False),
+    'get_dev_list': (lambda client: client.session.get_dev_list(), False),
+    'get_billing_index': (lambda client: client.session.get_billing_index(), False),
+    'get_group_traffic_data': (_traffic, True),
+    'get_group_conversation_data': (_conversation, True),
+}
+
+
+def parse_mix(text):
+    '''
+    Parse a call mix like 'get_ip_groups=5,get_dev_list=1' into a dict of weights.
+    A name without weight counts as 1.
+
+    :rtype: dict
+    '''
+
+    mix = {}
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError('Unknown operation {0}, choose from {1}'.format(name, sorted(OPERATIONS)))
+        mix[name] = float(weight) if weight else 1.0
+        if mix[name] <= 0:
+            raise ValueError('Weight of {0} must be positive'.format(name))
+    if not mix:
+        raise ValueError('Call mix is empty')
+    return mix
+
+
+#=================================================================
+# Statistics
+#=================================================================
+
+def percentile(samples, pct):
+    '''Nearest-rank percentile of sorted samples.'''
+
+    if not samples:
+        return None
+    rank = max(1, int(math.ceil(pct / 100.0 * len(samples))))
+    return samples[rank - 1]
+
+
+class MethodStats(object):
+    '''Latencies and errors of one method, shared by all clients.'''
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, latency, error=None):
+        with self._lock:
+            if error is None:
+                self.latencies.append(latency)
+            else:
+                name = type(error).__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed):
+        with self._lock:
+            samples = sorted(self.latencies)
+            errors = dict(self.errors)
+
+        failed = sum(errors.values())
+        calls = len(samples) + failed
+        result = {
+            'calls': calls,
+            'errors': failed,
+            'error_rate': failed / calls if calls else 0.0,
+            'error_types': errors,
+            'throughput': len(samples) / elapsed if elapsed else 0.0,
+            'mean': sum(samples) / len(samples) if samples else None,
+            'max': samples[-1] if samples else None,
+        }
+        for pct in PERCENTILES:
+            result['p{0}'.format(pct)] = percentile(samples, pct)
+        return result
+
+
+#=================================================================
+# Clients
+#=================================================================
+
+class LoadClient(object):
+    '''
+    One simulated client: own NFApi session, own login, own random stream.
+
+    :param factory: callable returning a new, not logged in NFApi
+    :type factory: function
+    :param mix: operation name -> weight
+    :type mix: dict
+    :param stats: method name -> MethodStats
+    :type stats: dict
+    :param seed: seed of this client's operation choices
+    :type seed: int
+    :param rate: target calls per second of this client, 0 for back to back
+    :type rate: float
+    '''
+
+    def __init__(self, factory, mix, stats, seed, rate=0):
+        self.factory = factory
+        self.stats = stats
+        self.rate = rate
+        self.rng = random.Random(seed)
+        self.session = None
+        self.group_ids = []
+
+        self._names = sorted(mix)
+        total = sum(mix.values())
+        self._cumulative = []
+        running = 0.0
+        for name in self._names:
+            running += mix[name] / total
+            self._cumulative.append(running)
+
+    def _choose(self):
+        roll = self.rng.random()
+        for name, edge in zip(self._names, self._cumulative):
+            if roll < edge:
+                return name
+        return self._names[-1]
+
+    def _timed(self, name, func):
+        started = _clock()
+        try:
+            result = func()
+        except Exception as e:
+            self.stats[name].record(_clock() - started, e)
+            return None, e
+        self.stats[name].record(_clock() - started)
+        return result, None
+
+    def _login(self):
+        self.session = self.factory()
+
+        def login():
+            self.session.login()
+            if not self.session.logged_in:
+                raise RuntimeError('Login failed')
+
+        _, error = self._timed('login', login)
+        if error is not None:
+            return False
+
+        if any(OPERATIONS[name][1] for name in self._names):
+            try:
+                self.group_ids = [g.ID for g in self.session.get_ip_groups()]
+            except Exception:
+                self.group_ids = []
+            if not self.group_ids:
+                self.stats['login'].record(0, LookupError('No IP groups for group operations'))
+                return False
+        return True
+
+    def run(self, deadline):
+        '''Log in, then issue calls until deadline (clock seconds).'''
+
+        if not self._login():
+            return
+
+        interval = 1.0 / self.rate if self.rate else 0
+        next_call = _clock()
+        while True:
+            now = _clock()
+            if now >= deadline:
+                break
+            if interval:
+                if next_call > now:
+                    time.sleep(min(next_call - now, deadline - now))
+                    continue
+                next_call += interval
+            name = self._choose()
+            self._timed(name, lambda: OPERATIONS[name][0](self))
+
+        try:
+            self.session.logout()
+        except Exception:
+            pass
+
+
+def run(factory, mix, clients=10, duration=30, rate=0, ramp=0, seed=0):
+    '''
+    Run a load test.
+
+    :param factory: callable returning a new, not logged in NFApi per client
+    :type factory: function
+    :param mix: operation name -> weight, see parse_mix
+    :type mix: dict
+    :param clients: concurrent simulated clients
+    :type clients: int
+    :param duration: seconds of load after the last client started
+    :type duration: float
+    :param rate: target calls per second per client, 0 for back to back
+    :type rate: float
+    :param ramp: seconds over which client starts are spread
+    :type ramp: float
+    :param seed: base seed, client N uses seed + N so mixes repeat between runs
+    :type seed: int
+    :returns: report
+    :rtype: dict
+    '''
+
+    stats = dict((name, MethodStats()) for name in list(mix) + ['login'])
+    started = _clock()
+    deadline = started + ramp + duration
+
+    threads = []
+    for n in range(clients):
+        client = LoadClient(factory, mix, stats, seed + n, rate)
+        thread = threading.Thread(target=client.run, args=(deadline,))
+        thread.daemon = True
+        threads.append(thread)
+        thread.start()
+        if ramp and clients > 1:
+            time.sleep(ramp / (clients - 1))
+
+    for thread in threads:
+        thread.join()
+    elapsed = _clock() - started
+
+    results = dict((name, s.report(elapsed)) for name, s in stats.items())
+    calls = sum(r['calls'] for name, r in results.items() if name != 'login')
+    errors = sum(r['errors'] for name, r in results.items() if name != 'login')
+    return {
+        'package_version': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'created': time.time(),
+        'config': {
+            'clients': clients,
+            'duration': duration,
+            'rate': rate,
+            'ramp': ramp,
+            'seed': seed,
+            'mix': mix,
+        },
+        'elapsed': elapsed,
+        'totals': {
+            'calls': calls,
+            'errors': errors,
+            'error_rate': errors / calls if calls else 0.0,
+            'throughput': (calls - errors) / elapsed if elapsed else 0.0,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    '''
+    Per-method change of a report against a baseline report, as ratios
+    (1.25 means 25% higher than baseline).
+
+    :rtype: dict
+    '''
+
+    def ratio(new, old):
+        if new is None or not old:
+            return None
+        return new / old
+
+    comparison = {}
+    for name, result in report['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            continue
+        comparison[name] = dict(
+            (key, ratio(result[key], old.get(key)))
+            for key in ['throughput', 'mean'] + ['p{0}'.format(p) for p in PERCENTILES]
+        )
+        comparison[name]['error_rate_delta'] = result['error_rate'] - old.get('error_rate', 0.0)
+    return comparison
+
+
+#=================================================================
+# Local stand-in server
+#=================================================================
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInServer(object):
+    '''
+    Local HTTP server imitating NFA well enough for NFApi: the login sequence
+    (JSESSIONID, encrypted password, j_security_check redirects setting NFA__SSO),
+    list endpoints from canned bodies and a generic success reply for everything
+    else, each answered after a fixed latency.
+
+    :param bodies: response bodies keyed by URI, synthetic ones if None
+    :type bodies: dict
+    :param latency: seconds added to every response
+    :type latency: float
+    '''
+
+    def __init__(self, bodies=None, latency=0.0, host='127.0.0.1', port=0):
+        if bodies is None:
+            bodies = {
+                NFApi.LISTIPGROUP_URI: synthetic_ip_groups(200),
+                NFApi.LISTBILLPLAN_URI: synthetic_bill_plans(20, 200),
+                NFApi.LISTDEVLIST_URI: synthetic_devices(20),
+                NFApi.TRAFFICDATA_URI: {'data': [[i * 60000, i % 17] for i in range(60)]},
+                NFApi.CONVERSATION_URI: {'Conversation': []},
+            }
+        encoded = dict(
+            (uri, body if isinstance(body, bytes) else json.dumps(body).encode('utf-8'))
+            for uri, body in bodies.items()
+        )
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(handler, body=b'', status=200, headers=()):
+                with stand_in._lock:
+                    stand_in.requests += 1
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                handler.send_response(status)
+                for name, value in headers:
+                    handler.send_header(name, value)
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def do_GET(handler):
+                path = handler.path.split('?')[0]
+                if path == '/':
+                    handler._reply(b'<html></html>', headers=[('Set-Cookie', 'JSESSIONID=standin; Path=/')])
+                elif path == '/standin/sso':
+                    #Same shape as NFA's second redirect hop, NFA__SSO is the 4th token
+                    handler._reply(status=302, headers=[
+                        ('Location', '/standin/home'),
+                        ('Set-Cookie', 'JSESSIONIDSSO=standin; Path=/; HttpOnly, NFA__SSO=standin; Path=/'),
+                    ])
+                elif path == '/standin/home':
+                    handler._reply(b'<html></html>')
+                else:
+                    handler._reply(encoded.get(path, b'{"message": "ok"}'),
+                                   headers=[('Content-Type', 'application/json;charset=UTF-8')])
+
+            def do_POST(handler):
+                length = int(handler.headers.get('Content-Length') or 0)
+                handler.rfile.read(length)
+                path = handler.path.split('?')[0]
+                if path == '/servlets/Settings/Serverlet':
+                    handler._reply(b'standin')
+                elif path.startswith('/j_security_check'):
+                    handler._reply(status=302, headers=[('Location', '/standin/sso')])
+                else:
+                    handler._reply(b'{"message": "ok"}',
+                                   headers=[('Content-Type', 'application/json;charset=UTF-8')])
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    def __repr__(self):
+        return '<StandInServer - Address:{0} Latency:{1}>'.format(self.address, self.latency)
+
+    @property
+    def address(self):
+        '''host:port for NFApi hostname argument.'''
+
+        return '{0}:{1}'.format(*self.server.server_address[:2])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m manageengineapi.loadtest', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load after ramp up')
+    parser.add_argument('--ramp', type=float, default=0, help='seconds over which clients start')
+    parser.add_argument('--rate', type=float, default=0, help='calls per second per client, 0 for back to back')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation=weight list, choose from: ' + ', '.join(sorted(OPERATIONS)))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stand-in', action='store_true', help='run against a local stand-in server instead of NFA_HOST')
+    parser.add_argument('--latency', type=float, default=0.0, help='stand-in response latency in seconds')
+    parser.add_argument('--compare', help='baseline report to compare against')
+    parser.add_argument('--output', help='write JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    stand_in = None
+    if args.stand_in:
+        stand_in = StandInServer(latency=args.latency).start()
+        credentials = (stand_in.address, 'standin', 'standin', 'standin')
+    else:
+        #Credentials come from environment so they stay out of process listings
+        credentials = (
+            os.environ['NFA_HOST'],
+            os.environ['NFA_API_KEY'],
+            os.environ['NFA_USER'],
+            os.environ['NFA_PASSWORD']
+        )
+
+    try:
+        report = run(lambda: NFApi(*credentials), mix, args.clients, args.duration,
+                     args.rate, args.ramp, args.seed)
+    finally:
+        if stand_in is not None:
+            stand_in.stop()
+
+    report['target'] = 'stand-in' if stand_in is not None else credentials[0]
+    if args.compare:
+        with open(args.compare) as f:
+            report['comparison'] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
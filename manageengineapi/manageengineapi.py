@@ -1,9 +1,19 @@
 from __future__ import print_function
 from .ipgroup import IPGroup, IPRange, IPNetwork
-from .billing import BillPlan
+from .billing import BillPlan, BillingIndex
 from .device import Device
-from .exceptions import NFApiError
+from .exceptions import NFApiError, NFApiSessionExpired
+from .cache import ParseCache
+from .stream import iter_json_array, JSONStreamError
+from .parallel import parse_ip_groups
+from .query import stitch
+from .registry import Registry
+from .chunking import GroupChunker, is_part_name
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 import requests
+from requests.exceptions import ChunkedEncodingError
+import threading
 import json
 import random
 
@@ -13,11 +23,30 @@ try:
 except:
     JSONDecodeError = None
 
-class NFApi:
+class NFApi(object):
 
     '''Class for interacting with ManageEngine Netflow Analyzer API. 
     API calls are handled with requests session object. All GETs
     against API will return JSON object to caller. 
+
+    Pass an AdaptiveLimiter as limiter to have all GET/POST calls back off
+    automatically when the server starts returning slow or failed responses.
+    Pass a RetryPolicy as retry to retry failed GETs with backoff. Calls that
+    hit an expired session log back in once and are replayed. With cache_parsed
+    set, get_ip_groups and get_bill_plans only rebuild entries whose JSON changed
+    since the previous call and hand out the same objects for the rest.
+
+    With thread_safe set, one logged in NFApi can be shared by a pool of worker
+    threads. Every thread gets its own requests session sharing the connection
+    pools and auth cookies of the main one, and login is serialized. Calls never
+    mutate shared headers or the caller's payload dict in either mode.
+
+    Groups and plans seen through list, add and modify calls are indexed by ID and
+    name in registry, see get_ip_group and get_bill_plan.
+
+    With max_payload set, IP groups whose add/modify payload is larger than that many
+    bytes are stored as several sub-groups and merged back on read, see
+    manageengineapi.chunking.
     '''
 
     #API URIs
@@ -35,6 +64,24 @@ class NFApi:
     LOGIN_URI = '/apiclient/ember/Login.jsp'
     LOGOUT_URI = '/apiclient/ember/Logout.jsp'
 
+    #Pages an expired session gets redirected to, and error text NFA uses for bad sessions.
+    #Markers are whole phrases, other errors that merely mention a session must not
+    #trigger a login and a replayed POST.
+    LOGIN_PAGES = ('Login.jsp', 'j_security_check')
+    SESSION_ERROR_MARKERS = (
+        'session expired', 'session has expired', 'session timed out', 'session timeout',
+        'invalid session', 'session is invalid', 'not logged in', 'not authenticated'
+    )
+
+    #Message returned by modify methods when object has nothing to push
+    UNCHANGED_MESSAGE = 'No changes to push'
+
+    #Headers sent with credentials POST only, never set on the session
+    LOGIN_HEADERS = {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Accept-Encoding': 'gzip, deflate',
+    }
+
     #HTTP headers data
     GET_HEADERS = {
         "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64; rv:20.0) Gecko/20100101 Firefox/20.0",
@@ -45,7 +92,9 @@ class NFApi:
         "Connection": "keep-alive",
     }
 
-    def __init__(self, hostname, api_key, user, password, port='8080', protocol='http', timeout=30):
+    def __init__(self, hostname, api_key, user, password, port='8080', protocol='http', timeout=30,
+                 limiter=None, retry=None, auto_relogin=True, cache_parsed=False, thread_safe=False,
+                 max_payload=None):
         
         self.hostname = hostname
         self.api_key = api_key
@@ -53,77 +102,315 @@ class NFApi:
         self.protocol = protocol
         self.user = user
         self.password = password
-        self.request = requests.Session()
+        self._session = requests.Session()
         self.logged_in = False
         self.NFA_SSO = None
 
+        #Optional AdaptiveLimiter shared by all GET/POST calls
+        self.limiter = limiter
+
+        #Optional RetryPolicy for GETs, and whether to log back in on session expiry
+        self.retry = retry
+        self.auto_relogin = auto_relogin
+        self._login_lock = threading.RLock()
+
+        #Per-thread sessions, resynced with main session whenever auth generation changes
+        self.thread_safe = thread_safe
+        self._local = threading.local()
+        self._generation = 0
+
+        #Reuse IPGroup/BillPlan objects for list entries that did not change between calls
+        self.parse_cache = ParseCache() if cache_parsed else None
+
+        #IPGroup/BillPlan objects by ID and name, kept in step with add/modify/delete
+        self.registry = Registry()
+
+        #Split IP groups with payloads over max_payload bytes into sub-groups
+        self.chunker = GroupChunker(max_payload) if max_payload else None
+
+    @property
+    def request(self):
+        '''requests session for the calling thread. Without thread_safe this is
+        always the main session.
+        '''
+
+        if not self.thread_safe or not isinstance(self._session, requests.Session):
+            return self._session
+
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            with self._login_lock:
+                session = requests.Session()
+
+                #Share connection pools, urllib3 pool managers are thread safe
+                session.adapters = self._session.adapters
+                session.headers.update(self._session.headers)
+                session.cookies.update(self._session.cookies)
+                local.session = session
+                local.generation = self._generation
+        return local.session
+
+    @request.setter
+    def request(self, session):
+        self._session = session
+        self._generation += 1
+
     #=================================================================
     # Shared/General Methods
     #=================================================================
 
-    def _get(self, uri, payload={}):
+    def _is_logged_in(self):
+        '''Whether session is logged in, waiting out a relogin in progress on
+        another thread, which holds the login lock while logged_in is False.
+        '''
+
+        if self.logged_in:
+            return True
+        with self._login_lock:
+            return self.logged_in
+
+    def _get(self, uri, payload=None, stream=False):
         '''Method used for GET functions of API.
         Payload must be passed in as dictionary, not kwargs.
+        With stream set, body is left unread for the caller to iterate.
         '''
 
         #Validate session is logged in
-        if not self.logged_in:
+        if not self._is_logged_in():
             raise Exception('Session is not logged in.')
 
+        #Add API Key to copy of payload, caller's dict may be shared between threads
+        payload = dict(payload or {})
+        payload['apiKey'] = self.api_key
+
+        return self._request('get', uri, params=payload, stream=stream)
+
+    def _post(self, uri, payload=None):
+        '''Method used for POST functions of API.'''
+
+        #Validate session is logged in
+        if not self._is_logged_in():
+            raise Exception('Session is not logged in')
+
+        #Add API key to copy of payload
+        payload = dict(payload or {})
+        payload['apiKey'] = self.api_key
+
+        return self._request('post', uri, data=payload)
+
+    def _request(self, method, uri, **kwargs):
+        '''Send request, retrying idempotent GETs with backoff and replaying
+        any call that bounced off an expired session after logging back in.
+        '''
+
         url = '{0:s}://{1:s}{2:s}'.format(
             self.protocol,
             self.hostname,
             uri,
         )
+        retryable = method == 'get' and self.retry is not None
+        attempt = 0
+        relogged = False
 
-        #Add API Key to payload
-        payload['apiKey'] = self.api_key
+        while True:
+            token = self.NFA_SSO
+            try:
+                response = self._send(method, uri, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not retryable or attempt >= self.retry.retries:
+                    raise
+                attempt += 1
+                self.retry.sleep(attempt)
+                continue
+            except NFApiSessionExpired:
+                if relogged or not self.auto_relogin:
+                    raise
+                self._relogin(token)
+                relogged = True
+                continue
+
+            if retryable and response.status_code in self.retry.status_forcelist \
+                    and attempt < self.retry.retries:
+                #Streamed responses hold their connection until closed
+                response.close()
+                attempt += 1
+                self.retry.sleep(attempt)
+                continue
+
+            return response
+
+    def _send(self, method, uri, url, **kwargs):
+        '''Single HTTP exchange, wrapped by adaptive limiter if session has one.'''
+
+        started = self._acquire(uri)
+        error = True
+        try:
+            response = getattr(self.request, method)(url, **kwargs)
+            error = response.status_code >= 500
+            if uri != NFApi.LOGOUT_URI and self._session_expired(response):
+                raise NFApiSessionExpired('Session expired calling {0}'.format(uri))
+            if method == 'get' and not kwargs.get('stream'):
+                self._check_response(response)
+            elif method == 'post' and not error:
+                #Write calls hand error payloads back to the caller, the limiter
+                #still has to count them to back off from an overloaded server
+                error = self._error_body(response) is not None
+        except NFApiError:
+            error = True
+            raise
+        finally:
+            self._release(uri, started, error)
+
+        return response
+
+    def _session_expired(self, response):
+        '''Expired sessions get redirected back to the login page.'''
+
+        if response.status_code == 401:
+            return True
+        if response.history:
+            return any(page in response.url for page in NFApi.LOGIN_PAGES)
+        return False
+
+    def _error_body(self, response):
+        '''Decoded body if response carries an error payload, otherwise None.'''
+
+        #Error payloads always carry an "error" key. Skip decoding large list
+        #bodies here when they can't contain one, callers decode them anyway.
+        if b'"error"' not in response.content:
+            return None
 
-        response = self.request.get(url, params = payload)
-        
         #Check for 5000 errors/invalid API key
         #If response is string, can't JSON serialize
         try:
-            if isinstance(response.json(), dict):
-                if response.json().get('error'):
-                    raise NFApiError('{0}: {1}'.format(
-                        response.json()['error']['code'],
-                        response.json()['error']['message']
-                        )
-                    )
+            body = response.json()
         except JSONDecodeError:
             #received valid string response, python3.x
-            pass
+            return None
         except ValueError:
             #received valid string response, python2.x
-            pass
-        except NFApiError:
-            raise NFApiError('{0}: {1}'.format(
-                response.json()['error']['code'],
-                response.json()['error']['message']
-                )
+            return None
+
+        if isinstance(body, dict) and body.get('error'):
+            return body
+        return None
+
+    def _check_response(self, response):
+        '''Raise NFApiError if response carries an error payload.'''
+
+        body = self._error_body(response)
+        if body is not None:
+            self._raise_for_error(body)
+
+    def _raise_for_error(self, body):
+        '''Raise NFApiError, or NFApiSessionExpired, for decoded error payloads.'''
+
+        if isinstance(body, dict) and body.get('error'):
+            message = '{0}: {1}'.format(
+                body['error']['code'],
+                body['error']['message']
             )
+            if any(m in message.lower() for m in NFApi.SESSION_ERROR_MARKERS):
+                raise NFApiSessionExpired(message)
+            raise NFApiError(message)
 
-        return response
+    def _stream(self, uri, payload, key, chunk_size):
+        '''Yield elements of array under key as response body downloads.
 
-    def _post(self, uri, payload={}):
-        '''Method used for POST functions of API.'''
+        Error payloads only show up once the body is read, after _request returned, so
+        expired sessions and dropped connections are handled here the same way: log back
+        in or retry with backoff, as long as no element was handed out yet.
+        '''
 
-        #Validate session is logged in
-        if not self.logged_in:
-            raise Exception('Session is not logged in')
-        
-        url = '{0:s}://{1:s}{2:s}'.format(
-            self.protocol,
-            self.hostname,
-            uri
-        )
+        attempt = 0
+        relogged = False
 
-        #Add API key to kwargs dict
-        payload['apiKey'] = self.api_key
+        while True:
+            token = self.NFA_SSO
+            response = self._get(uri, payload, stream=True)
+            started = False
+            chunks = response.iter_content(chunk_size)
+            try:
+                for item in iter_json_array(chunks, key, response.encoding or 'utf-8'):
+                    started = True
+                    yield item
+                return
+            except JSONStreamError as e:
+                #No array in body, most likely an error payload
+                try:
+                    body = json.loads(e.head)
+                except ValueError:
+                    raise e
+                try:
+                    self._raise_for_error(body)
+                except NFApiSessionExpired:
+                    if relogged or not self.auto_relogin:
+                        raise
+                    self._relogin(token)
+                    relogged = True
+                    continue
+                raise
+            except (requests.ConnectionError, requests.Timeout, ChunkedEncodingError):
+                if started or self.retry is None or attempt >= self.retry.retries:
+                    raise
+                attempt += 1
+                self.retry.sleep(attempt)
+                continue
+            finally:
+                response.close()
+
+    def _find(self, uri, key, match):
+        '''First entry of a streamed list response matching predicate, download stops there.'''
+
+        entries = self._stream(uri, {}, key, 65536)
+        try:
+            for entry in entries:
+                if match(entry):
+                    return entry
+        finally:
+            entries.close()
+        return None
+
+    def _relogin(self, stale_token):
+        '''Log back in after session expiry. Serialized so concurrent callers that
+        all hit the same expired token trigger a single login.
+        '''
 
-        response = self.request.post(url, data=payload)
-        return response
+        with self._login_lock:
+            if self.logged_in and self.NFA_SSO != stale_token:
+                #Another caller already logged back in
+                return
+
+            self.logged_in = False
+            self._session.cookies.clear()
+            self.login()
+            if not self.logged_in:
+                raise NFApiSessionExpired('Unable to log back in after session expired')
+
+    def _acquire(self, uri):
+        '''Wait for adaptive limiter, if session has one.'''
+
+        if self.limiter is None:
+            return None
+        return self.limiter.acquire(uri)
+
+    def _release(self, uri, started, error):
+        '''Report outcome of request back to adaptive limiter.'''
+
+        if self.limiter is not None:
+            self.limiter.release(uri, started, error)
+
+    def mount_transport(self, adapter):
+        '''
+        Route all HTTP/HTTPS traffic of this session, worker thread sessions included,
+        through a transport adapter, IE: transport.RecordingAdapter or transport.ReplayAdapter.
+
+        :param adapter: requests transport adapter
+        :type adapter: requests.adapters.BaseAdapter
+        '''
+
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
 
     def _check_required_args(self, arglist, **kwargs):
         '''Validated all required arguments for method exist.'''
@@ -134,6 +421,110 @@ class NFApi:
                 return False
             return True
 
+    @staticmethod
+    def _failed(response):
+        '''Whether a decoded add/modify/delete response reports an error.'''
+
+        return isinstance(response, dict) and bool(response.get('error'))
+
+    def _capture_ids(self, groups):
+        '''Set IDs of groups without one from a single streamed pass over the group list.'''
+
+        wanted = dict((g.name, g) for g in groups if g.ID is None)
+        if not wanted:
+            return
+        entries = self._stream(NFApi.LISTIPGROUP_URI, {}, 'IPGroup_List', 65536)
+        try:
+            for entry in entries:
+                group = wanted.pop(entry['base']['Name'], None)
+                if group is not None:
+                    group.ID = entry['base']['ID']
+                if not wanted:
+                    break
+        finally:
+            entries.close()
+
+    def _push_chunked(self, ipgroup, uri, capture_id):
+        '''
+        Add or modify ipgroup as base group plus sub-groups. Sub-groups that already
+        exist are modified, new ones added and ones no longer needed deleted. Stops at
+        the first failed response and returns it, ipgroup.parts then lists the
+        sub-groups left on the server so a retry or delete_ip_group finds them.
+
+        Bill plans in the registry that bill the group are relinked and modified when
+        its sub-groups change, so traffic of new sub-groups is billed too.
+        '''
+
+        groups = self.chunker.split(ipgroup)
+        existing = ipgroup.parts
+        old_ids = [str(g.ID) for g in [ipgroup] + list(existing)]
+
+        response = self._post(uri, groups[0].api_payload()).json()
+        if self._failed(response):
+            return response
+
+        pushed = 0
+        try:
+            for index, part in enumerate(groups[1:]):
+                part_uri = NFApi.MODIFYIPGROUP_URI if index < len(existing) else NFApi.ADDIPGROUP_URI
+                part_response = self._post(part_uri, part.api_payload()).json()
+                if self._failed(part_response):
+                    return part_response
+                pushed += 1
+        finally:
+            if pushed < len(groups) - 1:
+                #Pushed parts plus old parts not reached yet
+                ipgroup.parts = groups[1:1 + pushed] + existing[pushed:]
+
+        kept = []
+        failed = None
+        for stale in existing[len(groups) - 1:]:
+            text, deleted = self._delete_group_name(stale.name)
+            if not deleted:
+                kept.append(stale)
+                failed = failed or {'error': {'code': None, 'message': 'Deleting sub-group {0} failed: {1}'.format(
+                    stale.name, text)}}
+
+        #Base ID is only unknown after add, sub-group IDs are needed for billing
+        if capture_id or len(groups) - 1 > len(existing):
+            self._capture_ids(groups if capture_id else groups[1:])
+        ipgroup.ID = groups[0].ID
+        ipgroup.parts = groups[1:] + kept
+        if failed is not None:
+            #Stale parts still fold into the group when read back
+            return failed
+        self.registry.ip_groups.put(ipgroup)
+        relinked = None
+        if old_ids[0] != 'None' and old_ids != [str(g.ID) for g in [ipgroup] + list(ipgroup.parts)]:
+            relinked = self._relink_plans(ipgroup, old_ids)
+        response = self._pushed(ipgroup, response)
+        return relinked or response
+
+    def _relink_plans(self, ipgroup, old_ids):
+        '''Point registered bill plans billing ipgroup at its current sub-groups,
+        returns first failed modify response or None.'''
+
+        failed = None
+        for plan in self.registry.bill_plans:
+            if plan.relink_group(ipgroup, old_ids):
+                response = self.modify_bill_plan(plan)
+                if self._failed(response):
+                    failed = failed or response
+        return failed
+
+    def _delete_group_name(self, name):
+        '''Delete IP group by name, returns response text and whether it worked.'''
+
+        text = self._post(NFApi.DELETEIPGROUP_URI, {'GroupName': name}).text
+        return text, 'success' in text.lower()
+
+    def _pushed(self, obj, response):
+        '''Mark object clean once API accepted it, pass response through.'''
+
+        if not NFApi._failed(response):
+            obj.mark_clean()
+        return response
+
     def login(self):
 
         '''Create requests session object, modify its cookie/header
@@ -141,75 +532,79 @@ class NFApi:
         to be used for all functions
         '''
 
-        if self.logged_in:
-            print('User is already logged in')
-        else:
+        with self._login_lock:
+            if self.logged_in:
+                print('User is already logged in')
+            else:
            
-            #Create authentication payload
-            auth_payload = {
-                'AUTHRULE_NAME': 'Authenticator',
-                'clienttype': 'html',
-                'ScreenWidth': '1920',
-                'ScreenHeight': '1080',
-                'loginFromCookieData': 'false',
-                'ntlmv2': 'false',
-                'j_username': self.user,
-                'j_password': self.password,
-                'signInAutomatically': 'on',
-                'uname': ''
-            }
+                #Create authentication payload
+                auth_payload = {
+                    'AUTHRULE_NAME': 'Authenticator',
+                    'clienttype': 'html',
+                    'ScreenWidth': '1920',
+                    'ScreenHeight': '1080',
+                    'loginFromCookieData': 'false',
+                    'ntlmv2': 'false',
+                    'j_username': self.user,
+                    'j_password': self.password,
+                    'signInAutomatically': 'on',
+                    'uname': ''
+                }
             
-            #Ecryption key payload
-            encryption_payload = {
-                'requestType': 'AJAX',
-                'EncryptPassword': self.password,
-                'sid': random.random()
-            }
+                #Ecryption key payload
+                encryption_payload = {
+                    'requestType': 'AJAX',
+                    'EncryptPassword': self.password,
+                    'sid': random.random()
+                }
             
-            #Load home page for cookie/referrer reasons, grab encrypted key
-            home_page = self.request.get('{0:s}://{1:s}'.format(self.protocol, self.hostname))
-            j_session_id = home_page.cookies['JSESSIONID']
-            encrypt_key = self.request.post(
-                '{0:s}://{1:s}/servlets/Settings/Serverlet'.format(self.protocol, self.hostname),
-                data = encryption_payload
-            ).text
+                #Auth flow always runs on the main session
+                session = self._session
+
+                #Load home page for cookie/referrer reasons, grab encrypted key
+                home_page = session.get('{0:s}://{1:s}'.format(self.protocol, self.hostname))
+                j_session_id = home_page.cookies['JSESSIONID']
+                encrypt_key = session.post(
+                    '{0:s}://{1:s}/servlets/Settings/Serverlet'.format(self.protocol, self.hostname),
+                    data = encryption_payload
+                ).text
            
-            #Update cookies and headers
-            self.request.cookies['domainNameForAutomaticSignIn'] = 'Authenticator'
-            self.request.cookies['userNameForAutomaticSignIn'] = self.user
-            self.request.cookies['signInAutomatically'] = 'True'
-            self.request.cookies['authrule_name'] = 'Authenticator'
-            self.request.cookies['encryptPassForAutomaticSignIn'] = encrypt_key
-            self.request.headers['Content-Type'] = 'application/x-www-form-urlencoded'
-            self.request.headers['Accept-Encoding'] = 'gzip, deflate'
+                #Update cookies
+                session.cookies['domainNameForAutomaticSignIn'] = 'Authenticator'
+                session.cookies['userNameForAutomaticSignIn'] = self.user
+                session.cookies['signInAutomatically'] = 'True'
+                session.cookies['authrule_name'] = 'Authenticator'
+                session.cookies['encryptPassForAutomaticSignIn'] = encrypt_key
  
-            #POST to j_security_check for auth, grab NFA_SSO value
-            post_url = '{0:s}://{1:s}/j_security_check;jsessionid={2:s}'.format(
-                self.protocol,
-                self.hostname,
-                j_session_id
-            )
-
-            post_response = self.request.post(
-                post_url,
-                data=auth_payload
-            )
+                #POST to j_security_check for auth, grab NFA_SSO value
+                post_url = '{0:s}://{1:s}/j_security_check;jsessionid={2:s}'.format(
+                    self.protocol,
+                    self.hostname,
+                    j_session_id
+                )
 
-            del self.request.headers['Content-Type']
+                post_response = session.post(
+                    post_url,
+                    data=auth_payload,
+                    headers=NFApi.LOGIN_HEADERS
+                )
             
-            #FUTURE: Add some logic in here to make sure we've got HTTP 302 with set-cookie, verify NFA_SSO in list, etc...
-            try:
-                cookie_header = post_response.history[1].headers['set-cookie']
-                nfa_sso_header = cookie_header.split()[3]           
-                self.NFA_SSO = nfa_sso_header.split('=')[1][:-1]
-                self.request.cookies['NFA__SSO'] = self.NFA_SSO
-                self.logged_in = True
-            except Exception as e:
-                if not post_response.history:
-                    print('POST response history is empty. Probably failed authentication.')
-                else:
-                    print('Unknown error trying to grab cookie data from POST response data.')
-                    print(e.args)
+                #FUTURE: Add some logic in here to make sure we've got HTTP 302 with set-cookie, verify NFA_SSO in list, etc...
+                try:
+                    cookie_header = post_response.history[1].headers['set-cookie']
+                    nfa_sso_header = cookie_header.split()[3]           
+                    self.NFA_SSO = nfa_sso_header.split('=')[1][:-1]
+                    session.cookies['NFA__SSO'] = self.NFA_SSO
+                    self.logged_in = True
+
+                    #Worker thread sessions pick up new cookies on next call
+                    self._generation += 1
+                except Exception as e:
+                    if not post_response.history:
+                        print('POST response history is empty. Probably failed authentication.')
+                    else:
+                        print('Unknown error trying to grab cookie data from POST response data.')
+                        print(e.args)
 
     def logout(self):
         
@@ -222,75 +617,171 @@ class NFApi:
     #=================================================================
 
 
-    def get_ip_groups(self):
+    def get_ip_groups(self, processes=None):
 
         '''
         All IPGroups returned as list of IPGroup objects.
 
+        :param processes: parse large group lists in this many worker processes,
+            0 for one per CPU. Lists under parallel.MIN_PARALLEL groups are always
+            parsed inline.
+        :type processes: int
         :rtype: list
         '''
     
-        response = self._get(NFApi.LISTIPGROUP_URI).json()
-        ip_groups = []
-
-        #Parse JSON output to IPGroup objects
-        for ipg in response['IPGroup_List']:
-            ip_obj = IPGroup(
-                app = ipg['app'],
-                dscp = ipg['dscp'],
-                name = ipg['base']['Name'],
-                description = ipg['base']['desc'],
-                speed = ipg['base']['speed'],
-                status = ipg['base']['status'],
-                ID = ipg['base']['ID'],
-                asso_device = ipg['Asso_Device'],
-                asso_device_id = ipg['Asso_Dev_id']
+        response = self._get(NFApi.LISTIPGROUP_URI)
+
+        if processes is None:
+            build_many = None
+        else:
+            build_many = lambda entries: parse_ip_groups(entries, processes or None)
+
+        #Only rebuild groups whose JSON changed since last call
+        if self.parse_cache is not None:
+            groups = self.parse_cache.parse(
+                'ipgroups',
+                response.content,
+                lambda body: body['IPGroup_List'],
+                IPGroup.from_api,
+                build_many
             )
-            
-            #Call method to translate JSON to IP objects
-            ip_obj.process_api_group_list(ipg['ip'])
-            
-            #Finally, add ipgroup object into returned list
-            ip_groups.append(ip_obj)
-            
-        return ip_groups
+        else:
+            #Parse JSON output to IPGroup objects
+            entries = response.json()['IPGroup_List']
+            if build_many is not None:
+                groups = build_many(entries)
+            else:
+                groups = [IPGroup.from_api(ipg) for ipg in entries]
+
+        #Fold sub-groups of chunked groups back into one group
+        if self.chunker is not None:
+            groups = self.chunker.merge(groups)
+
+        self.registry.ip_groups.replace(groups)
+        return groups
+
+    def get_ip_group(self, key, refresh=False):
+
+        '''
+        Single IPGroup by name or ID. Answered from registry when the group has been
+        seen before, otherwise the group list is streamed until the group shows up
+        and only that entry is parsed. With max_payload set the whole list is read
+        instead, a chunked group's parts can be anywhere in it.
+
+        :param key: group name or ID
+        :type key: str or int
+        :param refresh: skip registry and read group from server
+        :type refresh: bool
+        :returns: IPGroup or None if server has no such group
+        :rtype: manageengineapi.IPGroup
+        '''
+
+        if not refresh:
+            ipgroup = self.registry.ip_groups.get(key)
+            if ipgroup is not None:
+                return ipgroup
+
+        if self.chunker is not None:
+            self.get_ip_groups()
+            return self.registry.ip_groups.get(key)
+
+        entry = self._find(NFApi.LISTIPGROUP_URI, 'IPGroup_List',
+                           lambda ipg: ipg['base']['Name'] == key or str(ipg['base']['ID']) == str(key))
+        if entry is None:
+            return None
+        ipgroup = IPGroup.from_api(entry)
+        self.registry.ip_groups.put(ipgroup)
+        return ipgroup
+
+    def iter_ip_groups(self, chunk_size=65536):
+
+        '''
+        Generator of IPGroup objects, parsed while listIPGroup response downloads.
+        Peak memory stays bounded by a single group instead of the whole body.
+        Sub-groups of chunked groups are yielded as stored, not merged.
+
+        :param chunk_size: bytes read from socket at a time
+        :type chunk_size: int
+        :rtype: generator
+        '''
+
+        for ipg in self._stream(NFApi.LISTIPGROUP_URI, {}, 'IPGroup_List', chunk_size):
+            yield IPGroup.from_api(ipg)
 
     def get_bill_plans(self):
 
         '''
         All billing plans returned as list of BillPlan objects
 
+        Each plan's ip_groups is filled with the IPGroup objects behind ipg_id that
+        the registry already holds, IE: from an earlier get_ip_groups. Groups not
+        loaded yet are left out, get_billing_index resolves against a fresh list.
+
         :rtype: list
         :returns: list of BillPLan
         '''
-        response = self._get(NFApi.LISTBILLPLAN_URI).json()
-        bill_plans = []
-
-        #Parse JSON output to BillPlan objects
-        for bp in response['bpList']:
-            bp_obj = BillPlan(
-                name = bp['name'],
-                description = bp['desc'],
-                cost_unit = bp['coustunit'], #YEA, THEY REALLY HAVE THIS TYPO
-                period_type = bp['period'],
-                gen_date = bp['billDate'],
-                time_zone = bp['tzone'],
-                base_speed = bp['basespd1'], #1 returns int instead of str
-                base_cost = bp['basecost1'], #1 returns int instead of str
-                add_speed = bp['addspd1'],
-                add_cost = bp['addcost1'],
-                type = bp['type'],
-                percent = bp['perc'],
-                buss_id = bp['bussList'],
-                email_id = bp['emailid'],
-                email_sub = bp['emailSubject'],
-                plan_id = bp['planid'],
-                #TODO: Fix this hack, add some logic to return list of IPGroup
-                ipg_id = ','.join([str(x[1]) for x in bp['ipgList']])
+        response = self._get(NFApi.LISTBILLPLAN_URI)
+
+        #Only rebuild plans whose JSON changed since last call
+        if self.parse_cache is not None:
+            plans = self.parse_cache.parse(
+                'billplans',
+                response.content,
+                lambda body: body['bpList'],
+                BillPlan.from_api
             )
-            bill_plans.append(bp_obj)
+        else:
+            #Parse JSON output to BillPlan objects
+            plans = [BillPlan.from_api(bp) for bp in response.json()['bpList']]
+
+        #Sub-group IDs aren't registered, their base group is reached through its own ID
+        groups_by_id = self.registry.ip_groups.by_id
+        for plan in plans:
+            groups = [groups_by_id.get(gid) for gid in plan.ipg_ids]
+            plan.ip_groups = [g for g in groups if g is not None]
+
+        self.registry.bill_plans.replace(plans)
+        return plans
+
+    def get_bill_plan(self, key, refresh=False):
+
+        '''
+        Single BillPlan by name or plan ID, see get_ip_group.
+
+        :param key: plan name or plan ID
+        :type key: str or int
+        :param refresh: skip registry and read plan from server
+        :type refresh: bool
+        :returns: BillPlan or None if server has no such plan
+        :rtype: manageengineapi.BillPlan
+        '''
+
+        if not refresh:
+            billplan = self.registry.bill_plans.get(key)
+            if billplan is not None:
+                return billplan
 
-        return bill_plans
+        entry = self._find(NFApi.LISTBILLPLAN_URI, 'bpList',
+                           lambda bp: bp['name'] == key or str(bp['planid']) == str(key))
+        if entry is None:
+            return None
+        billplan = BillPlan.from_api(entry)
+        self.registry.bill_plans.put(billplan)
+        return billplan
+
+    def get_billing_index(self):
+
+        '''
+        Bill plans with ipg_id resolved to shared IPGroup objects, and reverse
+        index from IP group ID to bill plans. Built in one pass over the IP group
+        and bill plan list responses.
+
+        :rtype: manageengineapi.billing.BillingIndex
+        '''
+
+        ip_groups = self.get_ip_groups()
+        response = self._get(NFApi.LISTBILLPLAN_URI).json()
+        return BillingIndex.build(response['bpList'], ip_groups)
 
     def get_dev_list(self):
         '''
@@ -309,13 +800,20 @@ class NFApi:
 
         return devices
 
-    def add_ip_group(self, ipgroup):
+    def add_ip_group(self, ipgroup, capture_id=True):
         '''
         Function to add IPGroup. Function should be passed an IPGroup object type.
         https://www.manageengine.com/products/netflow/help/admin-operations/ip-group-mgmt.html 
+
+        The add endpoint does not return the new group's ID. With capture_id set it
+        is read back with one targeted lookup (see get_ip_group), set on ipgroup and
+        the group is registered. With max_payload set, oversized groups are added as
+        several sub-groups, see manageengineapi.chunking.
         
         :param ipgroup: object of IP Group
         :type ipgroup: manageengineapi.IPGroup
+        :param capture_id: read back ID assigned by server
+        :type capture_id: bool
         :returns: json
         :rtype: json
         '''
@@ -323,30 +821,35 @@ class NFApi:
         if not isinstance(ipgroup, IPGroup):
             raise TypeError('add_ip_group method did not receive IPGroup object')
 
-        #Create payload for URL encoding
-        ipg_payload = {
-            'GroupName': ipgroup.name,
-            'Desc': ipgroup.description,
-            'speed': ipgroup.speed,
-            'DevList': ipgroup.asso_dev_id,
-            'status': ','.join([s.status for s in ipgroup.ip]),
-            'IPData': '-'.join([i.api_format for i in ipgroup.ip]),
-            'IPType': ','.join([t.type.lower() for t in ipgroup.ip]),
-            'ToIPType': ipgroup.to_ip_type,
-            'apiKey': self.api_key 
-        }
+        if self.chunker is not None:
+            if is_part_name(ipgroup.name):
+                raise ValueError('IP group name {0} is reserved for sub-groups of chunked groups'.format(ipgroup.name))
+            if self.chunker.oversized(ipgroup):
+                return self._push_chunked(ipgroup, NFApi.ADDIPGROUP_URI, capture_id)
+
+        #Create payload for URL encoding, reused if group is unchanged since last encode
+        ipg_payload = ipgroup.api_payload()
         
-        response = self._post(NFApi.ADDIPGROUP_URI, ipg_payload)
-        return response.json()
+        response = self._post(NFApi.ADDIPGROUP_URI, ipg_payload).json()
+        if capture_id and not self._failed(response):
+            entry = self._find(NFApi.LISTIPGROUP_URI, 'IPGroup_List',
+                               lambda ipg: ipg['base']['Name'] == ipgroup.name)
+            if entry is not None:
+                ipgroup.ID = entry['base']['ID']
+                self.registry.ip_groups.put(ipgroup)
+        return self._pushed(ipgroup, response)
     
 
-    def add_bill_plan(self, billplan):
+    def add_bill_plan(self, billplan, capture_id=True):
 
         '''
-        Function to add Bill Plan. 
+        Function to add Bill Plan. The new plan_id is read back like the ID in
+        add_ip_group.
 
         :param billplan: Object of bill plan
         :type billplan: manageengineapi.BillPlan
+        :param capture_id: read back plan ID assigned by server
+        :type capture_id: bool
         :returns: json
         '''
 
@@ -354,97 +857,84 @@ class NFApi:
             raise TypeError('add_billing method did not received BillPlan object')
         
         #Construct bill plan payload
-        bp_payload = {
-            'name': billplan.name,
-            'desc': billplan.description,
-            'costUnit': billplan.cost_unit,
-            'periodType': billplan.period_type,
-            'genDate': billplan.gen_date,
-            'timezone': billplan.time_zone,
-            'apiKey': self.api_key,
-            'baseSpeed': billplan.base_speed,
-            'baseCost': billplan.base_cost,
-            'addSpeed': billplan.add_speed,
-            'addCost': billplan.add_cost,
-            'type': billplan.type,
-            'perc': billplan.percent,
-            'intfID': billplan.intf_id,
-            'ipgID': billplan.ipg_id,
-            'bussID': billplan.buss_id,
-            'emailID': billplan.email_id,
-            'emailsub': billplan.email_sub
-        }
+        bp_payload = billplan.api_payload()
 
-        response = self._post(NFApi.ADDBILLPLAN_URI, bp_payload)
-        return response.json()
+        response = self._post(NFApi.ADDBILLPLAN_URI, bp_payload).json()
+        if capture_id and not self._failed(response):
+            entry = self._find(NFApi.LISTBILLPLAN_URI, 'bpList', lambda bp: bp['name'] == billplan.name)
+            if entry is not None:
+                billplan.plan_id = entry['planid']
+                self.registry.bill_plans.put(billplan)
+        return self._pushed(billplan, response)
 
-    def modify_bill_plan(self, billplan):
+    def modify_bill_plan(self, billplan, force=False):
 
         '''Function to modify billing object. Looks like it takes same paramters as
         add_billing, but must also include a unique identifier 'plan id'.
         
+        Plans with no changes since they were loaded or last pushed are not sent
+        unless force is set.
+
         :param billplan: existing billing object
         :type billplan: manageengineapi.BillPlan
+        :param force: send plan even if nothing changed
+        :type force: bool
         :returns: json
         '''
         
         if not isinstance(billplan, BillPlan):
             raise TypeError('modify_billing method did not receive BillPlan object')
 
-        bp_payload = {
-            'name': billplan.name,
-            'desc': billplan.description,
-            'apiKey': self.api_key,
-            'baseSpeed': billplan.base_speed,
-            'baseCost': billplan.base_cost,
-            'addSpeed': billplan.add_speed,
-            'addCost': billplan.add_cost,
-            'type': billplan.type,
-            'perc': billplan.percent,
-            'intfID': billplan.intf_id,
-            'ipgID': billplan.ipg_id,
-            'bussID': billplan.buss_id,
-            'emailID': billplan.email_id,
-            'emailsub': billplan.email_sub,
-            'planid': billplan.plan_id
-        }
+        #Nothing changed since plan was loaded or last pushed
+        if not force and not billplan.is_dirty:
+            return {'message': NFApi.UNCHANGED_MESSAGE}
 
-        response = self._post(NFApi.MODIFYBILLPLAN_URI, bp_payload)
-        return response.json()
+        bp_payload = billplan.api_payload('modify')
+
+        response = self._post(NFApi.MODIFYBILLPLAN_URI, bp_payload).json()
+        if not self._failed(response):
+            self.registry.bill_plans.put(billplan)
+        return self._pushed(billplan, response)
 
-    def modify_ip_group(self, ipgroup):
+    def modify_ip_group(self, ipgroup, force=False):
 
         '''Function to modify IPGroup object. Doesn't appear to have any unique parameters, should be able to
         query for IPGroup object with get_ip_groups, modify what we need to modify, then pass to this function 
         to udpate the existing object.
 
+        Groups with no changes since they were loaded or last pushed are not sent
+        unless force is set. With max_payload set, chunked groups have their sub-groups
+        added, modified or deleted to fit the new IP list.
+
         :param ipgroup: existing ip group
         :type ipgroup: manageengineapi.IPGroup
+        :param force: send group even if nothing changed
+        :type force: bool
         :returns: json
         '''
         
         if not isinstance(ipgroup, IPGroup):
             raise TypeError('add_ip_group method did not receive IPGroup object')
         
-        #Create payload for URL encoding
-        ipg_payload = {
-            'GroupName': ipgroup.name,
-            'Desc': ipgroup.description,
-            'speed': ipgroup.speed,
-            'DevList': ipgroup.asso_dev_id,
-            'status': ','.join([s.status for s in ipgroup.ip]),
-            'IPData': '-'.join([i.api_format for i in ipgroup.ip]),
-            'IPType': ','.join([t.type.lower() for t in ipgroup.ip]),
-            'ToIPType': ipgroup.to_ip_type,
-            'apiKey': self.api_key 
-        }
+        #Nothing changed since group was loaded or last pushed
+        if not force and not ipgroup.is_dirty:
+            return {'message': NFApi.UNCHANGED_MESSAGE}
+
+        if self.chunker is not None and (ipgroup.parts or self.chunker.oversized(ipgroup)):
+            return self._push_chunked(ipgroup, NFApi.MODIFYIPGROUP_URI, False)
+
+        #Create payload for URL encoding, reused if group is unchanged since last encode
+        ipg_payload = ipgroup.api_payload()
         
-        response = self._post(NFApi.MODIFYIPGROUP_URI, ipg_payload)
-        return response.json()  
+        response = self._post(NFApi.MODIFYIPGROUP_URI, ipg_payload).json()
+        if not self._failed(response):
+            self.registry.ip_groups.put(ipgroup)
+        return self._pushed(ipgroup, response)
 
     def delete_ip_group(self, ipg_obj):
 
         '''Function to delete an IPGroup object. The only required parameter for this is GroupName.
+        Sub-groups of a chunked group are deleted with it.
 
         :param ipg_obj: existing ip group
         :type ipg_obj: manageengineapi.IPGroup
@@ -454,15 +944,24 @@ class NFApi:
         if not isinstance(ipg_obj, IPGroup):
             raise TypeError('add_ip_group method did not receive IPGroup object')
             
-        payload = {
-            'apiKey': self.api_key,
-            'GroupName': ipg_obj.name
-        }
-        
-        response = self._post(NFApi.DELETEIPGROUP_URI, payload)
-        
         #This returns a string, not JSON
-        return response.text
+        text, deleted = self._delete_group_name(ipg_obj.name)
+        if not deleted:
+            return text
+
+        #Base is gone, parts whose delete failed are left in parts for the caller
+        failed = []
+        for part in ipg_obj.parts:
+            part_text, part_deleted = self._delete_group_name(part.name)
+            if not part_deleted:
+                failed.append((part, part_text))
+        if failed:
+            ipg_obj.parts = [part for part, _ in failed]
+            return failed[0][1]
+
+        ipg_obj.parts = []
+        self.registry.ip_groups.discard(ipg_obj)
+        return text
 
     def delete_bill_plan(self, bp):
 
@@ -479,8 +978,10 @@ class NFApi:
             'planID': bp.plan_id
         }
         
-        response = self._post(NFApi.DELETEBILLPLAN_URI, payload)
-        return response.json()
+        response = self._post(NFApi.DELETEBILLPLAN_URI, payload).json()
+        if not self._failed(response):
+            self.registry.bill_plans.discard(bp)
+        return response
 
 
     #=================================================================
@@ -488,7 +989,7 @@ class NFApi:
     #=================================================================
     
 
-    def get_group_conversation_data(self, ipgroup, payload={}):
+    def get_group_conversation_data(self, ipgroup, payload=None):
 
         ''' Get conversation data for a specific IP group. IP group should be ID based, not
         named based. Using default params for now, will expand to include more later.
@@ -520,7 +1021,38 @@ class NFApi:
         response = self._get(NFApi.CONVERSATION_URI, payload)
         return response.json()
 
-    def get_group_traffic_data(self, ipgroup, payload={}):
+    def iter_group_conversation_data(self, ipgroup, payload=None, key=None, chunk_size=65536):
+
+        ''' Generator of conversation records for a specific IP group, parsed while
+        getConvData response downloads. Meant for expand=true queries with large
+        Count values. Takes the same payload as get_group_conversation_data.
+
+        :param ipgroup: ID number of IPGroup
+        :type ipgroup: str
+        :param key: response key holding records, default is first top level array
+        :type key: str
+        :param chunk_size: bytes read from socket at a time
+        :type chunk_size: int
+        :rtype: generator
+        '''
+
+        if not bool(payload):
+            payload = {
+                'DeviceID': ipgroup,
+                'Count': '10',
+                'Data': 'IN',
+                'isNetwork': 'OFF',
+                'ResolveDNS': 'false',
+                'pageCount': '1',
+                'IPGroup': 'true',
+                'rows': '9',
+                'TimeFrame': 'today',
+                'expand': 'true'
+            }
+
+        return self._stream(NFApi.CONVERSATION_URI, payload, key, chunk_size)
+
+    def get_group_traffic_data(self, ipgroup, payload=None):
 
         ''' Get traffic data for specific IP group. 
 
@@ -547,3 +1079,33 @@ class NFApi:
         
         response = self._get(NFApi.TRAFFICDATA_URI, payload)
         return response.json()
+
+    def get_group_traffic_series(self, ipgroup, query, max_span=timedelta(days=1), workers=4):
+
+        ''' Get traffic data for specific IP group over a long custom window. Window is
+        split into sub-windows of at most max_span, fetched concurrently and stitched
+        back into one series ordered by timestamp.
+
+        :param ipgroup: ID number of IPGroup
+        :type ipgroup: str
+        :param query: time window and statistic to fetch
+        :type query: manageengineapi.query.StatQuery
+        :param max_span: longest window per request
+        :type max_span: datetime.timedelta
+        :param workers: concurrent requests
+        :type workers: int
+        :returns: list of data points
+        :rtype: list
+        '''
+
+        windows = query.split(max_span)
+        fetch = lambda window: self._get(
+            NFApi.TRAFFICDATA_URI,
+            window.traffic_payload(ipgroup)
+        ).json()
+
+        if workers <= 1 or len(windows) == 1:
+            return stitch([fetch(w) for w in windows])
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(windows))) as pool:
+            return stitch(list(pool.map(fetch, windows)))
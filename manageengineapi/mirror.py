@@ -0,0 +1,447 @@
+'''
+Local SQLite mirror of IP groups, bill plans and devices. Objects are stored in indexed
+tables with IP definitions as integer bounds, refreshed incrementally (only rows of
+objects whose content changed are rewritten), and common lookups like "which groups
+contain 10.1.0.0/16" become index lookups instead of scans over freshly downloaded lists.
+
+Usage::
+
+    mirror = Mirror('nfa.sqlite3')
+    mirror.refresh(session)
+    mirror.groups_containing('10.1.0.0/16')
+    mirror.plans_for_group('customer-a')
+    mirror.groups_on_device('core-router-1')
+
+IPv6 bounds do not fit SQLite integers, so bounds are stored as fixed width hex text,
+which sorts the same way the numbers do. Network definitions also store their prefix
+length: a network containing 10.1.2.0/24 can only start at 10.1.2.0 masked to one of
+prefix lengths 0-24, so containment is one equality seek per prefix length. IPRange
+definitions have no prefix length and are range scanned.
+
+The mirror is a cache, a database file written with an older table layout is emptied
+on open and filled again by the next refresh.
+'''
+
+from .watch import object_state
+from ipaddress import ip_network
+import hashlib
+import json
+import sqlite3
+import threading
+
+#Bumped whenever the table layout changes
+SCHEMA_VERSION = 2
+
+TABLES = (
+    'ip_groups', 'group_parts', 'ip_entries', 'group_interfaces', 'bill_plans',
+    'plan_groups', 'plan_interfaces', 'devices', 'interfaces',
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ip_groups (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    speed INTEGER,
+    status TEXT,
+    asso_device TEXT,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS ip_groups_name ON ip_groups (name);
+
+CREATE TABLE IF NOT EXISTS group_parts (
+    part_id TEXT PRIMARY KEY,
+    group_id TEXT
+);
+CREATE INDEX IF NOT EXISTS group_parts_group ON group_parts (group_id);
+
+CREATE TABLE IF NOT EXISTS ip_entries (
+    group_id TEXT,
+    version INTEGER,
+    prefixlen INTEGER,
+    first TEXT,
+    last TEXT,
+    type TEXT,
+    status TEXT,
+    api_format TEXT
+);
+CREATE INDEX IF NOT EXISTS ip_entries_group ON ip_entries (group_id);
+CREATE INDEX IF NOT EXISTS ip_entries_first ON ip_entries (version, first);
+CREATE INDEX IF NOT EXISTS ip_entries_prefix ON ip_entries (version, prefixlen, first);
+
+CREATE TABLE IF NOT EXISTS group_interfaces (
+    group_id TEXT,
+    interface_id TEXT
+);
+CREATE INDEX IF NOT EXISTS group_interfaces_group ON group_interfaces (group_id);
+CREATE INDEX IF NOT EXISTS group_interfaces_interface ON group_interfaces (interface_id);
+
+CREATE TABLE IF NOT EXISTS bill_plans (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    type TEXT,
+    base_speed INTEGER,
+    base_cost INTEGER,
+    add_speed INTEGER,
+    add_cost INTEGER,
+    email_id TEXT,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS bill_plans_name ON bill_plans (name);
+
+CREATE TABLE IF NOT EXISTS plan_groups (
+    plan_id TEXT,
+    group_id TEXT
+);
+CREATE INDEX IF NOT EXISTS plan_groups_plan ON plan_groups (plan_id);
+CREATE INDEX IF NOT EXISTS plan_groups_group ON plan_groups (group_id);
+
+CREATE TABLE IF NOT EXISTS plan_interfaces (
+    plan_id TEXT,
+    interface_id TEXT
+);
+CREATE INDEX IF NOT EXISTS plan_interfaces_plan ON plan_interfaces (plan_id);
+CREATE INDEX IF NOT EXISTS plan_interfaces_interface ON plan_interfaces (interface_id);
+
+CREATE TABLE IF NOT EXISTS devices (
+    ip TEXT PRIMARY KEY,
+    name TEXT,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS devices_name ON devices (name);
+
+CREATE TABLE IF NOT EXISTS interfaces (
+    id TEXT PRIMARY KEY,
+    device_ip TEXT,
+    name TEXT
+);
+CREATE INDEX IF NOT EXISTS interfaces_device ON interfaces (device_ip);
+'''
+
+
+def _bound(value):
+    #32 hex digits hold any IPv6 address and compare like the integers
+    return '{0:032x}'.format(value)
+
+
+def _ids(value):
+    if value in (None, '', -1, '-1'):
+        return []
+    return [i.strip() for i in str(value).split(',') if i.strip()]
+
+
+def _fingerprint(state):
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _network(value):
+    return ip_network(value if not isinstance(value, bytes) else value.decode('ascii'), strict=False)
+
+
+def _supernets(network):
+    #Start of the network of every prefix length up to network's own that contains it
+    first = int(network.network_address)
+    bits = network.max_prefixlen
+    return [(p, _bound(first >> (bits - p) << (bits - p))) for p in range(network.prefixlen + 1)]
+
+
+class Mirror(object):
+    '''
+    SQLite mirror of the NFA configuration.
+
+    :param path: database file, ':memory:' for a throwaway mirror
+    :type path: str
+    '''
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self.db.executescript(''.join('DROP TABLE IF EXISTS {0};'.format(t) for t in TABLES))
+            self.db.execute('PRAGMA user_version = {0}'.format(SCHEMA_VERSION))
+        self.db.executescript(SCHEMA)
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return '<Mirror - Path:{0} Groups:{1} Plans:{2} Devices:{3}>'.format(
+            self.path,
+            self._count('ip_groups'),
+            self._count('bill_plans'),
+            self._count('devices')
+        )
+
+    def _count(self, table):
+        with self._lock:
+            return self.db.execute('SELECT COUNT(*) FROM {0}'.format(table)).fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    #=================================================================
+    # Updates
+    #=================================================================
+
+    def _fingerprints(self, table, key):
+        return dict(self.db.execute('SELECT {0}, fingerprint FROM {1}'.format(key, table)).fetchall())
+
+    def _delete_group(self, gid):
+        for table, column in (('ip_groups', 'id'), ('group_parts', 'group_id'), ('ip_entries', 'group_id'),
+                              ('group_interfaces', 'group_id')):
+            self.db.execute('DELETE FROM {0} WHERE {1} = ?'.format(table, column), (gid,))
+
+    def _insert_group(self, group, fingerprint):
+        gid = str(group.ID)
+        self.db.execute(
+            'INSERT INTO ip_groups VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (gid, group.name, group.description, group.speed, group.status,
+             str(group.asso_device), fingerprint)
+        )
+        self.db.executemany(
+            'INSERT INTO ip_entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(gid, i.version, getattr(i, 'prefixlen', None), _bound(i.first), _bound(i.last),
+              i.type, i.status, i.api_format)
+             for i in group.ip]
+        )
+
+        #Plans bill sub-groups of chunked groups by their own IDs, file those under the base
+        parts = [str(part.ID) for part in group.parts if part.ID is not None]
+        self.db.executemany('INSERT OR REPLACE INTO group_parts VALUES (?, ?)', [(p, gid) for p in parts])
+        for part in parts:
+            self.db.execute(
+                'DELETE FROM plan_groups WHERE group_id = ? AND plan_id IN '
+                '(SELECT plan_id FROM plan_groups WHERE group_id = ?)', (part, gid))
+            self.db.execute('UPDATE plan_groups SET group_id = ? WHERE group_id = ?', (gid, part))
+        self.db.executemany(
+            'INSERT INTO group_interfaces VALUES (?, ?)',
+            [(gid, intf) for intf in _ids(group.asso_dev_id)]
+        )
+
+    def _delete_plan(self, pid):
+        for table, column in (('bill_plans', 'id'), ('plan_groups', 'plan_id'), ('plan_interfaces', 'plan_id')):
+            self.db.execute('DELETE FROM {0} WHERE {1} = ?'.format(table, column), (pid,))
+
+    def _insert_plan(self, plan, fingerprint):
+        pid = str(plan.plan_id)
+        self.db.execute(
+            'INSERT INTO bill_plans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (pid, plan.name, plan.description, plan.type, plan.base_speed, plan.base_cost,
+             plan.add_speed, plan.add_cost, plan.email_id, fingerprint)
+        )
+        group_ids = []
+        for gid in plan.ipg_ids:
+            row = self.db.execute('SELECT group_id FROM group_parts WHERE part_id = ?', (gid,)).fetchone()
+            gid = row[0] if row is not None else gid
+            if gid not in group_ids:
+                group_ids.append(gid)
+        self.db.executemany('INSERT INTO plan_groups VALUES (?, ?)', [(pid, g) for g in group_ids])
+        self.db.executemany('INSERT INTO plan_interfaces VALUES (?, ?)', [(pid, i) for i in _ids(plan.intf_id)])
+
+    def _delete_device(self, ip):
+        self.db.execute('DELETE FROM devices WHERE ip = ?', (ip,))
+        self.db.execute('DELETE FROM interfaces WHERE device_ip = ?', (ip,))
+
+    def _insert_device(self, dev, fingerprint):
+        self.db.execute('INSERT INTO devices VALUES (?, ?, ?)', (dev.IP, dev.name, fingerprint))
+        self.db.executemany(
+            'INSERT OR REPLACE INTO interfaces VALUES (?, ?, ?)',
+            [(str(intf[0]), dev.IP, intf[1]) for intf in dev.interfaces]
+        )
+
+    def _sync(self, table, key, objects, prune, delete, insert):
+        #Rewrite only rows of objects whose fingerprint moved
+        stored = self._fingerprints(table, key)
+        changed = 0
+        seen = set()
+        for obj_key, obj, fingerprint in objects:
+            seen.add(obj_key)
+            if stored.get(obj_key) == fingerprint:
+                continue
+            if obj_key in stored:
+                delete(obj_key)
+            insert(obj, fingerprint)
+            changed += 1
+        removed = [k for k in stored if k not in seen] if prune else []
+        for obj_key in removed:
+            delete(obj_key)
+        return changed, len(removed)
+
+    def update_ip_groups(self, groups, prune=True):
+        '''
+        Store IPGroup objects, rewriting only those that changed.
+
+        :param groups: list of IPGroup
+        :type groups: list
+        :param prune: remove stored groups missing from groups
+        :type prune: bool
+        :returns: number of rewritten and removed groups
+        :rtype: tuple
+        '''
+
+        objects = [(str(g.ID), g, _fingerprint(object_state(g))) for g in groups]
+        with self._lock, self.db:
+            return self._sync('ip_groups', 'id', objects, prune, self._delete_group, self._insert_group)
+
+    def update_bill_plans(self, plans, prune=True):
+        '''Store BillPlan objects, see update_ip_groups.'''
+
+        objects = [(str(p.plan_id), p, _fingerprint(object_state(p))) for p in plans]
+        with self._lock, self.db:
+            return self._sync('bill_plans', 'id', objects, prune, self._delete_plan, self._insert_plan)
+
+    def update_devices(self, devices, prune=True):
+        '''Store Device objects, see update_ip_groups.'''
+
+        objects = [(d.IP, d, _fingerprint([d.name, d.interfaces])) for d in devices]
+        with self._lock, self.db:
+            return self._sync('devices', 'ip', objects, prune, self._delete_device, self._insert_device)
+
+    def refresh(self, session):
+        '''
+        Re-read all three lists from the API and apply what changed.
+
+        :param session: logged in API session
+        :type session: manageengineapi.NFApi
+        :returns: kind -> (rewritten, removed)
+        :rtype: dict
+        '''
+
+        return {
+            'ipgroup': self.update_ip_groups(session.get_ip_groups()),
+            'billplan': self.update_bill_plans(session.get_bill_plans()),
+            'device': self.update_devices(session.get_dev_list()),
+        }
+
+    def apply_event(self, event):
+        '''
+        Apply a watch.ChangeEvent, so a ConfigWatcher subscription keeps the mirror
+        current without full refreshes.
+        '''
+
+        with self._lock, self.db:
+            if event.kind == 'ipgroup':
+                delete, insert = self._delete_group, self._insert_group
+            elif event.kind == 'billplan':
+                delete, insert = self._delete_plan, self._insert_plan
+            else:
+                return
+            delete(event.key)
+            if event.new is not None:
+                insert(event.new, _fingerprint(object_state(event.new)))
+
+    #=================================================================
+    # Queries
+    #=================================================================
+
+    def query(self, sql, params=()):
+        '''Run raw SQL against the mirror, rows as dicts.'''
+
+        with self._lock:
+            return [dict(row) for row in self.db.execute(sql, params).fetchall()]
+
+    def _groups_matching(self, selects, params, status):
+        if status is not None:
+            selects = [sql + ' AND lower(status) = lower(?)' for sql in selects]
+            params = [p for group in params for p in list(group) + [status]]
+        else:
+            params = [p for group in params for p in group]
+        return self.query('''
+            SELECT g.id, g.name FROM ip_groups g WHERE g.id IN ({0})
+            ORDER BY g.name'''.format(' UNION ALL '.join(selects)), params)
+
+    def _selects(self, network, range_first, range_last):
+        #Networks containing network: one seek per prefix length. IPRange definitions
+        #have no prefix length, they are scanned for first <= range_first, last >= range_last
+        selects = ['SELECT group_id FROM ip_entries WHERE version = ? AND prefixlen IS NULL '
+                   'AND first <= ? AND last >= ?']
+        params = [(network.version, range_first, range_last)]
+        for prefixlen, start in _supernets(network):
+            selects.append('SELECT group_id FROM ip_entries WHERE version = ? AND prefixlen = ? AND first = ?')
+            params.append((network.version, prefixlen, start))
+        return selects, params
+
+    def groups_containing(self, cidr, status=None):
+        '''
+        Groups with an IP definition covering all of cidr. Costs one index seek per
+        prefix length up to cidr's own, plus a scan of the IPRange definitions.
+
+        :param cidr: network or address (IE: '10.1.0.0/16')
+        :type cidr: str
+        :param status: only definitions with this status (IE: 'include')
+        :type status: str
+        :rtype: list
+        '''
+
+        network = _network(cidr)
+        first, last = _bound(int(network.network_address)), _bound(int(network.broadcast_address))
+        selects, params = self._selects(network, first, last)
+        return self._groups_matching(selects, params, status)
+
+    def groups_overlapping(self, cidr, status=None):
+        '''
+        Groups with an IP definition sharing any address with cidr. Networks overlap
+        only by nesting, so this is groups_containing plus an index range scan over
+        definitions starting inside cidr.
+        '''
+
+        network = _network(cidr)
+        first, last = _bound(int(network.network_address)), _bound(int(network.broadcast_address))
+        selects, params = self._selects(network, last, first)
+        selects.append('SELECT group_id FROM ip_entries WHERE version = ? AND first >= ? AND first <= ?')
+        params.append((network.version, first, last))
+        return self._groups_matching(selects, params, status)
+
+    def _group_id(self, group):
+        rows = self.query('SELECT id FROM ip_groups WHERE id = ? OR name = ?', (str(group), str(group)))
+        return rows[0]['id'] if rows else None
+
+    def plans_for_group(self, group):
+        '''
+        Bill plans billing a group.
+
+        :param group: group ID or name
+        :rtype: list
+        '''
+
+        return self.query('''
+            SELECT p.id, p.name FROM plan_groups pg JOIN bill_plans p ON p.id = pg.plan_id
+            WHERE pg.group_id = ? ORDER BY p.name''', (self._group_id(group),))
+
+    def groups_for_plan(self, plan):
+        '''
+        IP groups billed by a plan.
+
+        :param plan: plan ID or name
+        :rtype: list
+        '''
+
+        return self.query('''
+            SELECT g.id, g.name FROM bill_plans p
+            JOIN plan_groups pg ON pg.plan_id = p.id
+            JOIN ip_groups g ON g.id = pg.group_id
+            WHERE p.id = ? OR p.name = ? ORDER BY g.name''', (str(plan), str(plan)))
+
+    def groups_on_device(self, device):
+        '''
+        IP groups associated with any interface of a device. Groups associated with
+        all interfaces are not listed.
+
+        :param device: device IP or name
+        :rtype: list
+        '''
+
+        return self.query('''
+            SELECT DISTINCT g.id, g.name FROM devices d
+            JOIN interfaces i ON i.device_ip = d.ip
+            JOIN group_interfaces gi ON gi.interface_id = i.id
+            JOIN ip_groups g ON g.id = gi.group_id
+            WHERE d.ip = ? OR d.name = ? ORDER BY g.name''', (device, device))
+
+    def unbilled_groups(self):
+        '''IP groups no bill plan refers to.'''
+
+        return self.query('''
+            SELECT g.id, g.name FROM ip_groups g
+            WHERE NOT EXISTS (SELECT 1 FROM plan_groups pg WHERE pg.group_id = g.id)
+            ORDER BY g.name''')
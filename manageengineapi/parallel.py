@@ -0,0 +1,61 @@
+'''
+Parallel parsing of large IP group lists. Building IPGroup objects is CPU bound
+(every entry goes through ipaddress validation), so big listIPGroup responses are
+split into chunks and parsed in worker processes. Small inputs are parsed inline
+since starting a pool costs more than it saves.
+'''
+
+from .ipgroup import IPGroup
+from itertools import chain
+import multiprocessing
+
+#Below this many groups parsing stays in the calling process
+MIN_PARALLEL = 2000
+
+
+def _parse_chunk(entries):
+    #Module level so worker processes can unpickle it
+    return [IPGroup.from_api(ipg) for ipg in entries]
+
+
+def parse_ip_groups(entries, processes=None, chunk_size=None, pool=None, min_parallel=MIN_PARALLEL):
+    '''
+    Build IPGroup objects from listIPGroup entries, in worker processes when the
+    list is large enough. Results are returned in the order of entries.
+
+    :param entries: JSON response['IPGroup_List']
+    :type entries: list
+    :param processes: worker count, defaults to CPU count. 1 disables parallel parsing.
+    :type processes: int
+    :param chunk_size: entries per task, defaults to 4 tasks per worker
+    :type chunk_size: int
+    :param pool: existing multiprocessing.Pool to reuse across calls
+    :type pool: multiprocessing.pool.Pool
+    :param min_parallel: entry count below which parsing stays inline
+    :type min_parallel: int
+    :returns: list of IPGroup
+    :rtype: list
+    '''
+
+    entries = list(entries)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if processes <= 1 or len(entries) < min_parallel:
+        return _parse_chunk(entries)
+
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(entries) // (processes * 4)))
+    chunks = [entries[i:i + chunk_size] for i in range(0, len(entries), chunk_size)]
+
+    if pool is not None:
+        return list(chain.from_iterable(pool.map(_parse_chunk, chunks)))
+
+    own_pool = multiprocessing.Pool(processes)
+    try:
+        #map keeps chunk order no matter which worker finishes first
+        results = own_pool.map(_parse_chunk, chunks)
+    finally:
+        own_pool.close()
+        own_pool.join()
+    return list(chain.from_iterable(results))
@@ -0,0 +1,219 @@
+'''
+Typed statistic queries for getTrafficData/getConvData. A long time window can be split
+into sub-windows that are fetched concurrently and stitched back into one ordered series,
+so a month at fine granularity no longer has to be a single request the server times out on.
+'''
+
+from .exceptions import NFApiError
+from datetime import datetime, timedelta
+import time
+
+
+#getTrafficData parameters for the current day, DeviceID is added per group
+DEFAULT_PAYLOAD = {
+    'IPGroup': 'true',
+    'TimeFrame': 'today',
+    'expand': 'false',
+    'tablegripviewtype': 'Chart',
+    'Type': 'speed',
+    'granularity': 1,
+}
+
+
+def _epoch_ms(value):
+    return int(time.mktime(value.timetuple()) * 1000 + value.microsecond // 1000)
+
+
+class StatQuery(object):
+    '''
+    Statistic query for a custom time window.
+
+    :param start: beginning of window
+    :type start: datetime.datetime
+    :param end: end of window
+    :type end: datetime.datetime
+    :param granularity: API granularity value (IE: 1)
+    :type granularity: int
+    :param direction: traffic direction, 'IN' or 'OUT'
+    :type direction: str
+    :param type: statistic type (IE: 'speed', 'volume', 'packets', 'utilization')
+    :type type: str
+    :param extra: additional raw query parameters, override generated ones
+    :type extra: dict
+    '''
+
+    #Query parameter names/format NFA uses for custom time frames
+    TIMEFRAME = 'custom'
+    START_PARAM = 'startDate'
+    END_PARAM = 'endDate'
+
+    DIRECTIONS = ('IN', 'OUT')
+
+    def __init__(self, start, end, granularity=1, direction='IN', type='speed', extra=None):
+        if end <= start:
+            raise ValueError('StatQuery end must be after start')
+        if direction.upper() not in StatQuery.DIRECTIONS:
+            raise ValueError('StatQuery direction must be one of {0}'.format(StatQuery.DIRECTIONS))
+
+        self.start = start
+        self.end = end
+        self.granularity = granularity
+        self.direction = direction.upper()
+        self.type = type
+        self.extra = extra or {}
+
+    def __repr__(self):
+        return '<StatQuery - Start:{0} End:{1} Type:{2}>'.format(
+            self.start,
+            self.end,
+            self.type
+        )
+
+    @classmethod
+    def last(cls, span, **kwargs):
+        '''
+        Query for window ending now.
+
+        :param span: window length
+        :type span: datetime.timedelta
+        :rtype: manageengineapi.query.StatQuery
+        '''
+
+        end = datetime.now().replace(microsecond=0)
+        return cls(end - span, end, **kwargs)
+
+    def _copy(self, start, end):
+        return StatQuery(start, end, self.granularity, self.direction, self.type, self.extra)
+
+    def split(self, max_span):
+        '''
+        Sub-queries covering this window, none longer than max_span.
+
+        :param max_span: longest window per request
+        :type max_span: datetime.timedelta
+        :rtype: list
+        '''
+
+        if max_span <= timedelta(0):
+            raise ValueError('max_span must be positive')
+
+        windows = []
+        start = self.start
+        while start < self.end:
+            end = min(start + max_span, self.end)
+            windows.append(self._copy(start, end))
+            start = end
+        return windows
+
+    def traffic_payload(self, ipgroup):
+        '''Query parameters for getTrafficData.'''
+
+        payload = {
+            'DeviceID': ipgroup,
+            'IPGroup': 'true',
+            'TimeFrame': StatQuery.TIMEFRAME,
+            StatQuery.START_PARAM: _epoch_ms(self.start),
+            StatQuery.END_PARAM: _epoch_ms(self.end),
+            'expand': 'false',
+            'tablegripviewtype': 'Chart',
+            'Type': self.type,
+            'Data': self.direction,
+            'granularity': self.granularity,
+        }
+        payload.update(self.extra)
+        return payload
+
+    def conversation_payload(self, ipgroup, count=10):
+        '''Query parameters for getConvData.'''
+
+        payload = {
+            'DeviceID': ipgroup,
+            'IPGroup': 'true',
+            'TimeFrame': StatQuery.TIMEFRAME,
+            StatQuery.START_PARAM: _epoch_ms(self.start),
+            StatQuery.END_PARAM: _epoch_ms(self.end),
+            'Count': str(count),
+            'Data': self.direction,
+            'isNetwork': 'OFF',
+            'ResolveDNS': 'false',
+            'pageCount': '1',
+            'rows': str(count),
+            'expand': 'true',
+        }
+        payload.update(self.extra)
+        return payload
+
+
+#=================================================================
+# Stitching
+#=================================================================
+
+#Keys checked, in order, for the data point list inside a traffic response
+SERIES_KEYS = ('data', 'graphData', 'series', 'Data', 'points')
+
+
+def series_points(response):
+    '''
+    Data points of a traffic response. Accepts a bare list, or a dict holding the
+    list under one of SERIES_KEYS or as its only list value. Error payloads, and
+    responses with no recognisable point list, raise NFApiError rather than reading
+    as an empty series.
+
+    :param response: decoded getTrafficData response
+    :type response: dict or list
+    :rtype: list
+    '''
+
+    if isinstance(response, list):
+        return response
+    if isinstance(response, dict):
+        if response.get('error'):
+            error = response['error']
+            if isinstance(error, dict):
+                error = '{0}: {1}'.format(error.get('code'), error.get('message'))
+            raise NFApiError(error)
+        for key in SERIES_KEYS:
+            if isinstance(response.get(key), list):
+                return response[key]
+        lists = [v for v in response.values() if isinstance(v, list)]
+        if len(lists) == 1:
+            return lists[0]
+    raise NFApiError('Traffic response has no data points: {0!r}'.format(response)[:200])
+
+
+def point_time(point):
+    '''Timestamp of a data point, first element of a list or time key of a dict.'''
+
+    if isinstance(point, (list, tuple)):
+        return point[0]
+    for key in ('time', 'timestamp', 'Time', 'x'):
+        if key in point:
+            return point[key]
+    return None
+
+
+def stitch(responses, points=series_points, timestamp=point_time):
+    '''
+    Merge per-window responses into one series ordered by timestamp. Points that
+    fall on a window boundary and come back from both windows are kept once. A window
+    that came back as an error fails the whole series with NFApiError.
+
+    :param responses: decoded responses, in any order
+    :type responses: list
+    :param points: callable extracting data points from a response
+    :type points: function
+    :param timestamp: callable extracting timestamp from a data point
+    :type timestamp: function
+    :rtype: list
+    '''
+
+    merged = {}
+    untimed = []
+    for response in responses:
+        for point in points(response):
+            ts = timestamp(point)
+            if ts is None:
+                untimed.append(point)
+            else:
+                merged[ts] = point
+    return [merged[ts] for ts in sorted(merged)] + untimed
@@ -0,0 +1,181 @@
+'''
+Adaptive rate limiting for NFApi sessions. NFA degrades badly when it is pushed with
+parallel requests, so the limiter watches latency and error rates per endpoint and
+backs off concurrency and request rate when the server struggles, then slowly opens
+back up as it recovers (additive increase, multiplicative decrease).
+'''
+
+from __future__ import division
+import threading
+import time
+
+
+class _EndpointState(object):
+    '''Running limits and statistics for a single API endpoint.'''
+
+    __slots__ = (
+        'concurrency', 'rate', 'tokens', 'last_refill', 'in_flight', 'latency',
+        'error_rate', 'requests', 'errors', 'last_decrease'
+    )
+
+    def __init__(self, concurrency, rate):
+        self.concurrency = float(concurrency)
+        self.rate = float(rate)
+        self.tokens = 1.0
+        self.last_refill = time.time()
+        self.in_flight = 0
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.last_decrease = 0.0
+
+
+class AdaptiveLimiter(object):
+    '''
+    Limiter shared by all requests of an NFApi session. Every endpoint gets its own
+    concurrency limit and token bucket. Calls that fail (connection errors, HTTP 5xx,
+    NFApiError payloads) or take longer than latency_target cut both limits by
+    decrease_factor, healthy calls raise them again a little at a time.
+
+    :param max_concurrency: upper bound of simultaneous requests per endpoint
+    :type max_concurrency: int
+    :param min_concurrency: lower bound of simultaneous requests per endpoint
+    :type min_concurrency: int
+    :param max_rate: upper bound of requests per second per endpoint
+    :type max_rate: float
+    :param min_rate: lower bound of requests per second per endpoint
+    :type min_rate: float
+    :param latency_target: seconds a response may take before it counts as degraded
+    :type latency_target: float
+    :param error_threshold: smoothed error rate above which limits are cut
+    :type error_threshold: float
+    :param decrease_factor: multiplier applied to limits on degradation
+    :type decrease_factor: float
+    :param rate_step: requests per second added back after every healthy call
+    :type rate_step: float
+    :param smoothing: weight of newest sample in latency/error moving averages
+    :type smoothing: float
+    '''
+
+    def __init__(self, max_concurrency=8, min_concurrency=1, max_rate=20.0, min_rate=0.5,
+                 latency_target=5.0, error_threshold=0.2, decrease_factor=0.5, rate_step=0.1,
+                 smoothing=0.2):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate)
+        self.latency_target = latency_target
+        self.error_threshold = error_threshold
+        self.decrease_factor = decrease_factor
+        self.rate_step = rate_step
+        self.smoothing = smoothing
+        self._endpoints = {}
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return '<AdaptiveLimiter - Endpoints:{0}>'.format(len(self._endpoints))
+
+    def _state(self, endpoint):
+        state = self._endpoints.get(endpoint)
+        if state is None:
+            state = _EndpointState(self.max_concurrency, self.max_rate)
+            self._endpoints[endpoint] = state
+        return state
+
+    def _refill(self, state, now):
+        #Bucket holds at most one second worth of tokens so a recovered
+        #endpoint can't burst far above its current rate
+        elapsed = now - state.last_refill
+        state.tokens = min(max(state.rate, 1.0), state.tokens + elapsed * state.rate)
+        state.last_refill = now
+
+    def acquire(self, endpoint):
+        '''
+        Block until endpoint has both a free concurrency slot and a rate token.
+
+        :param endpoint: API URI being called
+        :type endpoint: str
+        :returns: start time to hand back to release
+        :rtype: float
+        '''
+
+        with self._cond:
+            state = self._state(endpoint)
+            while True:
+                now = time.time()
+                self._refill(state, now)
+                if state.in_flight < int(state.concurrency) and state.tokens >= 1.0:
+                    state.tokens -= 1.0
+                    state.in_flight += 1
+                    return time.time()
+
+                #Sleep until the next token is due, or until a slot frees up
+                wait = (1.0 - state.tokens) / state.rate if state.tokens < 1.0 else None
+                self._cond.wait(wait)
+
+    def release(self, endpoint, started, error=False):
+        '''
+        Return slot taken by acquire and feed the outcome of the call back
+        into the endpoint limits.
+
+        :param endpoint: API URI that was called
+        :type endpoint: str
+        :param started: value returned by acquire
+        :type started: float
+        :param error: whether call failed or server reported an error
+        :type error: bool
+        '''
+
+        latency = time.time() - started
+        with self._cond:
+            state = self._state(endpoint)
+            state.in_flight -= 1
+            state.requests += 1
+            if error:
+                state.errors += 1
+
+            alpha = self.smoothing
+            state.latency = latency if state.latency is None else \
+                (1 - alpha) * state.latency + alpha * latency
+            state.error_rate = (1 - alpha) * state.error_rate + alpha * (1.0 if error else 0.0)
+
+            degraded = error or latency > self.latency_target or \
+                state.error_rate > self.error_threshold
+            now = time.time()
+            if degraded:
+                #Only cut once per latency window. Requests that were already in flight
+                #when the server degraded would otherwise collapse limits to the floor.
+                if now - state.last_decrease >= min(self.latency_target, max(latency, 0.1)):
+                    state.concurrency = max(self.min_concurrency,
+                                            state.concurrency * self.decrease_factor)
+                    state.rate = max(self.min_rate, state.rate * self.decrease_factor)
+                    state.last_decrease = now
+            else:
+                state.concurrency = min(self.max_concurrency,
+                                        state.concurrency + 1.0 / max(state.concurrency, 1.0))
+                state.rate = min(self.max_rate, state.rate + self.rate_step)
+
+            self._cond.notify_all()
+
+    def metrics(self):
+        '''
+        Current limits and smoothed statistics for every endpoint seen so far.
+
+        :returns: dict keyed by endpoint URI
+        :rtype: dict
+        '''
+
+        with self._cond:
+            return dict(
+                (endpoint, {
+                    'concurrency_limit': int(state.concurrency),
+                    'rate_limit': round(state.rate, 3),
+                    'in_flight': state.in_flight,
+                    'latency': state.latency,
+                    'error_rate': round(state.error_rate, 4),
+                    'requests': state.requests,
+                    'errors': state.errors,
+                })
+                for endpoint, state in self._endpoints.items()
+            )
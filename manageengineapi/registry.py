@@ -0,0 +1,121 @@
+'''
+In-memory indexes of IPGroup and BillPlan objects by ID and name. NFApi keeps them
+consistent as objects are listed, added, modified and deleted, so single object lookups
+don't need a full list download.
+'''
+
+import threading
+
+
+class ObjectIndex(object):
+    '''
+    Objects of one kind keyed by ID and by name. IDs are keyed as strings since NFA
+    returns them as either int or str depending on the endpoint.
+
+    :param id_attr: name of object's ID attribute (IE: 'ID', 'plan_id')
+    :type id_attr: str
+    '''
+
+    def __init__(self, id_attr):
+        self.id_attr = id_attr
+        self.by_id = {}
+        self.by_name = {}
+
+        #id(obj) -> (ID, name) the object is currently indexed under, renames are
+        #done in place on the object so the old keys have to be remembered
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<ObjectIndex - Key:{0} Objects:{1}>'.format(self.id_attr, len(self))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        with self._lock:
+            objects = list(self.by_name.values())
+        return iter(objects)
+
+    def _id(self, obj):
+        value = getattr(obj, self.id_attr, None)
+        return str(value) if value not in (None, '') else None
+
+    def get(self, key):
+        '''
+        Object by name or ID.
+
+        :param key: name or ID
+        :type key: str or int
+        :returns: object or None
+        '''
+
+        with self._lock:
+            obj = self.by_name.get(key)
+            if obj is None:
+                obj = self.by_id.get(str(key))
+            return obj
+
+    def _discard(self, obj):
+        old_id, old_name = self._keys.pop(id(obj), (None, None))
+        if old_id is not None and self.by_id.get(old_id) is obj:
+            del self.by_id[old_id]
+        if old_name is not None and self.by_name.get(old_name) is obj:
+            del self.by_name[old_name]
+
+    def put(self, obj):
+        '''Index object under its current ID and name, replacing what was there.'''
+
+        with self._lock:
+            self._discard(obj)
+            obj_id = self._id(obj)
+            for index, key in ((self.by_id, obj_id), (self.by_name, obj.name)):
+                if key is None:
+                    continue
+                previous = index.get(key)
+                if previous is not None and previous is not obj:
+                    self._discard(previous)
+                index[key] = obj
+            self._keys[id(obj)] = (obj_id, obj.name)
+
+    def discard(self, obj):
+        '''Drop object from index.'''
+
+        with self._lock:
+            self._discard(obj)
+            key = self._id(obj)
+            if key is not None and key in self.by_id:
+                self._discard(self.by_id[key])
+            if obj.name in self.by_name:
+                self._discard(self.by_name[obj.name])
+
+    def replace(self, objects):
+        '''Index exactly objects, IE: the result of a full list call. The new indexes
+        are built aside and swapped in at once, readers never see a partial index.
+        '''
+
+        fresh = ObjectIndex(self.id_attr)
+        for obj in objects:
+            fresh.put(obj)
+        with self._lock:
+            self.by_id = fresh.by_id
+            self.by_name = fresh.by_name
+            self._keys = fresh._keys
+
+
+class Registry(object):
+    '''IPGroup and BillPlan indexes of one API session.'''
+
+    def __init__(self):
+        self.ip_groups = ObjectIndex('ID')
+        self.bill_plans = ObjectIndex('plan_id')
+
+    def __repr__(self):
+        return '<Registry - IPGroups:{0} BillPlans:{1}>'.format(
+            len(self.ip_groups),
+            len(self.bill_plans)
+        )
+
+    def clear(self):
+        self.ip_groups.replace([])
+        self.bill_plans.replace([])
@@ -0,0 +1,54 @@
+'''
+Retry policy for NFApi sessions. Only GET calls are retried since the add/modify/delete
+endpoints are not idempotent, but any call that bounced off an expired session is
+replayed once after the session logs back in.
+'''
+
+import random
+import time
+
+
+class RetryPolicy(object):
+    '''
+    Exponential backoff with full jitter between attempts.
+
+    :param retries: number of retries after the first attempt
+    :type retries: int
+    :param backoff: base delay in seconds, doubled for every attempt
+    :type backoff: float
+    :param max_backoff: upper bound of a single delay in seconds
+    :type max_backoff: float
+    :param status_forcelist: HTTP status codes that should be retried
+    :type status_forcelist: tuple
+    '''
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30.0,
+                 status_forcelist=(500, 502, 503, 504)):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.status_forcelist = status_forcelist
+
+    def __repr__(self):
+        return '<RetryPolicy - Retries:{0} Backoff:{1}>'.format(
+            self.retries,
+            self.backoff
+        )
+
+    def delay(self, attempt):
+        '''
+        Seconds to wait before given retry attempt. Full jitter keeps a pool of
+        clients that failed together from retrying together.
+
+        :param attempt: retry number, starting at 1
+        :type attempt: int
+        :rtype: float
+        '''
+
+        ceiling = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def sleep(self, attempt):
+        '''Block for delay of given retry attempt.'''
+
+        time.sleep(self.delay(attempt))
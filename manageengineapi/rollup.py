@@ -0,0 +1,276 @@
+'''
+Incremental rollups of collected traffic series. Every sample updates running aggregates
+in each resolution tier as it arrives, and range queries are answered from the coarsest
+tier that fits, so reporting over months touches buckets instead of raw samples.
+'''
+
+from __future__ import division
+from .query import point_time
+import heapq
+import math
+
+#Bucket sizes in seconds: 1 minute, 5 minutes, 1 hour, 1 day
+DEFAULT_TIERS = (60, 300, 3600, 86400)
+
+
+class Aggregate(object):
+    '''
+    Mergeable summary of samples: count, sum, min, max and a log-scale histogram
+    for percentiles with relative error of about precision.
+
+    :param precision: relative width of histogram bins
+    :type precision: float
+    '''
+
+    __slots__ = ('count', 'total', 'minimum', 'maximum', 'bins', '_log_base')
+
+    def __init__(self, precision=0.01):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.bins = {}
+        self._log_base = math.log(1 + precision)
+
+    def __repr__(self):
+        return '<Aggregate - Count:{0} Mean:{1}>'.format(
+            self.count,
+            self.mean
+        )
+
+    def _bin(self, value):
+        #Bins are (sign, log index) so zero and negative samples fit too
+        if value == 0:
+            return (0, 0)
+        return (1 if value > 0 else -1, int(math.floor(math.log(abs(value)) / self._log_base)))
+
+    def _value(self, index):
+        sign, exponent = index
+        return sign * math.exp((exponent + 0.5) * self._log_base)
+
+    def add(self, value):
+        '''Fold one sample into aggregate.'''
+
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        index = self._bin(value)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def merge(self, other):
+        '''Fold another aggregate into this one.'''
+
+        if not other.count:
+            return self
+        self.count += other.count
+        self.total += other.total
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, pct):
+        '''
+        Approximate percentile of folded samples.
+
+        :param pct: percentile between 0 and 100 (IE: 95)
+        :type pct: float
+        :rtype: float
+        '''
+
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(pct / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.bins, key=self._value):
+            seen += self.bins[index]
+            if seen >= rank:
+                #Clamp bin midpoint to observed range
+                return min(max(self._value(index), self.minimum), self.maximum)
+        return self.maximum
+
+    def as_dict(self, percentiles=(50, 95, 99)):
+        summary = {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.minimum,
+            'max': self.maximum,
+        }
+        for pct in percentiles:
+            summary['p{0}'.format(pct)] = self.percentile(pct)
+        return summary
+
+
+class Rollup(object):
+    '''
+    Running aggregates of one series at several resolutions. Timestamps are epoch
+    seconds.
+
+    :param tiers: bucket sizes in seconds, each a multiple of the previous one
+    :type tiers: tuple
+    :param retention: optional dict of bucket size -> seconds of history kept. Range
+        edges that fall into expired finer buckets are left out of summaries.
+    :type retention: dict
+    :param precision: relative error of percentile estimates
+    :type precision: float
+    '''
+
+    def __init__(self, tiers=DEFAULT_TIERS, retention=None, precision=0.01):
+        self.tiers = tuple(sorted(tiers))
+        for finer, coarser in zip(self.tiers, self.tiers[1:]):
+            if coarser % finer:
+                raise ValueError('Rollup tier {0} is not a multiple of {1}'.format(coarser, finer))
+
+        self.retention = retention or {}
+        self.precision = precision
+        self.latest = None
+        self._buckets = dict((size, {}) for size in self.tiers)
+
+        #Bucket starts per tier in a heap, so expiry pops oldest without scanning
+        self._starts = dict((size, []) for size in self.tiers)
+
+    def __repr__(self):
+        return '<Rollup - Tiers:{0} Buckets:{1}>'.format(
+            self.tiers,
+            sum(len(b) for b in self._buckets.values())
+        )
+
+    def add(self, timestamp, value):
+        '''
+        Fold one sample into every tier. Samples may arrive out of order.
+
+        :param timestamp: epoch seconds
+        :type timestamp: float
+        :param value: sample value
+        :type value: float
+        '''
+
+        for size in self.tiers:
+            buckets = self._buckets[size]
+            start = int(timestamp // size * size)
+            aggregate = buckets.get(start)
+            if aggregate is None:
+                aggregate = buckets[start] = Aggregate(self.precision)
+                if size in self.retention:
+                    heapq.heappush(self._starts[size], start)
+            aggregate.add(value)
+
+        if self.latest is None or timestamp > self.latest:
+            self.latest = timestamp
+            self._expire()
+
+    def add_series(self, points, timestamp=point_time, value=lambda p: p[1], unit=1):
+        '''
+        Fold data points as returned by get_group_traffic_data/get_group_traffic_series.
+
+        :param points: list of data points
+        :type points: list
+        :param timestamp: callable extracting timestamp from a point
+        :type timestamp: function
+        :param value: callable extracting value from a point
+        :type value: function
+        :param unit: timestamp units per second, 1000 for epoch milliseconds
+        :type unit: int
+        '''
+
+        for point in points:
+            self.add(timestamp(point) / unit, float(value(point)))
+
+    def _expire(self):
+        for size, keep in self.retention.items():
+            starts = self._starts.get(size)
+            cutoff = self.latest - keep
+            while starts and starts[0] + size <= cutoff:
+                del self._buckets[size][heapq.heappop(starts)]
+
+    def series(self, start, end, resolution):
+        '''
+        Aggregates of one tier between start and end.
+
+        :param start: epoch seconds, inclusive
+        :type start: float
+        :param end: epoch seconds, exclusive
+        :type end: float
+        :param resolution: tier bucket size in seconds
+        :type resolution: int
+        :returns: list of (bucket start, Aggregate)
+        :rtype: list
+        '''
+
+        buckets = self._buckets[resolution]
+        first = int(start // resolution * resolution)
+        return [(s, buckets[s]) for s in range(first, int(end), resolution) if s in buckets]
+
+    def _cover(self, start, end, tiers):
+        #Largest aligned run of the coarsest tier in the middle, finer tiers for the edges
+        size = tiers[-1]
+        if len(tiers) == 1:
+            return [(size, start, end)]
+        first = -(-start // size) * size
+        last = end // size * size
+        if first >= last:
+            return self._cover(start, end, tiers[:-1])
+        parts = [(size, first, last)]
+        if start < first:
+            parts = self._cover(start, first, tiers[:-1]) + parts
+        if last < end:
+            parts = parts + self._cover(last, end, tiers[:-1])
+        return parts
+
+    def summary(self, start, end):
+        '''
+        Merged aggregate of all samples between start and end, read from the
+        coarsest buckets that fit inside the range. Edges not aligned to the
+        finest tier are rounded out to whole finest buckets.
+
+        :param start: epoch seconds, inclusive
+        :type start: float
+        :param end: epoch seconds, exclusive
+        :type end: float
+        :rtype: manageengineapi.rollup.Aggregate
+        '''
+
+        finest = self.tiers[0]
+        start = int(start // finest * finest)
+        end = int(-(-end // finest) * finest)
+
+        result = Aggregate(self.precision)
+        for size, part_start, part_end in self._cover(start, end, self.tiers):
+            for _, aggregate in self.series(part_start, part_end, size):
+                result.merge(aggregate)
+        return result
+
+
+class RollupStore(object):
+    '''
+    Rollups for many series keyed by name, IE: one per IP group and direction.
+    Takes the same arguments as Rollup.
+    '''
+
+    def __init__(self, **kwargs):
+        self.options = kwargs
+        self.rollups = {}
+
+    def __repr__(self):
+        return '<RollupStore - Series:{0}>'.format(len(self.rollups))
+
+    def __getitem__(self, key):
+        rollup = self.rollups.get(key)
+        if rollup is None:
+            rollup = self.rollups[key] = Rollup(**self.options)
+        return rollup
+
+    def add(self, key, timestamp, value):
+        '''Fold one sample into series key.'''
+
+        self[key].add(timestamp, value)
@@ -0,0 +1,232 @@
+'''
+Local snapshots of the parsed NFA configuration. Jobs that need the full IP group, bill
+plan and device lists can load a snapshot written by an earlier run instead of waiting
+on three large downloads, then refresh it in the background.
+
+Snapshots are pickles. Only load snapshot files written by yourself.
+'''
+
+import gzip
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+#Python 2.x has no os.replace, rename is atomic on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+class Snapshot(object):
+    '''
+    Parsed IPGroup, BillPlan and Device objects captured from a server at a point in time.
+
+    :param hostname: NFA server the objects were read from
+    :type hostname: str
+    :param ip_groups: list of IPGroup
+    :type ip_groups: list
+    :param bill_plans: list of BillPlan
+    :type bill_plans: list
+    :param devices: list of Device
+    :type devices: list
+    :param created: epoch time objects were read from server
+    :type created: float
+    '''
+
+    #Bumped whenever the pickled object layout changes
+    FORMAT_VERSION = 2
+
+    def __init__(self, hostname, ip_groups, bill_plans, devices, created=None):
+        self.hostname = hostname
+        self.ip_groups = ip_groups
+        self.bill_plans = bill_plans
+        self.devices = devices
+        self.created = time.time() if created is None else created
+        self._refresh_thread = None
+
+    def __repr__(self):
+        return '<Snapshot - Host:{0} Age:{1:.0f}s>'.format(
+            self.hostname,
+            self.age
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_refresh_thread'] = None
+        return state
+
+    @property
+    def age(self):
+        '''Seconds since objects were read from server.'''
+
+        return time.time() - self.created
+
+    def is_stale(self, max_age):
+        '''
+        Whether snapshot is older than max_age seconds.
+
+        :param max_age: allowed age in seconds
+        :type max_age: float
+        :rtype: bool
+        '''
+
+        return self.age > max_age
+
+    @classmethod
+    def capture(cls, session):
+        '''
+        Read full configuration from a logged in session.
+
+        :param session: logged in API session
+        :type session: manageengineapi.NFApi
+        :rtype: manageengineapi.snapshot.Snapshot
+        '''
+
+        created = time.time()
+        return cls(
+            session.hostname,
+            session.get_ip_groups(),
+            session.get_bill_plans(),
+            session.get_dev_list(),
+            created
+        )
+
+    def save(self, path):
+        '''
+        Write snapshot to path as compressed pickle. The file is written next to path
+        and renamed into place, so a crash or a concurrent load never sees a
+        truncated snapshot.
+
+        :param path: file to write
+        :type path: str
+        '''
+
+        header = {
+            'format': Snapshot.FORMAT_VERSION,
+            'hostname': self.hostname,
+            'created': self.created,
+        }
+        fd, tmp_path = tempfile.mkstemp(
+            prefix='.{0}.'.format(os.path.basename(path)),
+            suffix='.tmp',
+            dir=os.path.dirname(os.path.abspath(path))
+        )
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=1) as f:
+                    pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+                    pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+                raw.flush()
+                os.fsync(raw.fileno())
+            _replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def read_header(cls, path):
+        '''
+        Read staleness metadata without loading the object graph.
+
+        :param path: snapshot file
+        :type path: str
+        :returns: dict with format, hostname and created keys
+        :rtype: dict
+        '''
+
+        with gzip.open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Load snapshot written by save.
+
+        :param path: snapshot file
+        :type path: str
+        :rtype: manageengineapi.snapshot.Snapshot
+        '''
+
+        with gzip.open(path, 'rb') as f:
+            header = pickle.load(f)
+            if header.get('format') != Snapshot.FORMAT_VERSION:
+                raise ValueError('Snapshot format {0} is not supported'.format(header.get('format')))
+            return pickle.load(f)
+
+    def refresh(self, session, path=None):
+        '''
+        Re-read configuration from server in place, optionally saving result.
+
+        :param session: logged in API session
+        :type session: manageengineapi.NFApi
+        :param path: file to save refreshed snapshot to
+        :type path: str
+        '''
+
+        fresh = Snapshot.capture(session)
+
+        #Swap all lists at once so readers never see a mix of old and new
+        self.__dict__.update(
+            hostname = fresh.hostname,
+            ip_groups = fresh.ip_groups,
+            bill_plans = fresh.bill_plans,
+            devices = fresh.devices,
+            created = fresh.created
+        )
+        if path:
+            self.save(path)
+
+    def refresh_async(self, session, path=None):
+        '''
+        Refresh in a daemon thread so read-only jobs can start on snapshot data
+        right away. Returns the thread, join it to wait for fresh data.
+
+        :param session: logged in API session
+        :type session: manageengineapi.NFApi
+        :param path: file to save refreshed snapshot to
+        :type path: str
+        :rtype: threading.Thread
+        '''
+
+        thread = threading.Thread(target=self.refresh, args=(session, path))
+        thread.daemon = True
+        thread.start()
+        self._refresh_thread = thread
+        return thread
+
+    @classmethod
+    def load_or_capture(cls, path, session, max_age=None, background=True):
+        '''
+        Warm start helper. Loads snapshot from path if it exists and was taken from
+        the same server, otherwise captures and saves a new one. If loaded snapshot
+        is older than max_age it gets refreshed, in the background by default.
+
+        :param path: snapshot file
+        :type path: str
+        :param session: logged in API session
+        :type session: manageengineapi.NFApi
+        :param max_age: seconds before snapshot should be refreshed
+        :type max_age: float
+        :param background: refresh in daemon thread instead of blocking
+        :type background: bool
+        :rtype: manageengineapi.snapshot.Snapshot
+        '''
+
+        try:
+            snap = cls.load(path)
+        except (IOError, OSError, ValueError, EOFError, pickle.UnpicklingError):
+            snap = None
+
+        if snap is None or snap.hostname != session.hostname:
+            snap = cls.capture(session)
+            snap.save(path)
+        elif max_age is not None and snap.is_stale(max_age):
+            if background:
+                snap.refresh_async(session, path)
+            else:
+                snap.refresh(session, path)
+
+        return snap
@@ -0,0 +1,199 @@
+'''
+Incremental JSON parsing for large list responses. Rather than materializing a whole
+getConvData or listIPGroup body, the scanner walks the text as it downloads and decodes
+one element of the target array at a time, so memory is bounded by the largest element
+and the first records are available before the download finishes.
+'''
+
+import codecs
+import json
+import re
+
+#Characters that change scanner state outside and inside of strings
+_STRUCTURAL = re.compile(r'[\[\]{},:"]')
+_STRING_END = re.compile(r'["\\]')
+
+#Keys longer than this are never decoded, they can't be what we are looking for
+_MAX_KEY = 256
+
+#Amount of body kept around to report what came back when no array was found
+_HEAD_SIZE = 65536
+
+
+class JSONStreamError(ValueError):
+    '''Raised when the target array never appears in the streamed document.
+
+    :param head: beginning of the document, for error payload inspection
+    :type head: str
+    '''
+
+    def __init__(self, message, head):
+        ValueError.__init__(self, message)
+        self.head = head
+
+
+class JSONArrayScanner(object):
+    '''
+    Push parser yielding elements of one JSON array inside a larger document.
+
+    :param key: object key holding the array. If None, the first array that is either
+        the document itself or a direct value of the top level object is used.
+    :type key: str
+    '''
+
+    def __init__(self, key=None):
+        self.key = key
+        self.found = False
+        self.finished = False
+        self.head = ''
+        self._buf = ''
+        self._pos = 0
+        self._stack = []
+        self._keys = []
+        self._in_string = False
+        self._str_start = None
+        self._last_string = None
+        self._target = None
+        self._item_start = None
+
+    def _is_target(self):
+        if self.found:
+            return False
+        if self.key is None:
+            return len(self._stack) == 0 or (len(self._stack) == 1 and self._stack[0] == '{')
+        return bool(self._stack) and self._stack[-1] == '{' and self._keys[-1] == self.key
+
+    def feed(self, text):
+        '''
+        Consume next piece of document text.
+
+        :param text: decoded chunk of response body
+        :type text: str
+        :returns: array elements completed by this chunk
+        :rtype: list
+        '''
+
+        if len(self.head) < _HEAD_SIZE:
+            self.head += text[:_HEAD_SIZE - len(self.head)]
+        if self.finished:
+            return []
+
+        buf = self._buf + text
+        pos = self._pos
+        items = []
+        stack = self._stack
+
+        while True:
+            if self._in_string:
+                match = _STRING_END.search(buf, pos)
+                if match is None:
+                    pos = len(buf)
+                    break
+                if match.group() == '\\':
+                    #Escaped character may be in the next chunk
+                    if match.end() >= len(buf):
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+
+                #Remember completed string in case it turns out to be an object key
+                if self._target is None and pos - self._str_start <= _MAX_KEY:
+                    self._last_string = json.loads(buf[self._str_start:pos])
+                else:
+                    self._last_string = None
+                continue
+
+            match = _STRUCTURAL.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            char = match.group()
+            index = match.start()
+            pos = match.end()
+
+            if char == '"':
+                self._in_string = True
+                self._str_start = index
+                continue
+
+            #Element boundary inside target array
+            if self._target is not None and len(stack) == self._target and char in ',]':
+                element = buf[self._item_start:index].strip()
+                if element:
+                    items.append(json.loads(element))
+                if char == ',':
+                    self._item_start = pos
+                    continue
+                self._target = None
+                self._item_start = None
+                self.finished = True
+                stack.pop()
+                break
+
+            if char in '[{':
+                if char == '[' and self._target is None and self._is_target():
+                    self.found = True
+                    stack.append(char)
+                    self._target = len(stack)
+                    self._item_start = pos
+                    continue
+                stack.append(char)
+                if char == '{':
+                    self._keys.append(None)
+            elif char in ']}':
+                stack.pop()
+                if char == '}':
+                    self._keys.pop()
+            elif char == ':':
+                if self._target is None and self._keys:
+                    self._keys[-1] = self._last_string
+
+        #Keep only the text still needed: the element being read or the open string
+        if self._item_start is not None:
+            keep = self._item_start
+        elif self._in_string:
+            keep = self._str_start
+        else:
+            keep = pos
+        keep = min(keep, pos)
+
+        self._buf = buf[keep:]
+        self._pos = pos - keep
+        if self._item_start is not None:
+            self._item_start -= keep
+        if self._in_string:
+            self._str_start -= keep
+
+        return items
+
+
+def iter_json_array(chunks, key=None, encoding='utf-8'):
+    '''
+    Yield elements of a JSON array as the document streams in.
+
+    :param chunks: iterable of bytes, IE: response.iter_content(65536)
+    :type chunks: iterable
+    :param key: object key holding the array, see JSONArrayScanner
+    :type key: str
+    :param encoding: body encoding
+    :type encoding: str
+    :raises: JSONStreamError if document has no matching array
+    '''
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    scanner = JSONArrayScanner(key)
+    for chunk in chunks:
+        for item in scanner.feed(decoder.decode(chunk)):
+            yield item
+        if scanner.finished:
+            return
+
+    for item in scanner.feed(decoder.decode(b'', final=True)):
+        yield item
+
+    if not scanner.found:
+        raise JSONStreamError('No JSON array {0} found in response'.format(
+            repr(key) if key else ''), scanner.head)
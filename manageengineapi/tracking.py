@@ -0,0 +1,115 @@
+'''
+Change tracking shared by IPGroup and BillPlan. Objects remember which attributes were
+set since they were loaded from the API or last pushed, and cache their encoded form
+payload until one of those attributes changes again.
+'''
+
+
+class TrackedList(list):
+    '''
+    List that reports in-place mutation back to the object owning it. Used for
+    IPGroup.ip so add_ip and direct appends both invalidate the cached payload.
+    '''
+
+    def __init__(self, owner, name, items=()):
+        list.__init__(self, items)
+        self._owner = owner
+        self._name = name
+
+    def __reduce_ex__(self, protocol):
+        #Pickle as plain list contents plus owner, avoids replaying
+        #mutation hooks before owner is restored
+        return (_rebuild_tracked_list, (self.__dict__.get('_owner'), self.__dict__.get('_name'), list(self)))
+
+    def _touch(self):
+        owner = self.__dict__.get('_owner')
+        if owner is not None:
+            owner._mark_changed(self._name)
+
+    def _mutator(name):
+        method = getattr(list, name)
+
+        def wrapper(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._touch()
+            return result
+        wrapper.__name__ = name
+        return wrapper
+
+    append = _mutator('append')
+    extend = _mutator('extend')
+    insert = _mutator('insert')
+    remove = _mutator('remove')
+    pop = _mutator('pop')
+    sort = _mutator('sort')
+    reverse = _mutator('reverse')
+    __setitem__ = _mutator('__setitem__')
+    __delitem__ = _mutator('__delitem__')
+    __iadd__ = _mutator('__iadd__')
+
+    #Python 3 only / Python 2 only list methods
+    if hasattr(list, 'clear'):
+        clear = _mutator('clear')
+    if hasattr(list, '__setslice__'):
+        __setslice__ = _mutator('__setslice__')
+        __delslice__ = _mutator('__delslice__')
+    del _mutator
+
+
+def _rebuild_tracked_list(owner, name, items):
+    return TrackedList(owner, name, items)
+
+
+class ChangeTracking(object):
+    '''
+    Mixin recording assignments to attributes listed in TRACKED. Subclasses
+    implement _encode_payload(variant) returning the form payload for the API.
+    '''
+
+    TRACKED = ()
+
+    def __setattr__(self, name, value):
+        if name in self.TRACKED:
+            self._mark_changed(name)
+        object.__setattr__(self, name, value)
+
+    def _mark_changed(self, name):
+        self.__dict__.setdefault('_changed', set()).add(name)
+        self.__dict__['_payload_cache'] = {}
+
+    @property
+    def changed(self):
+        '''Names of attributes changed since object was loaded or last pushed.'''
+
+        return frozenset(self.__dict__.get('_changed', ()))
+
+    @property
+    def is_dirty(self):
+        '''Whether object has changes that have not been pushed to the API.'''
+
+        return bool(self.__dict__.get('_changed'))
+
+    def mark_clean(self):
+        '''Forget recorded changes, called after object is loaded or pushed.'''
+
+        self.__dict__['_changed'] = set()
+
+    def api_payload(self, variant=None):
+        '''
+        Form payload for add/modify calls, encoded once and reused until a
+        tracked attribute changes. Returns a copy so callers can add apiKey.
+
+        :param variant: payload flavour for objects with differing add/modify forms
+        :type variant: str
+        :rtype: dict
+        '''
+
+        cache = self.__dict__.setdefault('_payload_cache', {})
+        payload = cache.get(variant)
+        if payload is None:
+            payload = self._encode_payload(variant)
+            cache[variant] = payload
+        return dict(payload)
+
+    def _encode_payload(self, variant):
+        raise NotImplementedError
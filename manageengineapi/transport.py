@@ -0,0 +1,294 @@
+'''
+Record/replay transport for NFApi sessions. RecordingAdapter captures real NFA exchanges
+(login sequence included) into a cassette file with API keys, passwords and session
+tokens scrubbed. ReplayAdapter plays a cassette back with original or scaled latency,
+so parsing and client throughput can be benchmarked offline on real-shaped payloads.
+
+Usage::
+
+    recorder = RecordingAdapter()
+    session.mount_transport(recorder)
+    session.login()
+    session.get_ip_groups()
+    recorder.cassette.save('nfa.cassette.json')
+
+    replay = NFApi('anyhost', 'key', 'user', 'pass')
+    replay.mount_transport(ReplayAdapter(Cassette.load('nfa.cassette.json')))
+    replay.login()
+'''
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from datetime import timedelta
+import base64
+import json
+import re
+import threading
+import time
+
+try:
+    from urllib.parse import urlsplit, parse_qsl, urlencode
+    from http.client import HTTPMessage
+except ImportError:
+    #Python 2.x
+    from urlparse import urlsplit, parse_qsl
+    from urllib import urlencode
+    from httplib import HTTPMessage
+
+SCRUBBED = 'SCRUBBED'
+
+#Query/form fields replaced with SCRUBBED before anything is written
+SCRUB_FIELDS = ('apiKey', 'j_password', 'EncryptPassword', 'encryptPassForAutomaticSignIn')
+
+#Cookies whose values are replaced in recorded Set-Cookie headers
+SCRUB_COOKIES = ('NFA__SSO', 'JSESSIONID', 'encryptPassForAutomaticSignIn')
+
+#Endpoints whose response body is a secret (encrypted password)
+SCRUB_BODIES = ('/servlets/Settings/Serverlet',)
+
+#Request fields that change on every call and are ignored when matching
+IGNORE_FIELDS = ('sid',)
+
+#Request headers never recorded
+DROP_HEADERS = ('cookie', 'authorization')
+
+_JSESSIONID = re.compile(r';jsessionid=[^/?#]*', re.IGNORECASE)
+
+
+def _scrub_cookie_header(value):
+    for name in SCRUB_COOKIES:
+        value = re.sub(r'({0}=)[^;,\s]*'.format(re.escape(name)), r'\g<1>' + SCRUBBED, value)
+    return value
+
+
+def _fields(pairs):
+    return sorted(
+        (k, SCRUBBED if k in SCRUB_FIELDS else v)
+        for k, v in pairs
+        if k not in IGNORE_FIELDS
+    )
+
+
+def request_key(method, url, body):
+    '''
+    Normalized identity of a request: method, path with session id scrubbed, and
+    sorted scrubbed query/form fields. Host is ignored so cassettes replay against
+    any hostname.
+
+    :rtype: str
+    '''
+
+    parts = urlsplit(url)
+    path = _JSESSIONID.sub(';jsessionid=' + SCRUBBED, parts.path)
+    query = _fields(parse_qsl(parts.query, keep_blank_values=True))
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    form = _fields(parse_qsl(body or '', keep_blank_values=True))
+    return '{0} {1}?{2}|{3}'.format(method.upper(), path, urlencode(query), urlencode(form))
+
+
+class Cassette(object):
+    '''
+    Recorded exchanges, serializable to JSON.
+
+    :param exchanges: list of exchange dicts
+    :type exchanges: list
+    '''
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, exchanges=None):
+        self.exchanges = exchanges or []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Cassette - Exchanges:{0}>'.format(len(self.exchanges))
+
+    def __len__(self):
+        return len(self.exchanges)
+
+    def append(self, exchange):
+        with self._lock:
+            self.exchanges.append(exchange)
+
+    def save(self, path):
+        '''Write cassette as JSON.'''
+
+        with open(path, 'w') as f:
+            json.dump({'format': Cassette.FORMAT_VERSION, 'exchanges': self.exchanges}, f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        '''Read cassette written by save.'''
+
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('format') != Cassette.FORMAT_VERSION:
+            raise ValueError('Cassette format {0} is not supported'.format(data.get('format')))
+        return cls(data['exchanges'])
+
+
+class RecordingAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter that sends requests for real and records every exchange,
+    redirect hops included, into cassette.
+
+    :param cassette: cassette to append to, new one if None
+    :type cassette: manageengineapi.transport.Cassette
+    '''
+
+    def __init__(self, cassette=None, *args, **kwargs):
+        HTTPAdapter.__init__(self, *args, **kwargs)
+        self.cassette = cassette if cassette is not None else Cassette()
+
+    def send(self, request, **kwargs):
+        started = time.time()
+        response = HTTPAdapter.send(self, request, **kwargs)
+        content = response.content
+        elapsed = time.time() - started
+
+        path = urlsplit(request.url).path
+        if path in SCRUB_BODIES:
+            content = SCRUBBED.encode('utf-8')
+
+        try:
+            body = {'text': content.decode('utf-8')}
+        except UnicodeDecodeError:
+            body = {'base64': base64.b64encode(content).decode('ascii')}
+
+        #iteritems keeps repeated headers like Set-Cookie apart
+        raw_headers = response.raw.headers
+        headers = []
+        for name, value in getattr(raw_headers, 'iteritems', raw_headers.items)():
+            if name.lower() == 'set-cookie':
+                value = _scrub_cookie_header(value)
+            headers.append([name, value])
+
+        self.cassette.append({
+            'key': request_key(request.method, request.url, request.body),
+            'method': request.method,
+            'url': _JSESSIONID.sub(';jsessionid=' + SCRUBBED, request.url.split('?')[0]),
+            'request_headers': [[k, v] for k, v in request.headers.items()
+                                if k.lower() not in DROP_HEADERS],
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': headers,
+            'body': body,
+            'elapsed': elapsed,
+        })
+        return response
+
+
+class _ReplayRaw(object):
+    '''Just enough of urllib3's HTTPResponse for requests to read cookies and headers.'''
+
+    def __init__(self, headers, content):
+        message = HTTPMessage()
+        for name, value in headers:
+            message[name] = value
+        self.headers = message
+        self.msg = message
+        self._original_response = self
+        self._content = content
+
+    def read(self, *args, **kwargs):
+        return self._content
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class ReplayAdapter(BaseAdapter):
+    '''
+    Adapter answering requests from a cassette. Repeated identical requests are
+    answered by successive recordings of that request, the last one repeats once
+    they run out.
+
+    :param cassette: recorded exchanges
+    :type cassette: manageengineapi.transport.Cassette
+    :param latency_scale: multiplier for recorded latency, 0 answers instantly
+    :type latency_scale: float
+    :param strict: only answer exact request matches. Otherwise fall back to any
+        recording of the same method and path.
+    :type strict: bool
+    '''
+
+    def __init__(self, cassette, latency_scale=0.0, strict=False):
+        BaseAdapter.__init__(self)
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self._by_key = {}
+        self._by_path = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        for exchange in cassette.exchanges:
+            self._by_key.setdefault(exchange['key'], []).append(exchange)
+            self._by_path.setdefault(exchange['key'].split('?')[0], []).append(exchange)
+
+    def __repr__(self):
+        return '<ReplayAdapter - Exchanges:{0} Latency:{1}x>'.format(
+            len(self.cassette),
+            self.latency_scale
+        )
+
+    def _next(self, key):
+        candidates = self._by_key.get(key)
+        if candidates is None and not self.strict:
+            key = key.split('?')[0]
+            candidates = self._by_path.get(key)
+        if not candidates:
+            return None
+        with self._lock:
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+        return candidates[min(index, len(candidates) - 1)]
+
+    def send(self, request, **kwargs):
+        exchange = self._next(request_key(request.method, request.url, request.body))
+        if exchange is None:
+            raise LookupError('No recorded exchange for {0} {1}'.format(request.method, request.url))
+
+        if self.latency_scale:
+            time.sleep(exchange['elapsed'] * self.latency_scale)
+
+        body = exchange['body']
+        content = body['text'].encode('utf-8') if 'text' in body else base64.b64decode(body['base64'])
+
+        #Recorded bodies are already decoded, drop headers describing wire encoding
+        headers = [h for h in exchange['headers']
+                   if h[0].lower() not in ('content-encoding', 'transfer-encoding', 'content-length')]
+        raw = _ReplayRaw(headers, content)
+
+        response = self.build_response(request, raw, exchange, content)
+        return response
+
+    def build_response(self, request, raw, exchange, content):
+        from requests.models import Response
+
+        response = Response()
+        response.status_code = exchange['status']
+        response.reason = exchange.get('reason')
+        #Repeated headers are joined like urllib3 does for live responses
+        merged = CaseInsensitiveDict()
+        for name, value in exchange['headers']:
+            merged[name] = '{0}, {1}'.format(merged[name], value) if name in merged else value
+        response.headers = merged
+        response.raw = raw
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response._content_consumed = True
+        response.elapsed = timedelta(seconds=exchange['elapsed'])
+        extract_cookies_to_jar(response.cookies, request, raw)
+        return response
+
+    def close(self):
+        pass
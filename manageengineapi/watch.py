@@ -0,0 +1,289 @@
+'''
+Configuration change feed. One ConfigWatcher polls the IP group and bill plan lists on an
+interval, diffs each poll against the previous one keyed by IPGroup.ID and
+BillPlan.plan_id, and hands out only add/modify/delete events to in-process subscribers
+and an optional append-only event log. Services interested in changes subscribe instead
+of each re-downloading the full configuration.
+
+Usage::
+
+    watcher = ConfigWatcher(session, interval=300, log=EventLog('nfa-changes.jsonl'))
+    watcher.subscribe(lambda event: print(event.action, event.kind, event.name), kinds=('ipgroup',))
+    watcher.start()
+
+    #Elsewhere, catch up from the log
+    for event in EventLog.read('nfa-changes.jsonl', after=last_seen):
+        ...
+'''
+
+from collections import namedtuple
+import json
+import os
+import threading
+import time
+
+#kind is 'ipgroup' or 'billplan', action is 'add', 'modify' or 'delete'. old/new are
+#the objects before/after (None for add/delete), changes maps field -> [old, new] with
+#None for the missing side of adds and deletes, so log readers get full contents.
+ChangeEvent = namedtuple('ChangeEvent', (
+    'sequence', 'timestamp', 'kind', 'action', 'key', 'name', 'changes', 'old', 'new'
+))
+
+KINDS = ('ipgroup', 'billplan')
+
+
+def _event_dict(event):
+    return {
+        'sequence': event.sequence,
+        'timestamp': event.timestamp,
+        'kind': event.kind,
+        'action': event.action,
+        'key': event.key,
+        'name': event.name,
+        'changes': event.changes,
+    }
+
+
+def object_state(obj):
+    '''
+    Comparable, JSON friendly view of a tracked object's fields. IP definitions
+    are reduced to their type, status and API format.
+
+    :param obj: IPGroup or BillPlan
+    :rtype: dict
+    '''
+
+    state = {}
+    for name in obj.TRACKED:
+        value = getattr(obj, name, None)
+        if name == 'ip':
+            value = ['{0} {1} {2}'.format(i.type, i.status, i.api_format) for i in value]
+        state[name] = value
+    return state
+
+
+class EventLog(object):
+    '''
+    Append-only JSON lines log of change events. Objects are not written, only
+    the changed fields.
+
+    :param path: log file, appended to if it exists
+    :type path: str
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.last_sequence = 0
+        for event in EventLog.read(path):
+            self.last_sequence = event['sequence']
+
+        #End a line cut short by a crash, or the next event would be glued onto it
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+            if torn:
+                with open(path, 'a') as f:
+                    f.write('\n')
+
+    def __repr__(self):
+        return '<EventLog - Path:{0} Sequence:{1}>'.format(self.path, self.last_sequence)
+
+    def write(self, events):
+        with self._lock:
+            with open(self.path, 'a') as f:
+                for event in events:
+                    f.write(json.dumps(_event_dict(event), sort_keys=True, default=str) + '\n')
+                f.flush()
+            if events:
+                self.last_sequence = events[-1].sequence
+
+    @staticmethod
+    def read(path, after=0):
+        '''
+        Events logged after sequence number after, as dicts.
+
+        :rtype: iterator
+        '''
+
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    #Line cut short by a crash
+                    continue
+                if event['sequence'] > after:
+                    yield event
+
+
+class ConfigWatcher(object):
+    '''
+    Polls IP groups and bill plans and publishes what changed between polls.
+    Creating the session with cache_parsed=True makes polls of an unchanged
+    configuration close to free, unchanged entries come back as the same objects.
+
+    :param session: logged in API session
+    :type session: manageengineapi.NFApi
+    :param interval: seconds between polls
+    :type interval: float
+    :param kinds: lists to watch, any of 'ipgroup', 'billplan'
+    :type kinds: tuple
+    :param log: event log every event is appended to
+    :type log: manageengineapi.watch.EventLog
+    :param emit_initial: publish the first poll as add events instead of only
+        taking it as baseline
+    :type emit_initial: bool
+    '''
+
+    def __init__(self, session, interval=300, kinds=KINDS, log=None, emit_initial=False):
+        for kind in kinds:
+            if kind not in KINDS:
+                raise ValueError('Unknown kind {0}, choose from {1}'.format(kind, KINDS))
+        self.session = session
+        self.interval = interval
+        self.kinds = tuple(kinds)
+        self.log = log
+        self.emit_initial = emit_initial
+
+        #kind -> key -> (object, state)
+        self.current = {}
+        self.sequence = log.last_sequence if log is not None else 0
+        self.polls = 0
+        self.errors = 0
+        self.subscriber_errors = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return '<ConfigWatcher - Interval:{0} Subscribers:{1} Sequence:{2}>'.format(
+            self.interval,
+            len(self._subscribers),
+            self.sequence
+        )
+
+    def subscribe(self, callback, kinds=None):
+        '''
+        Call callback with every ChangeEvent of given kinds, all kinds if None.
+        Exceptions raised by callbacks are counted and otherwise ignored.
+
+        :returns: token for unsubscribe
+        '''
+
+        token = (callback, tuple(kinds) if kinds else None)
+        with self._lock:
+            self._subscribers.append(token)
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            if token in self._subscribers:
+                self._subscribers.remove(token)
+
+    def _fetch(self, kind):
+        if kind == 'ipgroup':
+            return dict((str(g.ID), g) for g in self.session.get_ip_groups())
+        return dict((str(p.plan_id), p) for p in self.session.get_bill_plans())
+
+    def _diff(self, kind, objects):
+        previous = self.current.get(kind)
+        current = {}
+        events = []
+
+        for key, obj in objects.items():
+            before = previous.get(key) if previous is not None else None
+
+            #Parse cache hands out the very same object for unchanged entries
+            if before is not None and before[0] is obj:
+                current[key] = before
+                continue
+
+            state = object_state(obj)
+            current[key] = (obj, state)
+            if before is None:
+                if previous is not None or self.emit_initial:
+                    changes = dict((field, [None, value]) for field, value in state.items())
+                    events.append((kind, 'add', key, obj.name, changes, None, obj))
+            elif before[1] != state:
+                changes = dict(
+                    (field, [before[1].get(field), value])
+                    for field, value in state.items()
+                    if before[1].get(field) != value
+                )
+                events.append((kind, 'modify', key, obj.name, changes, before[0], obj))
+
+        if previous is not None:
+            for key, (obj, state) in previous.items():
+                if key not in objects:
+                    changes = dict((field, [value, None]) for field, value in state.items())
+                    events.append((kind, 'delete', key, obj.name, changes, obj, None))
+
+        self.current[kind] = current
+        return events
+
+    def poll(self):
+        '''
+        Poll once in the calling thread and publish changes.
+
+        :returns: events published by this poll
+        :rtype: list
+        '''
+
+        now = time.time()
+        raw = []
+        for kind in self.kinds:
+            try:
+                objects = self._fetch(kind)
+            except Exception:
+                self.errors += 1
+                continue
+            raw.extend(self._diff(kind, objects))
+        self.polls += 1
+
+        events = []
+        for kind, action, key, name, changes, old, new in raw:
+            self.sequence += 1
+            events.append(ChangeEvent(self.sequence, now, kind, action, key, name, changes, old, new))
+
+        if events:
+            if self.log is not None:
+                self.log.write(events)
+            self._publish(events)
+        return events
+
+    def _publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for event in events:
+            for callback, kinds in subscribers:
+                if kinds is not None and event.kind not in kinds:
+                    continue
+                try:
+                    callback(event)
+                except Exception:
+                    self.subscriber_errors += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        '''Start polling in a daemon thread.'''
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop polling after the current poll.'''
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
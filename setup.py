@@ -14,6 +14,7 @@ setup(
   extras_require = {
     ':python_version < "3.0"': [
         'ipaddress',
+        'futures',
     ],
     },
   classifiers = [],
@@ -0,0 +1,86 @@
+'''
+Scripted stand-ins for requests.Session used by the offline tests. Responses are real
+requests.Response objects over an in-memory body, so streamed and unstreamed reads go
+through the same code paths as live calls.
+'''
+
+from manageengineapi import NFApi
+import io
+import json
+import requests
+
+
+def make_response(body, status=200, url='http://nfa.invalid/api', history=()):
+    '''requests.Response with body readable once, like a live response.'''
+
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.raw = io.BytesIO(body)
+    response.encoding = 'utf-8'
+    response.history = list(history)
+    return response
+
+
+class BrokenBody(object):
+    '''Response raw body whose connection drops on first read.'''
+
+    closed = False
+
+    def read(self, *args, **kwargs):
+        raise requests.ConnectionError('Connection reset by peer')
+
+    def close(self):
+        self.closed = True
+
+
+class ScriptedSession(object):
+    '''
+    Hands out scripted responses in order. Script items are responses, bodies
+    (wrapped with make_response) or exceptions to raise.
+    '''
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.calls = []
+        self.sent = []
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.headers = {}
+
+    def _next(self, method, url, kwargs):
+        self.calls.append((method, url.split('?')[0].split('://', 1)[-1].split('/', 1)[-1]))
+        item = self.script.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        if not isinstance(item, requests.Response):
+            item = make_response(item, url=url)
+        self.sent.append(item)
+        return item
+
+    def get(self, url, **kwargs):
+        return self._next('get', url, kwargs)
+
+    def post(self, url, **kwargs):
+        return self._next('post', url, kwargs)
+
+
+def scripted_session(script=(), **kwargs):
+    '''
+    NFApi logged in against a ScriptedSession. login is replaced by a counter that
+    hands out a new NFA__SSO token, the real one needs a server.
+    '''
+
+    session = NFApi('nfa.invalid', 'test-api-key', 'test', 'test', **kwargs)
+    session.request = ScriptedSession(script)
+    session.logged_in = True
+    session.NFA_SSO = 'token-0'
+    session.logins = 0
+
+    def login():
+        session.logins += 1
+        session.NFA_SSO = 'token-{0}'.format(session.logins)
+        session.logged_in = True
+    session.login = login
+    return session
@@ -0,0 +1,93 @@
+from manageengineapi.anomaly import EWMADetector, SeasonalDetector, AnomalyMonitor, Anomaly
+import random
+import unittest
+
+
+def noisy(n, level=100.0, spread=5.0, seed=1):
+    rng = random.Random(seed)
+    return [level + rng.uniform(-spread, spread) for _ in range(n)]
+
+
+class TestEWMADetector(unittest.TestCase):
+
+    def test01_no_flags_during_warmup(self):
+        detector = EWMADetector(warmup=10)
+        for t, value in enumerate([1.0] * 9 + [1000.0]):
+            self.assertFalse(detector.update(t, value)[2])
+        self.assertIsNone(detector.last_score)
+
+    def test02_spike_flagged_and_clipped(self):
+        detector = EWMADetector()
+        for t, value in enumerate(noisy(100)):
+            self.assertFalse(detector.update(t, value)[2])
+        expected, score, anomalous = detector.update(100, 1000.0)
+        self.assertTrue(anomalous)
+        self.assertGreater(score, 4.0)
+        self.assertAlmostEqual(expected, 100.0, delta=3.0)
+
+        #Baseline wasn't dragged up to the spike
+        self.assertLess(detector._baseline.mean, 110.0)
+
+    def test03_level_shift_learned(self):
+        detector = EWMADetector()
+        for t, value in enumerate(noisy(100) + noisy(400, level=300.0, seed=2)):
+            _, _, anomalous = detector.update(t, value)
+        self.assertFalse(anomalous)
+        self.assertAlmostEqual(detector._baseline.mean, 300.0, delta=10.0)
+
+
+class TestSeasonalDetector(unittest.TestCase):
+
+    def test01_period_must_divide(self):
+        with self.assertRaises(ValueError):
+            SeasonalDetector(period=100, slot=30)
+
+    def test02_daily_pattern_is_normal(self):
+        detector = SeasonalDetector(period=4, slot=1, warmup=5)
+        flags = []
+        for day in range(30):
+            for hour, level in enumerate((10.0, 500.0, 10.0, 500.0)):
+                flags.append(detector.update(day * 4 + hour, level + day % 3)[2])
+        self.assertFalse(any(flags))
+
+        #Peak level in a trough slot is not
+        self.assertTrue(detector.update(30 * 4, 500.0)[2])
+
+
+class TestAnomalyMonitor(unittest.TestCase):
+
+    def test01_overlapping_polls_skipped(self):
+        found = []
+        monitor = AnomalyMonitor(on_anomaly=found.append)
+        points = [[i * 60000, v] for i, v in enumerate(noisy(50))]
+        monitor.add_series('1', points, unit=1000)
+        monitor.add_series('1', points + [[50 * 60000, 1000.0]], unit=1000)
+        self.assertEqual(monitor.detectors['1']._baseline.count, 51)
+        self.assertEqual(len(found), 1)
+        self.assertIsInstance(found[0], Anomaly)
+        self.assertEqual((found[0].key, found[0].timestamp, found[0].value), ('1', 3000.0, 1000.0))
+        self.assertEqual(list(monitor.recent), found)
+
+    def test02_scores_per_series(self):
+        monitor = AnomalyMonitor(detector=lambda: EWMADetector(warmup=3))
+        for t in range(3):
+            monitor.add('a', t, 1.0)
+        monitor.add('b', 0, 1.0)
+        scores = monitor.scores()
+        self.assertIsNone(scores['b'])
+        self.assertIsNone(scores['a'])
+        monitor.add('a', 3, 1.0)
+        self.assertEqual(monitor.scores()['a'], 0.0)
+
+    def test03_forget(self):
+        monitor = AnomalyMonitor()
+        monitor.add('a', 0, 1.0)
+        monitor.forget(['a', 'missing'])
+        self.assertEqual(monitor.scores(), {})
+        #Old timestamps accepted again for a recreated series
+        self.assertIsNone(monitor.add('a', 0, 1.0))
+        self.assertEqual(monitor.detectors['a']._baseline.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
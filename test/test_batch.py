@@ -0,0 +1,171 @@
+from manageengineapi import IPGroup, BillPlan
+from manageengineapi.batch import Batch, BatchError
+from manageengineapi.chunking import part_name
+import copy
+import threading
+import unittest
+
+
+class FakeNFA(object):
+    '''
+    In-memory IP groups and bill plans behind the NFApi add/modify/delete calls
+    Batch makes. Adds get fresh IDs and capture them like NFApi does, names in fail
+    are refused.
+    '''
+
+    def __init__(self, groups=(), plans=(), fail=()):
+        self.groups = dict((g.name, g) for g in groups)
+        self.plans = dict((str(p.plan_id), p) for p in plans)
+        self.fail = set(fail)
+        self.calls = []
+        self.next_id = 9000
+        self._lock = threading.Lock()
+
+    def _new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def _refused(self, action, obj):
+        self.calls.append((action, obj.name))
+        return (action, obj.name) in self.fail
+
+    def get_ip_groups(self):
+        return [copy.deepcopy(g) for g in self.groups.values()]
+
+    def get_bill_plans(self):
+        return [copy.deepcopy(p) for p in self.plans.values()]
+
+    def add_ip_group(self, group):
+        with self._lock:
+            if self._refused('add', group):
+                return {'error': {'code': 5000, 'message': 'refused'}}
+            group.ID = self._new_id()
+            self.groups[group.name] = copy.deepcopy(group)
+        return {'message': 'ok'}
+
+    def modify_ip_group(self, group, force=False):
+        with self._lock:
+            if self._refused('modify', group):
+                return {'error': {'code': 5000, 'message': 'refused'}}
+            self.groups[group.name] = copy.deepcopy(group)
+        return {'message': 'ok'}
+
+    def delete_ip_group(self, group):
+        with self._lock:
+            if self._refused('delete', group):
+                return 'Failed to delete'
+            del self.groups[group.name]
+        return 'Successfully deleted'
+
+    def add_bill_plan(self, plan):
+        with self._lock:
+            if self._refused('add', plan):
+                return {'error': {'code': 5000, 'message': 'refused'}}
+            plan.plan_id = self._new_id()
+            self.plans[str(plan.plan_id)] = copy.deepcopy(plan)
+        return {'message': 'ok'}
+
+    def modify_bill_plan(self, plan, force=False):
+        with self._lock:
+            if self._refused('modify', plan):
+                return {'error': {'code': 5000, 'message': 'refused'}}
+            self.plans[str(plan.plan_id)] = copy.deepcopy(plan)
+        return {'message': 'ok'}
+
+    def delete_bill_plan(self, plan):
+        with self._lock:
+            if self._refused('delete', plan):
+                return {'error': {'code': 5000, 'message': 'refused'}}
+            del self.plans[str(plan.plan_id)]
+        return {'message': 'ok'}
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.old = IPGroup(name='old', ID=1)
+        self.other = IPGroup(name='other', ID=2)
+        self.plan = BillPlan(name='plan', plan_id=10, ipg_id='1,2')
+        self.nfa = FakeNFA([self.old, self.other], [self.plan])
+
+    def migration(self, workers=1):
+        #Move plan from old onto a new group, then delete old
+        new = IPGroup(name='new')
+        batch = Batch(self.nfa, workers=workers)
+        batch.delete(self.old)
+        batch.add(new)
+        plan = copy.deepcopy(self.plan)
+        plan.link_groups([new, self.other])
+        batch.modify(plan)
+        return batch, new, plan
+
+    def test01_phase_order(self):
+        batch, new, plan = self.migration()
+        batch.modify(self.other)
+        phases = [[(o.action, o.obj.name) for o in phase] for phase in batch.phases()]
+        self.assertEqual(phases, [[('add', 'new'), ('modify', 'other')], [('modify', 'plan')], [('delete', 'old')]])
+
+    def test02_apply_relinks_added_groups(self):
+        batch, new, plan = self.migration(workers=4)
+        result = batch.apply()
+        self.assertTrue(result.ok)
+        self.assertEqual(len(result.applied), 3)
+        self.assertEqual(self.nfa.plans['10'].ipg_ids, [str(new.ID), '2'])
+        self.assertEqual(sorted(self.nfa.groups), ['new', 'other'])
+
+    def test03_missing_object_fails_before_changes(self):
+        batch = Batch(self.nfa)
+        batch.delete(IPGroup(name='ghost', ID=5))
+        result = batch.apply()
+        self.assertIsInstance(result.error, LookupError)
+        self.assertEqual(self.nfa.calls, [])
+
+    def test04_rollback_undoes_newest_first(self):
+        self.nfa.fail.add(('modify', 'plan'))
+        batch, new, plan = self.migration()
+        result = batch.apply()
+        self.assertIsInstance(result.error, BatchError)
+        self.assertEqual([o.obj.name for o in result.rolled_back], ['new'])
+        self.assertEqual(result.rollback_errors, [])
+        self.assertEqual(self.nfa.calls, [('add', 'new'), ('modify', 'plan'), ('delete', 'new')])
+        self.assertEqual(sorted(self.nfa.groups), ['old', 'other'])
+
+    def test05_rollback_relinks_readded_groups(self):
+        #Failure in the delete phase, after plan already moved off old
+        self.nfa.fail.add(('delete', 'other'))
+        batch, new, plan = self.migration()
+        batch.delete(self.other)
+        result = batch.apply()
+        self.assertFalse(result.ok)
+        self.assertEqual(result.rollback_errors, [])
+        self.assertEqual(self.nfa.calls[-3:], [('add', 'old'), ('modify', 'plan'), ('delete', 'new')])
+
+        readded = self.nfa.groups['old']
+        self.assertNotEqual(readded.ID, 1)
+        self.assertEqual(self.nfa.plans['10'].ipg_ids, [str(readded.ID), '2'])
+        self.assertEqual(sorted(self.nfa.groups), ['old', 'other'])
+
+    def test06_rollback_relinks_chunked_group_parts(self):
+        self.old.parts = [IPGroup(name=part_name('old', 2), ID=3)]
+        self.plan.ipg_id = '1,3,2'
+        self.nfa.fail.add(('delete', 'other'))
+        batch, new, plan = self.migration()
+        batch.delete(self.other)
+        batch.apply()
+
+        #Fake adds the group whole, so the old part ID goes away with the base ID
+        readded = self.nfa.groups['old']
+        self.assertEqual(readded.parts, [])
+        self.assertEqual(self.nfa.plans['10'].ipg_ids, [str(readded.ID), '2'])
+
+    def test07_failed_readd_reported(self):
+        self.nfa.fail.update([('delete', 'other'), ('add', 'old')])
+        batch, new, plan = self.migration()
+        batch.delete(self.other)
+        result = batch.apply()
+        self.assertEqual([o.obj.name for o, e in result.rollback_errors], ['old'])
+        self.assertIsInstance(result.rollback_errors[0][1], BatchError)
+
+
+if __name__ == '__main__':
+    unittest.main()
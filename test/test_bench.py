@@ -0,0 +1,124 @@
+from manageengineapi import NFApi, IPGroup, IPNetwork, bench
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def test01_ip_groups_parse(self):
+        session = bench.bench_session({NFApi.LISTIPGROUP_URI: bench.synthetic_ip_groups(3, entries=6)})
+        groups = session.get_ip_groups()
+        self.assertEqual([g.name for g in groups], ['bench-group-0', 'bench-group-1', 'bench-group-2'])
+        self.assertEqual([i.type for i in groups[0].ip][:3], ['IPNetwork', 'IPAddress', 'IPRange'])
+
+    def test02_plans_cover_groups(self):
+        plans = bench.synthetic_bill_plans(3, 7)['bpList']
+        ids = sorted(i for p in plans for _, i in p['ipgList'])
+        self.assertEqual(ids, [2500000 + g for g in range(7)])
+
+    def test03_devices(self):
+        devices = bench.synthetic_devices(2, interfaces=3)
+        self.assertEqual(len(devices[1]['interface']), 3)
+
+
+class TestRun(unittest.TestCase):
+
+    def setUp(self):
+        self.bodies = {
+            NFApi.LISTIPGROUP_URI: bench.synthetic_ip_groups(20),
+            NFApi.LISTBILLPLAN_URI: bench.synthetic_bill_plans(4, 20),
+            NFApi.LISTDEVLIST_URI: bench.synthetic_devices(2),
+        }
+
+    def test01_time_mode(self):
+        report = bench.run(self.bodies, repeat=2, only=['get_ip_groups', 'process_api_group_list'])
+        self.assertEqual(sorted(report['results']), ['get_ip_groups', 'process_api_group_list'])
+        result = report['results']['get_ip_groups']
+        self.assertEqual(result['calls'], 2)
+        self.assertLessEqual(result['min'], result['max'])
+        self.assertIn('per_group', result)
+
+    def test02_cprofile_mode(self):
+        report = bench.run(self.bodies, mode='cprofile', repeat=1, only=['get_bill_plans'])
+        self.assertTrue(report['results']['get_bill_plans']['top'])
+
+    def test03_tracemalloc_mode(self):
+        if bench.tracemalloc is None:
+            self.skipTest('tracemalloc needs Python 3.4+')
+        report = bench.run(self.bodies, mode='tracemalloc', repeat=1, only=['get_ip_groups'])
+        self.assertIn('bytes_per_group', report['results']['get_ip_groups'])
+
+    def test04_all_cases(self):
+        report = bench.run(self.bodies, repeat=1)
+        self.assertEqual(sorted(report['results']), sorted(
+            name for name, _, _ in bench._cases(bench.bench_session(self.bodies), self.bodies)))
+
+
+class TestBenchSession(unittest.TestCase):
+
+    def setUp(self):
+        self.session = bench.bench_session({
+            NFApi.LISTIPGROUP_URI: bench.synthetic_ip_groups(5),
+            NFApi.LISTBILLPLAN_URI: bench.synthetic_bill_plans(2, 5),
+        })
+
+    def test01_streamed_list(self):
+        self.assertEqual(len(list(self.session.iter_ip_groups())), 5)
+
+    def test02_add_captures_id(self):
+        group = IPGroup(name='bench-group-3', speed=1000)
+        group.add_ip(IPNetwork(u'10.9.0.0/24'))
+        self.session.add_ip_group(group)
+        self.assertEqual(group.ID, 2500003)
+        self.assertIs(self.session.get_ip_group(2500003), group)
+
+    def test03_lookup_by_name_or_id(self):
+        group = self.session.get_ip_group('bench-group-2')
+        self.assertEqual(group.ID, 2500002)
+        self.assertIs(self.session.get_ip_group('2500002'), group)
+        self.assertIsNot(self.session.get_ip_group('bench-group-2', refresh=True), group)
+        self.assertIsNone(self.session.get_ip_group('missing'))
+
+        plan = self.session.get_bill_plan(1001)
+        self.assertEqual(plan.name, 'bench-plan-1')
+        self.assertIs(self.session.get_bill_plan('bench-plan-1'), plan)
+
+
+class TestRecorded(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test01_load_recorded(self):
+        with open(os.path.join(self.directory, 'listIPGroup.json'), 'w') as f:
+            json.dump(bench.synthetic_ip_groups(1), f)
+        bodies = bench.load_recorded(self.directory)
+        self.assertEqual(list(bodies), [NFApi.LISTIPGROUP_URI])
+        self.assertEqual(json.loads(bodies[NFApi.LISTIPGROUP_URI].decode('utf-8')), bench.synthetic_ip_groups(1))
+
+    def test02_main_writes_report(self):
+        output = os.path.join(self.directory, 'report.json')
+        bench.main(['--groups', '5', '--plans', '2', '--devices', '1', '--repeat', '1',
+                    '--only', 'get_dev_list', '--output', output])
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(list(report['results']), ['get_dev_list'])
+        self.assertEqual(report['mode'], 'time')
+
+    def test03_main_all_cases(self):
+        output = os.path.join(self.directory, 'report.json')
+        bench.main(['--groups', '5', '--plans', '2', '--devices', '1', '--repeat', '1', '--output', output])
+        with open(output) as f:
+            report = json.load(f)
+        self.assertIn('add_ip_group', report['results'])
+        self.assertIn('add_bill_plan', report['results'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+from manageengineapi import NFApi, IPGroup, BillPlan, BillingIndex
+from manageengineapi.bench import bench_session, synthetic_ip_groups, synthetic_bill_plans
+import unittest
+
+
+def api_group(name, ID, dev_ids='2001,2002'):
+    return {
+        'app': 'All',
+        'dscp': 'All',
+        'base': {'Name': name, 'desc': 'd', 'speed': 1000, 'status': 'Enabled', 'ID': ID},
+        'Asso_Device': 'r1:Gi0/1,r1:Gi0/2',
+        'Asso_Dev_id': dev_ids,
+        'ip': [['IPNetwork', 'Include', '10.0.0.0', '255.255.255.0']],
+    }
+
+
+def api_plan(planid, *group_ids):
+    return {
+        'name': 'plan-{0}'.format(planid), 'desc': '', 'coustunit': 'USD', 'period': 'monthly',
+        'billDate': 1, 'tzone': 'US/Eastern', 'basespd1': 1, 'basecost1': 1, 'addspd1': 1,
+        'addcost1': 1, 'type': 'speed', 'perc': 40, 'bussList': '', 'emailid': '',
+        'emailSubject': '', 'planid': planid,
+        'ipgList': [['g{0}'.format(i), i] for i in group_ids],
+    }
+
+
+class TestIPGroupFromApi(unittest.TestCase):
+
+    def test01_interface_binding_parsed(self):
+        group = IPGroup.from_api(api_group('g', 1))
+        self.assertEqual(group.asso_dev_id, '2001,2002')
+        self.assertEqual(group.asso_device, 'r1:Gi0/1,r1:Gi0/2')
+
+    def test02_round_trip_keeps_binding(self):
+        group = IPGroup.from_api(api_group('g', 1))
+        group.description = 'changed'
+        payload = group.api_payload()
+        self.assertEqual(payload['DevList'], '2001,2002')
+        self.assertEqual(payload['GroupName'], 'g')
+        self.assertEqual(payload['IPData'], '10.0.0.0,255.255.255.0')
+
+    def test03_list_call_keeps_binding(self):
+        session = bench_session({NFApi.LISTIPGROUP_URI: {'IPGroup_List': [api_group('g', 1)]}})
+        self.assertEqual(session.get_ip_groups()[0].api_payload()['DevList'], '2001,2002')
+
+
+class TestBillingIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.groups = [IPGroup.from_api(api_group('g{0}'.format(i), i)) for i in (1, 2, 3)]
+        self.index = BillingIndex.build([api_plan(10, 1, 2), api_plan(11, 2, 99)], self.groups)
+
+    def test01_plans_resolve_shared_groups(self):
+        p10, p11 = self.index.bill_plans
+        self.assertEqual([g.name for g in p10.ip_groups], ['g1', 'g2'])
+        self.assertIs(p10.ip_groups[1], p11.ip_groups[0])
+
+    def test02_deleted_groups_skipped(self):
+        self.assertEqual([g.name for g in self.index.bill_plans[1].ip_groups], ['g2'])
+
+    def test03_reverse_index(self):
+        self.assertEqual([p.plan_id for p in self.index.plans_for(self.groups[1])], [10, 11])
+        self.assertEqual([p.plan_id for p in self.index.plans_for('1')], [10])
+        self.assertEqual(self.index.groups_for(self.index.bill_plans[0]), self.groups[:2])
+
+    def test04_unbilled(self):
+        self.assertEqual(self.index.unbilled_groups(), [self.groups[2]])
+
+    def test05_link_groups(self):
+        plan = BillPlan(name='p')
+        plan.link_groups(self.groups[:2])
+        self.assertEqual(plan.ipg_id, '1,2')
+        self.assertEqual(plan.ipg_ids, ['1', '2'])
+
+    def test06_from_session(self):
+        session = bench_session({
+            NFApi.LISTIPGROUP_URI: synthetic_ip_groups(6),
+            NFApi.LISTBILLPLAN_URI: synthetic_bill_plans(2, 6),
+        })
+        index = session.get_billing_index()
+        self.assertEqual(sum(len(p.ip_groups) for p in index.bill_plans), 6)
+        self.assertEqual(index.unbilled_groups(), [])
+
+    def test07_get_bill_plans_resolves_registered_groups(self):
+        session = bench_session({
+            NFApi.LISTIPGROUP_URI: synthetic_ip_groups(6),
+            NFApi.LISTBILLPLAN_URI: synthetic_bill_plans(2, 6),
+        })
+        self.assertEqual([p.ip_groups for p in session.get_bill_plans()], [[], []])
+
+        groups = session.get_ip_groups()
+        plans = session.get_bill_plans()
+        self.assertEqual(sum(len(p.ip_groups) for p in plans), 6)
+        self.assertTrue(all(any(g is group for group in groups) for p in plans for g in p.ip_groups))
+
+
+if __name__ == '__main__':
+    unittest.main()
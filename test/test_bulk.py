@@ -0,0 +1,125 @@
+from manageengineapi import Device, DeviceRegistry, IPGroup
+from manageengineapi.bulk import BulkImporter, Checkpoint, RowError, read_rows, parse_ip
+import shutil
+import os
+import tempfile
+import threading
+import unittest
+
+GROUPS_CSV = '''group,description,speed,ip,status,interfaces
+web,Web servers,1000,10.0.0.0/24,include,r1:Gi0/1
+web,,,10.0.1.1-10.0.1.9,exclude,
+db,Databases,abc,10.1.0.0/24,include,
+mail,,,,,all
+'''
+
+
+class ImportSession(object):
+    '''Records adds, fails the ones named in fail.'''
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.added = []
+        self.groups = []
+        self._lock = threading.Lock()
+
+    def add_ip_group(self, group, capture_id=True):
+        with self._lock:
+            if group.name in self.fail:
+                return {'error': {'code': 5000, 'message': 'refused'}}
+            self.added.append(group.name)
+            self.groups.append(IPGroup(name=group.name, ID=len(self.groups) + 1))
+        return {'message': 'ok'}
+
+    def add_bill_plan(self, plan, capture_id=True):
+        with self._lock:
+            self.added.append(plan.name)
+        return {'message': 'ok'}
+
+    def get_ip_groups(self):
+        return list(self.groups)
+
+
+class TestBulkImport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.registry = DeviceRegistry([Device(name='r1', IP='192.0.2.1', interfaces=[['11', 'Gi0/1']])])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def importer(self, session, **kwargs):
+        return BulkImporter(session, registry=self.registry, **kwargs)
+
+    def test01_read_rows_csv_and_yaml(self):
+        rows = list(read_rows(self.write('g.csv', GROUPS_CSV)))
+        self.assertEqual(rows[0][0], 2)
+        self.assertEqual(rows[0][1]['group'], 'web')
+        yaml_rows = list(read_rows(self.write('g.yaml', 'rows:\n- group: a\n  speed: 10\n- group: b\n')))
+        self.assertEqual(yaml_rows, [(1, {'group': 'a', 'speed': '10'}), (2, {'group': 'b'})])
+
+    def test02_parse_ip(self):
+        span = parse_ip('10.0.0.1 to 10.0.0.9', 'exclude')
+        self.assertEqual((span.type, span.status), ('IPRange', 'exclude'))
+        self.assertEqual(parse_ip('10.0.0.0/24').type, 'IPNetwork')
+
+    def test03_groups_merged_and_invalid_rows_reported(self):
+        importer = self.importer(ImportSession())
+        groups = importer.load_ip_groups(read_rows(self.write('g.csv', GROUPS_CSV)))
+        self.assertEqual(list(groups), ['web'])
+        web = groups['web']
+        self.assertEqual((web.speed, web.asso_dev_id, len(web.ip)), (1000, '11', 2))
+        errors = importer.report.errors
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(isinstance(e, RowError) for e in errors))
+        self.assertEqual(errors[0].line, 4)
+
+    def test04_unknown_interface(self):
+        importer = self.importer(ImportSession())
+        with self.assertRaises(ValueError):
+            importer.resolve_interfaces('r9:Gi0/1')
+        self.assertEqual(importer.resolve_interfaces('ALL'), -1)
+
+    def test05_plans_linked_to_pushed_groups(self):
+        session = ImportSession()
+        importer = self.importer(session, workers=1)
+        groups = importer.load_ip_groups(read_rows(self.write('g.csv', GROUPS_CSV)))
+        plans = importer.load_bill_plans(read_rows(self.write('p.csv',
+            'plan,base_speed,base_cost,add_speed,add_cost,groups\n'
+            'gold,100,10,10,1,web\n'
+            'lost,100,10,10,1,nope\n')))
+        report = importer.push(groups, plans)
+        self.assertEqual(session.added, ['web', 'gold'])
+        self.assertEqual(plans['gold'][0].ipg_id, '1')
+        self.assertIn('lost', report.failed)
+
+    def test06_checkpoint_resume(self):
+        path = os.path.join(self.tmp, 'import.checkpoint')
+        groups_csv = self.write('g.csv', 'group,ip\n' + ''.join(
+            'g{0},10.{0}.0.0/24\n'.format(i) for i in range(10)))
+
+        first = ImportSession(fail=['g3', 'g7'])
+        report = self.importer(first, checkpoint=path, workers=3).import_files(groups_csv)
+        self.assertEqual(sorted(report.failed), ['g3', 'g7'])
+
+        #Torn last line from a crash is ignored
+        with open(path, 'a') as f:
+            f.write('{"kind": "ipgroup", "na')
+        self.assertEqual(len(Checkpoint(path).done), 8)
+
+        second = ImportSession()
+        report = self.importer(second, checkpoint=path, workers=3).import_files(groups_csv)
+        self.assertEqual(sorted(second.added), ['g3', 'g7'])
+        self.assertEqual(len(report.skipped), 8)
+        self.assertEqual(len(Checkpoint(path).done), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+from manageengineapi import NFApi
+from manageengineapi.cache import ParseCache
+from manageengineapi.bench import bench_session, synthetic_ip_groups, synthetic_bill_plans
+import json
+import unittest
+
+
+class Item(object):
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.is_dirty = False
+
+
+def body(values):
+    return json.dumps({'items': [{'v': v} for v in values]}).encode('utf-8')
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ParseCache()
+
+    def parse(self, values):
+        return self.cache.parse('items', body(values), lambda b: b['items'], Item)
+
+    def test01_unchanged_body_reused(self):
+        first = self.parse([1, 2, 3])
+        second = self.parse([1, 2, 3])
+        self.assertEqual([a is b for a, b in zip(first, second)], [True] * 3)
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 3))
+
+    def test02_only_changed_entries_rebuilt(self):
+        first = self.parse([1, 2, 3])
+        second = self.parse([3, 2, 4])
+        self.assertIs(second[0], first[2])
+        self.assertIs(second[1], first[1])
+        self.assertEqual(second[2].entry, {'v': 4})
+        self.assertEqual(self.cache.misses, 4)
+
+    def test03_dirty_objects_rebuilt(self):
+        first = self.parse([1, 2])
+        first[0].is_dirty = True
+        second = self.parse([1, 2])
+        self.assertIsNot(second[0], first[0])
+        self.assertIs(second[1], first[1])
+
+    def test04_build_many_gets_only_missing(self):
+        self.parse([1, 2])
+        batches = []
+
+        def build_many(entries):
+            batches.append(entries)
+            return [Item(e) for e in entries]
+
+        self.cache.parse('items', body([1, 5, 2, 6]), lambda b: b['items'], Item, build_many)
+        self.assertEqual(batches, [[{'v': 5}, {'v': 6}]])
+
+    def test05_clear(self):
+        first = self.parse([1])
+        self.cache.clear()
+        self.assertIsNot(self.parse([1])[0], first[0])
+
+
+class TestSessionCache(unittest.TestCase):
+
+    def test01_groups_and_plans_reused(self):
+        session = bench_session({
+            NFApi.LISTIPGROUP_URI: synthetic_ip_groups(4),
+            NFApi.LISTBILLPLAN_URI: synthetic_bill_plans(2, 4),
+        }, cache_parsed=True)
+        groups = session.get_ip_groups()
+        plans = session.get_bill_plans()
+        self.assertEqual([a is b for a, b in zip(groups, session.get_ip_groups())], [True] * 4)
+        self.assertIs(session.get_bill_plans()[1], plans[1])
+
+        #Locally edited group comes back as server copy
+        groups[0].speed = 1
+        again = session.get_ip_groups()
+        self.assertIsNot(again[0], groups[0])
+        self.assertEqual(again[0].speed, 10000000)
+
+    def test02_no_cache_builds_fresh(self):
+        session = bench_session({NFApi.LISTIPGROUP_URI: synthetic_ip_groups(2)})
+        self.assertIsNone(session.parse_cache)
+        self.assertIsNot(session.get_ip_groups()[0], session.get_ip_groups()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
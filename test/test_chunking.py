@@ -0,0 +1,170 @@
+from manageengineapi import NFApi, IPGroup, IPNetwork, BillPlan
+from manageengineapi.chunking import GroupChunker, part_name, payload_size
+from fakes import scripted_session
+import unittest
+
+OK = {'message': 'ok'}
+DELETED = b'Successfully deleted'
+NOT_DELETED = b'Failed to delete'
+REFUSED = {'error': {'code': 5000, 'message': 'refused'}}
+
+ADD = NFApi.ADDIPGROUP_URI[1:]
+MODIFY = NFApi.MODIFYIPGROUP_URI[1:]
+DELETE = NFApi.DELETEIPGROUP_URI[1:]
+LIST = NFApi.LISTIPGROUP_URI[1:]
+MODIFY_PLAN = NFApi.MODIFYBILLPLAN_URI[1:]
+
+
+def big_group(networks=30):
+    group = IPGroup(name='big', speed=1000, description='d')
+    for i in range(networks):
+        group.add_ip(IPNetwork(u'10.{0}.0.0/16'.format(i)))
+    return group
+
+
+def listed(*names):
+    return {'IPGroup_List': [
+        {'app': 'All', 'dscp': 'All', 'Asso_Device': 'All Interfaces', 'Asso_Dev_id': -1, 'ip': [],
+         'base': {'Name': name, 'desc': 'd', 'speed': 1000, 'status': 'Enabled', 'ID': 100 + i}}
+        for i, name in enumerate(names)
+    ]}
+
+
+class TestGroupChunker(unittest.TestCase):
+
+    def test01_split_under_limit(self):
+        chunker = GroupChunker(600)
+        groups = chunker.split(big_group())
+        self.assertEqual([g.name for g in groups], ['big', part_name('big', 2), part_name('big', 3)])
+        self.assertTrue(all(payload_size(g.api_payload()) <= 600 for g in groups))
+        self.assertEqual(sum(len(g.ip) for g in groups), 30)
+
+    def test02_merge_folds_parts_back(self):
+        chunker = GroupChunker(600)
+        merged = chunker.merge(list(reversed(chunker.split(big_group()))))
+        self.assertEqual(len(merged), 1)
+        self.assertEqual([i.api_format for i in merged[0].ip], [i.api_format for i in big_group().ip])
+        self.assertEqual(len(merged[0].parts), 2)
+
+    def test03_user_names_like_parts_left_alone(self):
+        groups = [IPGroup(name='x', ID=1), IPGroup(name='x__part2', ID=2), IPGroup(name=part_name('y', 2), ID=3)]
+        self.assertEqual([g.name for g in GroupChunker().merge(groups)], ['x', 'x__part2', part_name('y', 2)])
+
+    def test04_part_names_reserved(self):
+        session = scripted_session(max_payload=600)
+        with self.assertRaises(ValueError):
+            session.add_ip_group(IPGroup(name=part_name('x', 2)))
+        self.assertEqual(session.request.calls, [])
+
+
+class TestChunkedPush(unittest.TestCase):
+
+    def test01_add_captures_base_and_part_ids(self):
+        session = scripted_session([OK, OK, OK, listed('big', part_name('big', 2), part_name('big', 3))],
+                                   max_payload=600)
+        group = big_group()
+        self.assertEqual(session.add_ip_group(group), OK)
+        self.assertEqual(session.request.calls, [('post', ADD)] * 3 + [('get', LIST)])
+        self.assertEqual((group.ID, [p.ID for p in group.parts]), (100, [101, 102]))
+        self.assertIs(session.get_ip_group('big'), group)
+
+    def test02_failed_part_add_keeps_created_parts(self):
+        session = scripted_session([OK, OK, REFUSED], max_payload=600)
+        group = big_group()
+        self.assertEqual(session.add_ip_group(group), REFUSED)
+        self.assertEqual([p.name for p in group.parts], [part_name('big', 2)])
+        self.assertIsNone(session.registry.ip_groups.get('big'))
+
+        #Cleanup reaches the part created before the failure
+        session.request.script = [DELETED, DELETED]
+        session.request.calls = []
+        self.assertEqual(session.delete_ip_group(group), DELETED.decode('utf-8'))
+        self.assertEqual(session.request.calls, [('post', DELETE)] * 2)
+
+    def test03_failed_part_modify_keeps_old_parts(self):
+        session = scripted_session([OK, OK, REFUSED], max_payload=500)
+        group = big_group()
+        group.parts = [IPGroup(name=part_name('big', i), ID=i) for i in (2, 3, 4)]
+        self.assertEqual(session.modify_ip_group(group, force=True), REFUSED)
+        self.assertEqual([p.ID for p in group.parts], [2, 3, 4])
+
+    def test04_shrink_deletes_stale_parts(self):
+        session = scripted_session([OK, OK, DELETED, DELETED], max_payload=800)
+        group = big_group()
+        group.parts = [IPGroup(name=part_name('big', i), ID=i) for i in (2, 3, 4)]
+        self.assertEqual(session.modify_ip_group(group, force=True), OK)
+        self.assertEqual(session.request.calls, [('post', MODIFY)] * 2 + [('post', DELETE)] * 2)
+        self.assertEqual([p.ID for p in group.parts], [2])
+        self.assertIs(session.registry.ip_groups.get('big'), group)
+
+    def test05_failed_stale_delete_reported(self):
+        session = scripted_session([OK, OK, DELETED, NOT_DELETED], max_payload=800)
+        group = big_group()
+        group.parts = [IPGroup(name=part_name('big', i), ID=i) for i in (2, 3, 4)]
+        response = session.modify_ip_group(group, force=True)
+        self.assertIn('error', response)
+        self.assertIn(part_name('big', 4), response['error']['message'])
+        self.assertEqual([p.ID for p in group.parts], [2, 4])
+        self.assertTrue(group.is_dirty)
+
+    def grow_billed(self, plan_response):
+        session = scripted_session([OK, OK, OK, listed('big', part_name('big', 2), part_name('big', 3)),
+                                    plan_response], max_payload=600)
+        plan = BillPlan(name='plan', plan_id=7, ipg_id='1,2,55')
+        plan.mark_clean()
+        session.registry.bill_plans.put(plan)
+        group = big_group()
+        group.ID = 1
+        group.parts = [IPGroup(name=part_name('big', 2), ID=2)]
+        return session, plan, session.modify_ip_group(group, force=True)
+
+    def test06_grow_relinks_billed_plans(self):
+        session, plan, response = self.grow_billed(OK)
+        self.assertEqual(response, OK)
+        self.assertEqual(session.request.calls,
+                         [('post', MODIFY)] * 2 + [('post', ADD), ('get', LIST), ('post', MODIFY_PLAN)])
+        self.assertEqual(plan.ipg_ids, ['1', '2', '102', '55'])
+        self.assertFalse(plan.is_dirty)
+
+    def test07_failed_relink_reported(self):
+        session, plan, response = self.grow_billed(REFUSED)
+        self.assertEqual(response, REFUSED)
+        self.assertTrue(plan.is_dirty)
+        self.assertEqual(session.registry.ip_groups.get('big').ID, 1)
+
+
+class TestChunkedDelete(unittest.TestCase):
+
+    def setUp(self):
+        self.group = big_group()
+        self.group.ID = 1
+        self.group.parts = [IPGroup(name=part_name('big', i), ID=i) for i in (2, 3)]
+
+    def session(self, script):
+        session = scripted_session(script, max_payload=600)
+        session.registry.ip_groups.put(self.group)
+        return session
+
+    def test01_deletes_base_and_parts(self):
+        session = self.session([DELETED] * 3)
+        session.delete_ip_group(self.group)
+        self.assertEqual(len(session.request.calls), 3)
+        self.assertIsNone(session.registry.ip_groups.get('big'))
+        self.assertEqual(self.group.parts, [])
+
+    def test02_failed_base_delete_keeps_everything(self):
+        session = self.session([NOT_DELETED])
+        self.assertEqual(session.delete_ip_group(self.group), NOT_DELETED.decode('utf-8'))
+        self.assertEqual(len(session.request.calls), 1)
+        self.assertIs(session.registry.ip_groups.get('big'), self.group)
+        self.assertEqual(len(self.group.parts), 2)
+
+    def test03_failed_part_delete_kept(self):
+        session = self.session([DELETED, NOT_DELETED, DELETED])
+        self.assertEqual(session.delete_ip_group(self.group), NOT_DELETED.decode('utf-8'))
+        self.assertEqual([p.name for p in self.group.parts], [part_name('big', 2)])
+        self.assertIs(session.registry.ip_groups.get('big'), self.group)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+from manageengineapi import NFApi, Device, DeviceRegistry
+from manageengineapi.bench import bench_session
+import unittest
+
+
+def device(name, ip, *interfaces):
+    return Device(name=name, IP=ip, interfaces=[list(i) for i in interfaces])
+
+
+class TestDeviceRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.r1 = device('r1', '192.0.2.1', ('11', 'Gi0/1'), ('12', 'Gi0/2'))
+        self.r2 = device('r2', '192.0.2.2', (21, 'Gi0/1'), ('22', 'Te1/1'))
+        self.registry = DeviceRegistry([self.r1, self.r2])
+
+    def test01_device_by_ip_and_name(self):
+        self.assertIs(self.registry.device('192.0.2.1'), self.r1)
+        self.assertIs(self.registry.device('r2'), self.r2)
+        self.assertIsNone(self.registry.device('r3'))
+        self.assertEqual(len(self.registry), 2)
+
+    def test02_interface_ids_keyed_as_str(self):
+        self.assertEqual(self.registry.interface(21), (self.r2, 'Gi0/1'))
+        self.assertEqual(self.registry.interface('11'), (self.r1, 'Gi0/1'))
+        self.assertIsNone(self.registry.interface('99'))
+
+    def test03_interface_ids_by_name(self):
+        self.assertEqual(sorted(self.registry.interface_ids('Gi0/1')), ['11', '21'])
+        self.assertEqual(self.registry.interface_ids('Gi0/1', device='r2'), ['21'])
+
+    def test04_prefix_search(self):
+        found = [(name, dev.name, intf) for name, dev, intf in self.registry.search('Gi')]
+        self.assertEqual(sorted(found), [('Gi0/1', 'r1', '11'), ('Gi0/1', 'r2', '21'), ('Gi0/2', 'r1', '12')])
+        self.assertEqual(self.registry.search('Xe'), [])
+
+    def test05_update_touches_only_changes(self):
+        r1 = device('r1', '192.0.2.1', ('11', 'Gi0/1'), ('12', 'Gi0/2'))
+        r2 = device('r2', '192.0.2.2', ('22', 'Te1/1'))
+        changed, removed = self.registry.update([r1, r2])
+        self.assertEqual((changed, removed), (['192.0.2.2'], []))
+
+        #Unchanged device keeps the indexed object, changed one is replaced
+        self.assertIs(self.registry.device('r1'), self.r1)
+        self.assertIsNone(self.registry.interface('21'))
+        self.assertEqual(self.registry.interface_ids('Gi0/1'), ['11'])
+        self.assertEqual([n for n, d, i in self.registry.search('Te')], ['Te1/1'])
+
+    def test06_prune_removes_missing(self):
+        changed, removed = self.registry.update([self.r1], prune=True)
+        self.assertEqual((changed, removed), ([], ['192.0.2.2']))
+        self.assertIsNone(self.registry.device('r2'))
+        self.assertIsNone(self.registry.interface('22'))
+
+    def test07_from_session(self):
+        session = bench_session({NFApi.LISTDEVLIST_URI: [
+            {'rName': 'r9', 'rIP': '192.0.2.9', 'interface': [['91', 'Gi0/1']]},
+        ]})
+        registry = DeviceRegistry.from_session(session)
+        self.assertEqual(registry.interface('91')[0].name, 'r9')
+
+
+if __name__ == '__main__':
+    unittest.main()
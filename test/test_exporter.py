@@ -0,0 +1,121 @@
+from manageengineapi import IPGroup
+from manageengineapi.exceptions import NFApiError
+from manageengineapi.anomaly import AnomalyMonitor
+from manageengineapi.exporter import TrafficCollector, MetricsExporter, latest_value
+import unittest
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+
+class TrafficSession(object):
+    '''Answers get_ip_groups and get_group_traffic_data from dicts.'''
+
+    def __init__(self, groups, traffic):
+        self.groups = groups
+        self.traffic = traffic
+
+    def get_ip_groups(self):
+        return list(self.groups)
+
+    def get_group_traffic_data(self, ID, payload):
+        traffic = self.traffic[ID]
+        if isinstance(traffic, Exception):
+            raise traffic
+        return traffic
+
+
+def series(*values):
+    return {'Data': [[1500000000000 + i * 60000, v] for i, v in enumerate(values)]}
+
+
+class TestTrafficCollector(unittest.TestCase):
+
+    def setUp(self):
+        self.groups = [IPGroup(name='a', ID=1), IPGroup(name='b', ID=2)]
+        self.session = TrafficSession(self.groups, {1: series(1, 2, 3), 2: series(5)})
+
+    def test01_latest_value(self):
+        self.assertEqual(latest_value(series(1, 2, 3)), 3.0)
+        self.assertEqual(latest_value([{'time': 1, 'value': '7'}]), 7.0)
+        self.assertIsNone(latest_value({'data': []}))
+        with self.assertRaises(NFApiError):
+            latest_value({})
+
+    def test02_collect_and_render(self):
+        collector = TrafficCollector(self.session, workers=2)
+        collector.collect_once()
+        self.assertEqual(sorted(collector.values), ['1', '2'])
+        text = collector.render()
+        self.assertIn('nfa_ipgroup_traffic{id="1",group="a",type="speed"} 3.0', text)
+        self.assertIn('nfa_ipgroup_traffic{id="2",group="b",type="speed"} 5.0', text)
+        self.assertIn('nfa_collector_cycles_total 1', text)
+
+    def test03_failed_group_counted(self):
+        self.session.traffic[2] = ValueError('boom')
+        collector = TrafficCollector(self.session, workers=1)
+        collector.collect_once()
+        self.assertEqual(sorted(collector.values), ['1'])
+        self.assertEqual(collector.errors, 1)
+
+    def test04_deleted_group_pruned(self):
+        monitor = AnomalyMonitor()
+        collector = TrafficCollector(self.session, workers=1, monitor=monitor)
+        collector.collect_once()
+        self.assertIn('2', monitor.detectors)
+
+        self.session.groups = self.groups[:1]
+        collector.collect_once()
+        self.assertEqual(sorted(collector.values), ['1'])
+        self.assertNotIn('id="2"', collector.render())
+        self.assertNotIn('2', monitor.detectors)
+
+    def test05_failed_group_keeps_last_value(self):
+        collector = TrafficCollector(self.session, workers=1)
+        collector.collect_once()
+        self.session.traffic[2] = ValueError('boom')
+        collector.collect_once()
+        self.assertEqual(collector.values['2'][1], 5.0)
+
+    def test06_failed_list_keeps_values(self):
+        collector = TrafficCollector(self.session, workers=1)
+        collector.collect_once()
+
+        def broken():
+            raise ValueError('boom')
+        self.session.get_ip_groups = broken
+        collector.collect_once()
+        self.assertEqual(sorted(collector.values), ['1', '2'])
+        self.assertEqual(collector.errors, 1)
+
+    def test07_non_finite_values(self):
+        self.groups.append(IPGroup(name='c', ID=3))
+        self.session.traffic.update({1: series('nan'), 2: series('inf'), 3: series('-inf')})
+        collector = TrafficCollector(self.session, workers=1)
+        collector.collect_once()
+        text = collector.render()
+        self.assertIn('nfa_ipgroup_traffic{id="1",group="a",type="speed"} NaN', text)
+        self.assertIn('nfa_ipgroup_traffic{id="2",group="b",type="speed"} +Inf', text)
+        self.assertIn('nfa_ipgroup_traffic{id="3",group="c",type="speed"} -Inf', text)
+
+
+class TestMetricsExporter(unittest.TestCase):
+
+    def test01_serves_metrics(self):
+        session = TrafficSession([IPGroup(name='a', ID=1)], {1: series(4)})
+        collector = TrafficCollector(session, interval=3600, workers=1)
+        exporter = MetricsExporter(collector, '127.0.0.1', 0)
+        exporter.start()
+        try:
+            collector.collect_once()
+            port = exporter.server.server_address[1]
+            body = urlopen('http://127.0.0.1:{0}/metrics'.format(port)).read().decode('utf-8')
+        finally:
+            exporter.stop()
+        self.assertIn('nfa_ipgroup_traffic{id="1",group="a",type="speed"} 4.0', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+from manageengineapi.flowgraph import FlowGraph, parse_quantity
+from ipaddress import ip_address, ip_network
+import random
+import unittest
+
+APPS = ('http', 'dns', 'ssh', None)
+
+
+def random_flows(n, seed=7):
+    rng = random.Random(seed)
+    hosts = ['10.0.{0}.{1}'.format(rng.randint(0, 3), rng.randint(1, 20)) for _ in range(30)] + \
+            ['192.0.2.{0}'.format(i) for i in range(1, 6)] + ['2001:db8::{0:x}'.format(i) for i in range(1, 6)]
+    return [(rng.choice(hosts), rng.choice(hosts), float(rng.randint(1, 10000)), rng.choice(APPS))
+            for _ in range(n)]
+
+
+def in_subnet(address, subnet):
+    return ip_address(address) in ip_network(subnet)
+
+
+class TestFlowGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.flows = random_flows(2000)
+        self.graph = FlowGraph()
+        for src, dst, nbytes, app in self.flows:
+            self.graph.add(src, dst, nbytes, app)
+
+    def brute_edges(self, app=None, src=None, dst=None):
+        edges = {}
+        for s, d, nbytes, a in self.flows:
+            if app is not None and a != app:
+                continue
+            if src is not None and not in_subnet(s, src):
+                continue
+            if dst is not None and not in_subnet(d, dst):
+                continue
+            total, count = edges.get((s, d, a), (0.0, 0))
+            edges[(s, d, a)] = (total + nbytes, count + 1)
+        return edges
+
+    def test01_parse_quantity(self):
+        self.assertEqual(parse_quantity('1.5 MB'), 1.5e6)
+        self.assertEqual(parse_quantity('1,024'), 1024.0)
+        self.assertEqual(parse_quantity('2 KiB'), 2000.0)
+        self.assertEqual(parse_quantity(7), 7.0)
+        with self.assertRaises(ValueError):
+            parse_quantity('lots')
+
+    def test02_edges_aggregated(self):
+        expected = self.brute_edges()
+        self.assertEqual(len(self.graph), len(expected))
+        self.assertEqual(self.graph.records, 2000)
+        for src, dst, app, nbytes, count in self.graph.top_edges(n=len(expected)):
+            self.assertEqual(expected[(src, dst, app)], (nbytes, count))
+
+    def test03_top_edges_filtered(self):
+        for app, src, dst in (('http', None, None), (None, '10.0.1.0/24', None),
+                              ('dns', '10.0.0.0/16', '192.0.2.0/29'), (None, '2001:db8::/32', None)):
+            expected = sorted(v[0] for v in self.brute_edges(app, src, dst).values())[::-1][:5]
+            found = [e[3] for e in self.graph.top_edges(5, app=app, src=src, dst=dst)]
+            self.assertEqual(found, expected)
+        self.assertEqual(self.graph.top_edges(app='unknown'), [])
+
+    def test04_neighbors(self):
+        address = self.flows[0][0]
+        for direction in ('out', 'in', 'both'):
+            totals = {}
+            for s, d, nbytes, _ in self.flows:
+                if direction in ('out', 'both') and s == address:
+                    totals[d] = totals.get(d, 0.0) + nbytes
+                if direction in ('in', 'both') and d == address:
+                    totals[s] = totals.get(s, 0.0) + nbytes
+            found = self.graph.neighbors(address, direction)
+            self.assertEqual(dict(found), totals)
+            self.assertEqual([b for _, b in found], sorted(totals.values(), reverse=True))
+        self.assertEqual(len(self.graph.neighbors(address, top=3)), 3)
+        self.assertEqual(self.graph.neighbors('203.0.113.1'), [])
+
+    def test05_talkers_and_hosts(self):
+        subnet = '10.0.2.0/24'
+        totals = {}
+        for s, d, nbytes, _ in self.flows:
+            if in_subnet(d, subnet) and not in_subnet(s, subnet):
+                totals[s] = totals.get(s, 0.0) + nbytes
+        expected = sorted(totals.items(), key=lambda i: i[1], reverse=True)[:5]
+        self.assertEqual(self.graph.talkers(subnet, top=5), expected)
+
+        hosts = sorted(set(a for s, d, _, _ in self.flows for a in (s, d)
+                           if in_subnet(a, subnet)), key=ip_address)
+        self.assertEqual(self.graph.hosts_in(subnet), hosts)
+
+    def test06_records(self):
+        graph = FlowGraph()
+        graph.add_records([{'srcIP': '10.0.0.1', 'dstIP': '10.0.0.2', 'Traffic': '2 KB', 'Application': 'http'},
+                           {'src': '10.0.0.1', 'dst': '10.0.0.2', 'bytes': 1000, 'app': 'http'}])
+        self.assertEqual(graph.top_edges(), [('10.0.0.1', '10.0.0.2', 'http', 3000.0, 2)])
+        with self.assertRaises(KeyError):
+            graph.add_record({'src': '10.0.0.1', 'bytes': 1})
+
+    def test07_compaction_keeps_heaviest(self):
+        graph = FlowGraph(max_edges=100)
+        for src, dst, nbytes, app in self.flows:
+            graph.add(src, dst, nbytes, app)
+        self.assertLessEqual(len(graph), 100)
+        total = sum(f[2] for f in self.flows)
+        kept = sum(e[3] for e in graph.top_edges(n=len(graph)))
+        self.assertAlmostEqual(kept + graph.dropped_bytes, total)
+
+        #Surviving edges are still found through the rebuilt indexes
+        src, dst, app, nbytes, _ = graph.top_edges(1)[0]
+        self.assertIn(dst, dict(graph.neighbors(src)))
+        self.assertIn(src, graph.hosts_in(src + ('/128' if ':' in src else '/32')))
+
+
+if __name__ == '__main__':
+    unittest.main()
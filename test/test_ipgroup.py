@@ -0,0 +1,121 @@
+from manageengineapi import IPGroup, IPNetwork, IPRange
+import pickle
+import unittest
+
+
+class TestIPNetwork(unittest.TestCase):
+
+    def test01_network_bounds(self):
+        net = IPNetwork(u'10.0.0.0/24')
+        self.assertEqual(net.bounds, (4, 0x0A000000, 0x0A0000FF))
+        self.assertEqual(net.num_addresses, 256)
+        self.assertEqual(net.api_format, '10.0.0.0,255.255.255.0')
+        self.assertFalse(net.is_host)
+
+    def test02_host(self):
+        host = IPNetwork(u'8.8.8.8/32')
+        self.assertTrue(host.is_host)
+        self.assertEqual((host.type, host.api_format), ('IPAddress', '8.8.8.8'))
+
+    def test03_ipv6(self):
+        net = IPNetwork(u'2001:db8::/32')
+        self.assertEqual(net.version, 6)
+        self.assertEqual(net.api_format, '2001:db8::,32')
+        self.assertIn(u'2001:db8::1', net)
+        self.assertNotIn(u'10.0.0.1', net)
+
+    def test04_invalid(self):
+        with self.assertRaises(ValueError):
+            IPNetwork(u'10.0.0.1/24')
+
+    def test05_membership(self):
+        net = IPNetwork(u'10.0.0.0/16')
+        self.assertIn(u'10.0.3.4', net)
+        self.assertIn(u'10.0.3.0/24', net)
+        self.assertIn(IPNetwork(u'10.0.8.0/24'), net)
+        self.assertIn(0x0A000001, net)
+        self.assertNotIn(u'10.1.0.0/24', net)
+
+    def test06_pickle_rebuilds_cidr(self):
+        net = pickle.loads(pickle.dumps(IPNetwork(u'2001:db8::/64')))
+        self.assertNotIn('_cidr', net.__dict__)
+        self.assertEqual(str(net.cidr), '2001:db8::/64')
+        for cidr in (u'10.1.0.0/16', u'::/120'):
+            again = pickle.loads(pickle.dumps(IPNetwork(cidr)))
+            self.assertEqual(again.cidr, IPNetwork(cidr).cidr)
+
+
+class TestIPRange(unittest.TestCase):
+
+    def test01_bounds_and_format(self):
+        r = IPRange(rangestart=u'10.0.0.10', rangeend=u'10.0.0.20', netmask='255.255.255.0', status='include')
+        self.assertEqual(r.num_addresses, 11)
+        self.assertEqual(r.api_format, '10.0.0.10,10.0.0.20,255.255.255.0')
+        self.assertIn(u'10.0.0.15', r)
+        self.assertNotIn(u'10.0.0.21', r)
+
+    def test02_invalid(self):
+        with self.assertRaises(ValueError):
+            IPRange(rangestart=u'10.0.0.20', rangeend=u'10.0.0.10', netmask='255.255.255.0')
+        with self.assertRaises(ValueError):
+            IPRange(rangestart=u'10.0.0.1', rangeend=u'2001:db8::1', netmask='64')
+
+    def test03_ipv6_pickle(self):
+        r = IPRange(rangestart=u'2001:db8::1', rangeend=u'2001:db8::ff', netmask='64', status='include')
+        again = pickle.loads(pickle.dumps(r))
+        self.assertEqual(str(again.end), '2001:db8::ff')
+        self.assertEqual(again, r)
+
+
+class TestSpanOrdering(unittest.TestCase):
+
+    def test01_overlap(self):
+        net = IPNetwork(u'10.0.0.0/24')
+        self.assertTrue(net.overlaps(IPRange(rangestart=u'10.0.0.250', rangeend=u'10.0.1.5', netmask='')))
+        self.assertFalse(net.overlaps(IPNetwork(u'10.0.1.0/24')))
+        self.assertFalse(net.overlaps(IPNetwork(u'::/0')))
+
+    def test02_sort_ipv4_first(self):
+        spans = [IPNetwork(u'2001:db8::/32'), IPNetwork(u'10.0.1.0/24'), IPNetwork(u'10.0.0.0/24')]
+        self.assertEqual([s.network for s in sorted(spans)], ['10.0.0.0', '10.0.1.0', '2001:db8::'])
+
+    def test03_equality_and_hash(self):
+        self.assertEqual(IPNetwork(u'10.0.0.0/24'), IPNetwork(u'10.0.0.0/24'))
+        self.assertNotEqual(IPNetwork(u'10.0.0.0/24'), IPNetwork(u'10.0.0.0/24', status='exclude'))
+        self.assertEqual(len(set([IPNetwork(u'10.0.0.0/24'), IPNetwork(u'10.0.0.0/24')])), 1)
+
+    def test04_ordering_agrees_with_equality(self):
+        include, exclude = IPNetwork(u'10.0.0.0/24'), IPNetwork(u'10.0.0.0/24', status='exclude')
+        self.assertTrue(include < exclude or exclude < include)
+        self.assertFalse(include <= exclude and include >= exclude)
+        self.assertTrue(include <= IPNetwork(u'10.0.0.0/24') <= include)
+        host = IPNetwork(u'10.0.0.1/32')
+        same_bounds = IPRange(rangestart=u'10.0.0.1', rangeend=u'10.0.0.1', netmask='', status='include')
+        self.assertNotEqual(host, same_bounds)
+        self.assertTrue(host < same_bounds or same_bounds < host)
+
+
+class TestIPGroupParsing(unittest.TestCase):
+
+    def test01_api_list(self):
+        group = IPGroup()
+        group.process_api_group_list([
+            ['IPNetwork', 'Include', '10.0.0.0', '255.255.255.0'],
+            ['IPAddress', 'Exclude', '10.0.0.5'],
+            ['IPRange', 'Include', '10.0.1.1 to 10.0.1.8', '255.255.255.0'],
+        ])
+        self.assertEqual([i.type for i in group.ip], ['IPNetwork', 'IPAddress', 'IPRange'])
+        self.assertEqual(group.ip[1].status, 'Exclude')
+        self.assertEqual(group.ip[2].num_addresses, 8)
+
+    def test02_between(self):
+        group = IPGroup()
+        group.process_api_group_list([['IPAddress', 'Between', 'IPAddress', '10.0.0.1', '10.0.0.2']])
+        self.assertTrue(group.is_between)
+        self.assertEqual([i.api_format for i in group.ip], ['10.0.0.1', '10.0.0.2'])
+        with self.assertRaises(ValueError):
+            group.add_ip(IPNetwork(u'10.0.0.3/32', status='between'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+from manageengineapi import NFApi
+from manageengineapi.loadtest import parse_mix, percentile, compare, run, main, MethodStats, StandInServer
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+
+class TestMix(unittest.TestCase):
+
+    def test01_weights(self):
+        self.assertEqual(parse_mix('get_ip_groups=5, get_dev_list'), {'get_ip_groups': 5.0, 'get_dev_list': 1.0})
+
+    def test02_invalid(self):
+        for text in ('nope=1', 'get_ip_groups=0', ' , '):
+            with self.assertRaises(ValueError):
+                parse_mix(text)
+
+
+class TestStatistics(unittest.TestCase):
+
+    def test01_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test02_report(self):
+        stats = MethodStats()
+        for latency in (0.3, 0.1, 0.2):
+            stats.record(latency)
+        stats.record(0.5, ValueError())
+        report = stats.report(2.0)
+        self.assertEqual(report['calls'], 4)
+        self.assertEqual(report['error_types'], {'ValueError': 1})
+        self.assertEqual(report['throughput'], 1.5)
+        self.assertEqual(report['p50'], 0.2)
+        self.assertEqual(report['max'], 0.3)
+
+    def test03_compare(self):
+        old = {'results': {'a': {'throughput': 10.0, 'mean': 0.1, 'p50': 0.1, 'p95': 0.2, 'p99': None,
+                                 'error_rate': 0.0}}}
+        new = {'results': {'a': {'throughput': 20.0, 'mean': 0.2, 'p50': 0.1, 'p95': 0.1, 'p99': 0.3,
+                                 'error_rate': 0.1}, 'b': {}}}
+        comparison = compare(new, old)
+        self.assertEqual(list(comparison), ['a'])
+        self.assertEqual(comparison['a']['throughput'], 2.0)
+        self.assertEqual(comparison['a']['p95'], 0.5)
+        self.assertIsNone(comparison['a']['p99'])
+        self.assertEqual(comparison['a']['error_rate_delta'], 0.1)
+
+
+class TestStandInRun(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test01_clients_log_in_and_call(self):
+        address = self.server.address
+        report = run(lambda: NFApi(address, 'k', 'u', 'p'),
+                     parse_mix('get_ip_groups=1,get_group_traffic_data=1'), clients=3, duration=0.3)
+        self.assertEqual(report['results']['login']['calls'], 3)
+        self.assertEqual(report['results']['login']['errors'], 0)
+        self.assertGreater(report['totals']['calls'], 0)
+        self.assertEqual(report['totals']['errors'], 0)
+        self.assertEqual(report['config']['clients'], 3)
+
+    def test02_failed_login_counted(self):
+        report = run(lambda: NFApi('127.0.0.1:1', 'k', 'u', 'p'), parse_mix('get_dev_list'),
+                     clients=2, duration=0.1)
+        self.assertEqual(report['results']['login']['errors'], 2)
+        self.assertEqual(report['totals']['calls'], 0)
+
+    def test03_concurrent_requests_counted(self):
+        def fetch(_):
+            urlopen('http://{0}/'.format(self.server.address)).read()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(fetch, range(80)))
+        self.assertEqual(self.server.requests, 80)
+
+
+class TestMain(unittest.TestCase):
+
+    def test01_stand_in_compare(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            baseline = os.path.join(tmp, 'base.json')
+            output = os.path.join(tmp, 'run.json')
+            args = ['--stand-in', '--clients', '2', '--duration', '0.2', '--mix', 'get_bill_plans']
+            main(args + ['--output', baseline])
+            main(args + ['--output', output, '--compare', baseline])
+            with open(output) as f:
+                report = json.load(f)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(report['target'], 'stand-in')
+        self.assertIn('get_bill_plans', report['comparison'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+from manageengineapi import NFApi, IPGroup, IPNetwork, IPRange, BillPlan
+from manageengineapi.chunking import part_name
+from manageengineapi.bench import bench_session, synthetic_devices
+from manageengineapi.mirror import Mirror
+from manageengineapi.watch import ConfigWatcher
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+
+def api_group(name, ID, dev_ids, *networks):
+    return {
+        'app': 'All',
+        'dscp': 'All',
+        'base': {'Name': name, 'desc': 'd', 'speed': 1000, 'status': 'Enabled', 'ID': ID},
+        'Asso_Device': 'bench-router',
+        'Asso_Dev_id': dev_ids,
+        'ip': [['IPNetwork', 'Include', network, mask] for network, mask in networks],
+    }
+
+
+def api_plan(planid, *group_ids):
+    return {
+        'name': 'plan-{0}'.format(planid), 'desc': '', 'coustunit': 'USD', 'period': 'monthly',
+        'billDate': 1, 'tzone': 'US/Eastern', 'basespd1': 1, 'basecost1': 1, 'addspd1': 1,
+        'addcost1': 1, 'type': 'speed', 'perc': 40, 'bussList': '', 'emailid': '',
+        'emailSubject': '', 'planid': planid,
+        'ipgList': [['g{0}'.format(i), i] for i in group_ids],
+    }
+
+
+BODIES = {
+    NFApi.LISTIPGROUP_URI: {'IPGroup_List': [
+        #Interfaces 0 and 1 are on bench-router-0, 1000 on bench-router-1
+        api_group('g1', 1, '0,1', ('10.1.0.0', '255.255.0.0')),
+        api_group('g2', 2, '1000', ('10.1.2.0', '255.255.255.0'), ('192.168.0.0', '255.255.255.0')),
+        api_group('g3', 3, -1, ('172.16.0.0', '255.240.0.0')),
+    ]},
+    NFApi.LISTBILLPLAN_URI: {'bpList': [api_plan(10, 1, 2), api_plan(11, 2)]},
+    NFApi.LISTDEVLIST_URI: synthetic_devices(2, interfaces=2),
+}
+
+
+class TestMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.session = bench_session(BODIES)
+        self.mirror = Mirror()
+        self.changed = self.mirror.refresh(self.session)
+
+    def tearDown(self):
+        self.mirror.close()
+
+    def names(self, rows):
+        return [row['name'] for row in rows]
+
+    def test01_refresh_counts(self):
+        self.assertEqual(self.changed, {'ipgroup': (3, 0), 'billplan': (2, 0), 'device': (2, 0)})
+        self.assertEqual(self.mirror.refresh(self.session),
+                         {'ipgroup': (0, 0), 'billplan': (0, 0), 'device': (0, 0)})
+
+    def test02_groups_on_device(self):
+        self.assertEqual(self.names(self.mirror.groups_on_device('bench-router-0')), ['g1'])
+        self.assertEqual(self.names(self.mirror.groups_on_device('192.0.0.1')), ['g2'])
+        self.assertEqual(self.mirror.groups_on_device('nope'), [])
+
+    def test03_containing_and_overlapping(self):
+        self.assertEqual(self.names(self.mirror.groups_containing('10.1.2.128/25')), ['g1', 'g2'])
+        self.assertEqual(self.names(self.mirror.groups_containing('10.1.0.0/16')), ['g1'])
+        self.assertEqual(self.names(self.mirror.groups_containing('10.1.2.5', status='exclude')), [])
+        self.assertEqual(self.names(self.mirror.groups_overlapping('10.0.0.0/8')), ['g1', 'g2'])
+
+    def test04_plans(self):
+        self.assertEqual(self.names(self.mirror.plans_for_group('g2')), ['plan-10', 'plan-11'])
+        self.assertEqual(self.names(self.mirror.plans_for_group(1)), ['plan-10'])
+        self.assertEqual(self.names(self.mirror.groups_for_plan('plan-10')), ['g1', 'g2'])
+        self.assertEqual(self.names(self.mirror.unbilled_groups()), ['g3'])
+
+    def test05_incremental_update(self):
+        groups = self.session.get_ip_groups()
+        groups[0].add_ip(IPNetwork(u'10.200.0.0/16'))
+        self.assertEqual(self.mirror.update_ip_groups(groups[:2]), (1, 1))
+        self.assertEqual(self.names(self.mirror.groups_containing('10.200.1.0/24')), ['g1'])
+        self.assertEqual(self.mirror.unbilled_groups(), [])
+
+    def test06_ipv6(self):
+        group = IPGroup(name='v6', ID=9)
+        group.add_ip(IPNetwork(u'2001:db8::/32'))
+        self.mirror.update_ip_groups([group], prune=False)
+        self.assertEqual(self.names(self.mirror.groups_containing('2001:db8:1::/48')), ['v6'])
+        self.assertEqual(self.names(self.mirror.groups_containing('10.1.0.1')), ['g1'])
+
+    def test07_watcher_events(self):
+        watcher = ConfigWatcher(self.session, kinds=('ipgroup',))
+        watcher.subscribe(self.mirror.apply_event)
+        watcher.poll()
+        #g2 and g3 deleted on the server
+        changed = dict(BODIES)
+        changed[NFApi.LISTIPGROUP_URI] = {'IPGroup_List': BODIES[NFApi.LISTIPGROUP_URI]['IPGroup_List'][:1]}
+        self.session.request = bench_session(changed).request
+        self.assertEqual(len(watcher.poll()), 2)
+        self.assertEqual(self.names(self.mirror.query('SELECT name FROM ip_groups ORDER BY name')), ['g1'])
+        self.assertEqual(self.mirror.groups_on_device('bench-router-1'), [])
+
+    def test08_file_backed(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'nfa.sqlite3')
+            mirror = Mirror(path)
+            mirror.refresh(self.session)
+            mirror.close()
+            mirror = Mirror(path)
+            self.assertEqual(self.names(mirror.groups_on_device('bench-router-0')), ['g1'])
+            mirror.close()
+        finally:
+            shutil.rmtree(tmp)
+
+    def test09_ranges(self):
+        group = IPGroup(name='r', ID=8)
+        group.add_ip(IPRange(rangestart=u'10.9.0.250', rangeend=u'10.9.1.5', netmask='', status='include'))
+        self.mirror.update_ip_groups([group], prune=False)
+        self.assertEqual(self.names(self.mirror.groups_containing('10.9.1.0/30')), ['r'])
+        self.assertEqual(self.mirror.groups_containing('10.9.1.0/24'), [])
+        self.assertEqual(self.names(self.mirror.groups_overlapping('10.9.1.0/24')), ['r'])
+        self.assertEqual(self.names(self.mirror.groups_overlapping('10.9.0.0/16', status='include')), ['r'])
+
+    def test10_plans_billing_parts(self):
+        group = IPGroup(name='big', ID=5)
+        group.parts = [IPGroup(name=part_name('big', 2), ID=6), IPGroup(name=part_name('big', 3), ID=7)]
+        plan = BillPlan(name='plan-20', plan_id=20, ipg_id='5,6,7,1')
+        #Plan stored before its group, rows are moved over when the group arrives
+        early = BillPlan(name='plan-21', plan_id=21, ipg_id='6')
+        self.mirror.update_bill_plans([early], prune=False)
+        self.mirror.update_ip_groups([group], prune=False)
+        self.mirror.update_bill_plans([plan], prune=False)
+
+        self.assertEqual(self.names(self.mirror.groups_for_plan('plan-20')), ['big', 'g1'])
+        self.assertEqual(self.names(self.mirror.plans_for_group('big')), ['plan-20', 'plan-21'])
+        self.assertNotIn('big', self.names(self.mirror.unbilled_groups()))
+
+    def test11_old_layout_dropped(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'nfa.sqlite3')
+            db = sqlite3.connect(path)
+            db.execute('CREATE TABLE ip_entries (group_id TEXT, version INTEGER, first TEXT, last TEXT)')
+            db.commit()
+            db.close()
+            mirror = Mirror(path)
+            mirror.refresh(self.session)
+            self.assertEqual(self.names(mirror.groups_containing('10.1.0.0/16')), ['g1'])
+            mirror.close()
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+from manageengineapi import NFApi
+from manageengineapi.parallel import parse_ip_groups
+from manageengineapi.bench import bench_session, synthetic_ip_groups
+import multiprocessing
+import unittest
+
+
+def summary(groups):
+    return [(g.name, g.ID, [i.api_format for i in g.ip], g.is_dirty) for g in groups]
+
+
+class TestParseIPGroups(unittest.TestCase):
+
+    def setUp(self):
+        self.entries = synthetic_ip_groups(40, entries=5)['IPGroup_List']
+
+    def test01_small_input_inline(self):
+        self.assertEqual(len(parse_ip_groups(self.entries, processes=4)), 40)
+
+    def test02_worker_processes_keep_order(self):
+        inline = parse_ip_groups(self.entries, processes=1)
+        parallel = parse_ip_groups(self.entries, processes=2, chunk_size=7, min_parallel=1)
+        self.assertEqual(summary(parallel), summary(inline))
+
+    def test03_shared_pool(self):
+        pool = multiprocessing.Pool(2)
+        try:
+            groups = parse_ip_groups(self.entries, processes=2, pool=pool, min_parallel=1)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual([g.ID for g in groups], [e['base']['ID'] for e in self.entries])
+
+    def test04_session_processes_argument(self):
+        session = bench_session({NFApi.LISTIPGROUP_URI: synthetic_ip_groups(10)})
+        self.assertEqual(summary(session.get_ip_groups(processes=0)), summary(session.get_ip_groups()))
+
+
+if __name__ == '__main__':
+    unittest.main()
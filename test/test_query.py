@@ -0,0 +1,124 @@
+from manageengineapi import StatQuery
+from manageengineapi.exceptions import NFApiError
+from manageengineapi.query import series_points, point_time, stitch
+from fakes import make_response, scripted_session
+from datetime import datetime, timedelta
+import threading
+import unittest
+
+HOUR = 3600 * 1000
+
+
+class WindowSession(object):
+    '''Answers getTrafficData with one point per hour of the requested window, ends included.'''
+
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.windows = []
+        self.cookies = {}
+        self.headers = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, **kwargs):
+        start, end = params[StatQuery.START_PARAM], params[StatQuery.END_PARAM]
+        with self._lock:
+            self.windows.append((start, end))
+        if len(self.windows) in self.fail:
+            return make_response({'error': {'code': 5000, 'message': 'Query timed out'}})
+        first = -(-start // HOUR) * HOUR
+        return make_response({'data': [[t, 1] for t in range(first, end + 1, HOUR)]})
+
+
+class TestStatQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.start = datetime(2020, 1, 1)
+        self.query = StatQuery(self.start, self.start + timedelta(days=3), direction='out')
+
+    def test01_validation(self):
+        with self.assertRaises(ValueError):
+            StatQuery(self.start, self.start)
+        with self.assertRaises(ValueError):
+            StatQuery(self.start, self.start + timedelta(hours=1), direction='sideways')
+
+    def test02_split_covers_window(self):
+        windows = self.query.split(timedelta(hours=30))
+        self.assertEqual([(w.start, w.end) for w in windows], [
+            (self.start, self.start + timedelta(hours=30)),
+            (self.start + timedelta(hours=30), self.start + timedelta(hours=60)),
+            (self.start + timedelta(hours=60), self.start + timedelta(hours=72)),
+        ])
+        self.assertEqual(windows[0].direction, 'OUT')
+        with self.assertRaises(ValueError):
+            self.query.split(timedelta(0))
+
+    def test03_payloads(self):
+        payload = StatQuery(self.start, self.start + timedelta(hours=1), extra={'rows': '5'}).traffic_payload('25')
+        self.assertEqual(payload['TimeFrame'], 'custom')
+        self.assertEqual(payload[StatQuery.END_PARAM] - payload[StatQuery.START_PARAM], HOUR)
+        self.assertEqual(payload['rows'], '5')
+        self.assertEqual(self.query.conversation_payload('25', count=20)['Count'], '20')
+
+    def test04_last(self):
+        query = StatQuery.last(timedelta(hours=2))
+        self.assertEqual(query.end - query.start, timedelta(hours=2))
+
+
+class TestStitch(unittest.TestCase):
+
+    def test01_series_points(self):
+        self.assertEqual(series_points([[1, 2]]), [[1, 2]])
+        self.assertEqual(series_points({'graphData': [[1, 2]], 'other': []}), [[1, 2]])
+        self.assertEqual(series_points({'whatever': [[1, 2]], 'n': 1}), [[1, 2]])
+        self.assertEqual(series_points({'data': [], 'n': 1}), [])
+
+    def test04_unrecognised_or_error_raises(self):
+        with self.assertRaises(NFApiError):
+            series_points({'n': 1})
+        with self.assertRaises(NFApiError):
+            series_points(None)
+        with self.assertRaises(NFApiError) as ctx:
+            series_points({'error': {'code': 5000, 'message': 'Timed out'}})
+        self.assertIn('Timed out', str(ctx.exception))
+
+    def test02_point_time(self):
+        self.assertEqual(point_time([5, 1]), 5)
+        self.assertEqual(point_time({'timestamp': 7}), 7)
+        self.assertIsNone(point_time({'v': 1}))
+
+    def test03_boundary_points_kept_once(self):
+        merged = stitch([{'data': [[3, 'b'], [4, 'b']]}, {'data': [[1, 'a'], [2, 'a'], [3, 'a']]}])
+        self.assertEqual([p[0] for p in merged], [1, 2, 3, 4])
+
+
+class TestTrafficSeries(unittest.TestCase):
+
+    def test01_split_fetch_and_stitch(self):
+        session = scripted_session()
+        session.request = WindowSession()
+        query = StatQuery(datetime(2020, 1, 1), datetime(2020, 1, 3))
+        series = session.get_group_traffic_series('25', query, max_span=timedelta(hours=7), workers=4)
+
+        self.assertEqual(len(session.request.windows), 7)
+        times = [p[0] for p in series]
+        self.assertEqual(len(times), 49)
+        self.assertEqual(times, sorted(set(times)))
+
+    def test02_single_window_inline(self):
+        session = scripted_session()
+        session.request = WindowSession()
+        query = StatQuery(datetime(2020, 1, 1), datetime(2020, 1, 1, 5))
+        self.assertEqual(len(session.get_group_traffic_series('25', query)), 6)
+        self.assertEqual(len(session.request.windows), 1)
+
+    def test03_failed_window_raises(self):
+        session = scripted_session()
+        session.request = WindowSession(fail=(3,))
+        query = StatQuery(datetime(2020, 1, 1), datetime(2020, 1, 3))
+        with self.assertRaises(NFApiError) as ctx:
+            session.get_group_traffic_series('25', query, max_span=timedelta(hours=7), workers=4)
+        self.assertIn('Query timed out', str(ctx.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
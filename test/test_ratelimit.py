@@ -0,0 +1,68 @@
+from manageengineapi import NFApi, IPGroup, AdaptiveLimiter
+from manageengineapi.exceptions import NFApiError
+from fakes import scripted_session
+import unittest
+
+ERROR = {'error': {'code': 5000, 'message': 'Internal error'}}
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def test01_error_cuts_limits(self):
+        limiter = AdaptiveLimiter(max_concurrency=8, max_rate=20, decrease_factor=0.5)
+        limiter.release('/x', limiter.acquire('/x'), error=True)
+        metrics = limiter.metrics()['/x']
+        self.assertEqual(metrics['concurrency_limit'], 4)
+        self.assertEqual(metrics['rate_limit'], 10)
+        self.assertEqual(metrics['errors'], 1)
+
+    def test02_healthy_calls_recover(self):
+        limiter = AdaptiveLimiter(max_concurrency=8, max_rate=20, rate_step=1)
+        limiter.release('/x', limiter.acquire('/x'), error=True)
+        for _ in range(5):
+            limiter.release('/x', limiter.acquire('/x'))
+        metrics = limiter.metrics()['/x']
+        self.assertGreater(metrics['rate_limit'], 10)
+        self.assertEqual(metrics['in_flight'], 0)
+
+    def test03_slow_calls_count_as_degraded(self):
+        limiter = AdaptiveLimiter(max_concurrency=8, latency_target=0.01)
+        started = limiter.acquire('/x')
+        limiter.release('/x', started - 1)
+        self.assertEqual(limiter.metrics()['/x']['concurrency_limit'], 4)
+
+    def test04_endpoints_are_independent(self):
+        limiter = AdaptiveLimiter(max_concurrency=8)
+        limiter.release('/a', limiter.acquire('/a'), error=True)
+        limiter.release('/b', limiter.acquire('/b'))
+        self.assertEqual(limiter.metrics()['/a']['concurrency_limit'], 4)
+        self.assertEqual(limiter.metrics()['/b']['concurrency_limit'], 8)
+
+
+class TestSessionLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = AdaptiveLimiter()
+
+    def test01_get_error_payload_reported(self):
+        session = scripted_session([ERROR], limiter=self.limiter)
+        with self.assertRaises(NFApiError):
+            session.get_bill_plans()
+        self.assertEqual(self.limiter.metrics()[NFApi.LISTBILLPLAN_URI]['errors'], 1)
+
+    def test02_post_error_payload_reported(self):
+        session = scripted_session([ERROR], limiter=self.limiter)
+        response = session.add_ip_group(IPGroup(name='overload'), capture_id=False)
+        self.assertIn('error', response)
+        metrics = self.limiter.metrics()[NFApi.ADDIPGROUP_URI]
+        self.assertEqual(metrics['errors'], 1)
+        self.assertLess(metrics['concurrency_limit'], self.limiter.max_concurrency)
+
+    def test03_post_success_not_reported(self):
+        session = scripted_session([{'message': 'ok'}], limiter=self.limiter)
+        session.add_ip_group(IPGroup(name='fine'), capture_id=False)
+        self.assertEqual(self.limiter.metrics()[NFApi.ADDIPGROUP_URI]['errors'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
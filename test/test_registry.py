@@ -0,0 +1,78 @@
+from manageengineapi import IPGroup
+from manageengineapi.registry import ObjectIndex, Registry
+import threading
+import unittest
+
+
+class TestObjectIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ObjectIndex('ID')
+        self.group = IPGroup(name='a', ID=1)
+        self.index.put(self.group)
+
+    def test01_get_by_name_or_id(self):
+        self.assertIs(self.index.get('a'), self.group)
+        self.assertIs(self.index.get(1), self.group)
+        self.assertIs(self.index.get('1'), self.group)
+        self.assertIsNone(self.index.get('b'))
+
+    def test02_rename_drops_old_name(self):
+        self.group.name = 'renamed'
+        self.index.put(self.group)
+        self.assertIsNone(self.index.get('a'))
+        self.assertIs(self.index.get('renamed'), self.group)
+        self.assertEqual(len(self.index), 1)
+
+    def test03_put_replaces_same_key(self):
+        fresh = IPGroup(name='a', ID=1)
+        self.index.put(fresh)
+        self.assertIs(self.index.get(1), fresh)
+        self.assertEqual(len(self.index), 1)
+
+    def test04_discard_by_equal_keys(self):
+        self.index.discard(IPGroup(name='a', ID=1))
+        self.assertIsNone(self.index.get('a'))
+        self.assertEqual(len(self.index), 0)
+
+    def test05_replace(self):
+        b = IPGroup(name='b', ID=2)
+        self.index.replace([b])
+        self.assertIsNone(self.index.get('a'))
+        self.assertIs(self.index.get(2), b)
+        self.assertEqual(list(self.index), [b])
+
+    def test06_replace_never_seen_empty(self):
+        groups = [IPGroup(name='g{0}'.format(i), ID=i) for i in range(2000)]
+        self.index.replace(groups)
+        misses = []
+        stop = threading.Event()
+
+        def read():
+            while not stop.is_set():
+                if self.index.get('g1999') is None:
+                    misses.append(1)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        try:
+            for _ in range(20):
+                self.index.replace(groups)
+        finally:
+            stop.set()
+            reader.join()
+        self.assertEqual(misses, [])
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test01_clear(self):
+        registry = Registry()
+        registry.ip_groups.put(IPGroup(name='a', ID=1))
+        registry.clear()
+        self.assertEqual(len(registry.ip_groups), 0)
+        self.assertEqual(len(registry.bill_plans), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
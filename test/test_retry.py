@@ -0,0 +1,124 @@
+from manageengineapi import NFApi, RetryPolicy
+from manageengineapi.exceptions import NFApiError, NFApiSessionExpired
+from fakes import scripted_session, make_response, BrokenBody
+import requests
+import unittest
+
+GROUPS = {'IPGroup_List': []}
+EXPIRED = {'error': {'code': 5001, 'message': 'Session expired, please login again'}}
+
+
+def group_list(*names):
+    return {'IPGroup_List': [
+        {
+            'app': 'All', 'dscp': 'All', 'Asso_Device': 'All Interfaces', 'Asso_Dev_id': -1, 'ip': [],
+            'base': {'Name': name, 'desc': '', 'speed': 1, 'status': 'Enabled', 'ID': i},
+        }
+        for i, name in enumerate(names)
+    ]}
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test01_delay_bounded(self):
+        policy = RetryPolicy(backoff=1, max_backoff=4)
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= policy.delay(attempt) <= min(4, 2 ** (attempt - 1)))
+
+
+class TestRequestRetry(unittest.TestCase):
+
+    def test01_status_forcelist_retried(self):
+        failed = make_response(b'busy', status=503)
+        session = scripted_session([failed, GROUPS], retry=RetryPolicy(backoff=0))
+        self.assertEqual(session.get_ip_groups(), [])
+        self.assertEqual(len(session.request.calls), 2)
+
+    def test02_connection_error_retried(self):
+        session = scripted_session([requests.ConnectionError('reset'), GROUPS],
+                                   retry=RetryPolicy(backoff=0))
+        self.assertEqual(session.get_ip_groups(), [])
+
+    def test03_retries_exhausted(self):
+        session = scripted_session([requests.ConnectionError('reset')] * 3,
+                                   retry=RetryPolicy(retries=2, backoff=0))
+        with self.assertRaises(requests.ConnectionError):
+            session.get_ip_groups()
+
+    def test04_posts_not_retried(self):
+        session = scripted_session([requests.ConnectionError('reset'), {'message': 'ok'}],
+                                   retry=RetryPolicy(backoff=0))
+        with self.assertRaises(requests.ConnectionError):
+            session._post(NFApi.ADDIPGROUP_URI, {})
+
+
+class TestRelogin(unittest.TestCase):
+
+    def test01_expired_payload_relogs_and_replays(self):
+        session = scripted_session([EXPIRED, GROUPS])
+        self.assertEqual(session.get_ip_groups(), [])
+        self.assertEqual(session.logins, 1)
+
+    def test02_login_redirect_relogs_and_replays_post(self):
+        login_page = make_response(b'<html/>', url='http://nfa.invalid/apiclient/ember/Login.jsp',
+                                   history=[make_response(b'', status=302)])
+        session = scripted_session([login_page, {'message': 'ok'}])
+        self.assertEqual(session._post(NFApi.ADDIPGROUP_URI, {}).json(), {'message': 'ok'})
+        self.assertEqual(session.logins, 1)
+
+    def test03_other_session_errors_not_relogged(self):
+        error = {'error': {'code': 5000, 'message': 'Group is used by another session of the report'}}
+        session = scripted_session([error])
+        with self.assertRaises(NFApiError) as caught:
+            session.get_ip_groups()
+        self.assertNotIsInstance(caught.exception, NFApiSessionExpired)
+        self.assertEqual(session.logins, 0)
+
+    def test04_relogin_only_once(self):
+        session = scripted_session([EXPIRED, EXPIRED])
+        with self.assertRaises(NFApiSessionExpired):
+            session.get_ip_groups()
+        self.assertEqual(session.logins, 1)
+
+    def test05_auto_relogin_off(self):
+        session = scripted_session([EXPIRED], auto_relogin=False)
+        with self.assertRaises(NFApiSessionExpired):
+            session.get_ip_groups()
+
+
+class TestStreamedRetry(unittest.TestCase):
+
+    def test01_streamed_expired_payload_relogs(self):
+        session = scripted_session([EXPIRED, group_list('a', 'b')])
+        self.assertEqual([g.name for g in session.iter_ip_groups()], ['a', 'b'])
+        self.assertEqual(session.logins, 1)
+
+    def test02_streamed_error_payload_raised(self):
+        session = scripted_session([{'error': {'code': 5000, 'message': 'Internal error'}}])
+        with self.assertRaises(NFApiError):
+            list(session.iter_ip_groups())
+        self.assertEqual(session.logins, 0)
+
+    def test03_streamed_connection_drop_retried(self):
+        dropped = make_response(b'')
+        dropped.raw = BrokenBody()
+        session = scripted_session([dropped, group_list('a')], retry=RetryPolicy(backoff=0))
+        self.assertEqual([g.name for g in session.iter_ip_groups()], ['a'])
+        self.assertTrue(dropped.raw.closed)
+
+    def test04_streamed_connection_drop_without_policy(self):
+        dropped = make_response(b'')
+        dropped.raw = BrokenBody()
+        session = scripted_session([dropped])
+        with self.assertRaises(requests.ConnectionError):
+            list(session.iter_ip_groups())
+
+    def test05_streamed_status_forcelist_retried(self):
+        failed = make_response(b'busy', status=503)
+        session = scripted_session([failed, group_list('a')], retry=RetryPolicy(backoff=0))
+        self.assertEqual([g.name for g in session.iter_ip_groups()], ['a'])
+        self.assertTrue(failed.raw.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
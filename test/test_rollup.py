@@ -0,0 +1,104 @@
+from manageengineapi.rollup import Aggregate, Rollup, RollupStore
+import random
+import unittest
+
+
+class TestAggregate(unittest.TestCase):
+
+    def test01_basic_stats(self):
+        agg = Aggregate()
+        for v in (4, 1, 7):
+            agg.add(v)
+        self.assertEqual((agg.count, agg.minimum, agg.maximum, agg.mean), (3, 1, 7, 4))
+
+    def test02_percentile_relative_error(self):
+        rng = random.Random(3)
+        values = [rng.uniform(1, 1e6) for _ in range(5000)]
+        agg = Aggregate(precision=0.01)
+        for v in values:
+            agg.add(v)
+        exact = sorted(values)[int(0.95 * len(values)) - 1]
+        self.assertAlmostEqual(agg.percentile(95) / exact, 1, delta=0.02)
+
+    def test03_zero_and_negative(self):
+        agg = Aggregate()
+        for v in (-5, 0, 5):
+            agg.add(v)
+        self.assertAlmostEqual(agg.percentile(0), -5, delta=0.05)
+        self.assertEqual(agg.percentile(50), 0)
+        self.assertAlmostEqual(agg.percentile(100), 5, delta=0.05)
+
+    def test04_merge(self):
+        a, b = Aggregate(), Aggregate()
+        a.add(1)
+        b.add(9)
+        b.add(5)
+        a.merge(b).merge(Aggregate())
+        self.assertEqual(a.as_dict(percentiles=())['count'], 3)
+        self.assertEqual((a.minimum, a.maximum, a.mean), (1, 9, 5))
+
+    def test05_empty(self):
+        self.assertIsNone(Aggregate().percentile(50))
+        self.assertIsNone(Aggregate().mean)
+
+
+class TestRollup(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.samples = [(rng.uniform(0, 3 * 86400), rng.uniform(0, 100)) for _ in range(3000)]
+        self.rollup = Rollup()
+        for ts, value in self.samples:
+            self.rollup.add(ts, value)
+
+    def expected(self, start, end):
+        return [v for ts, v in self.samples if start <= ts < end]
+
+    def test01_tiers_must_nest(self):
+        with self.assertRaises(ValueError):
+            Rollup(tiers=(60, 90))
+
+    def test02_summary_matches_raw_samples(self):
+        rng = random.Random(11)
+        for _ in range(50):
+            start = rng.randrange(0, 3 * 86400, 60)
+            end = rng.randrange(start + 60, 3 * 86400 + 61, 60)
+            summary = self.rollup.summary(start, end)
+            values = self.expected(start, end)
+            self.assertEqual(summary.count, len(values))
+            if values:
+                self.assertAlmostEqual(summary.total, sum(values), places=6)
+                self.assertEqual((summary.minimum, summary.maximum), (min(values), max(values)))
+
+    def test03_series(self):
+        hours = self.rollup.series(0, 86400, 3600)
+        self.assertEqual(sum(a.count for _, a in hours), len(self.expected(0, 86400)))
+        self.assertTrue(all(start % 3600 == 0 for start, _ in hours))
+
+    def test04_retention(self):
+        rollup = Rollup(tiers=(60, 3600), retention={60: 3600})
+        for minute in range(180):
+            rollup.add(minute * 60, 1)
+
+        #Minute buckets overlapping the last hour are kept, hourly ones all are
+        self.assertEqual(len(rollup.series(0, 3 * 3600, 60)), 61)
+        self.assertEqual(sum(a.count for _, a in rollup.series(0, 3 * 3600, 3600)), 180)
+
+    def test05_add_series_milliseconds(self):
+        rollup = Rollup(tiers=(60,))
+        rollup.add_series([[60000, '5'], [61000, 7]], unit=1000)
+        self.assertEqual(rollup.summary(60, 120).total, 12)
+
+
+class TestRollupStore(unittest.TestCase):
+
+    def test01_series_per_key(self):
+        store = RollupStore(tiers=(60, 3600))
+        store.add('a', 0, 1)
+        store.add('b', 0, 2)
+        self.assertEqual(store['a'].summary(0, 60).total, 1)
+        self.assertEqual(store['b'].tiers, (60, 3600))
+
+
+if __name__ == '__main__':
+    unittest.main()
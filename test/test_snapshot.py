@@ -0,0 +1,101 @@
+from manageengineapi import NFApi, Snapshot
+from manageengineapi.bench import bench_session, synthetic_ip_groups, synthetic_bill_plans, synthetic_devices
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def session(groups=3, hostname=None):
+    nfa = bench_session({
+        NFApi.LISTIPGROUP_URI: synthetic_ip_groups(groups),
+        NFApi.LISTBILLPLAN_URI: synthetic_bill_plans(2, groups),
+        NFApi.LISTDEVLIST_URI: synthetic_devices(2, 2),
+    })
+    if hostname:
+        nfa.hostname = hostname
+    return nfa
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'nfa.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test01_save_load_roundtrip(self):
+        snap = Snapshot.capture(session())
+        snap.save(self.path)
+        loaded = Snapshot.load(self.path)
+        self.assertEqual([g.name for g in loaded.ip_groups], [g.name for g in snap.ip_groups])
+        self.assertEqual([str(i.api_format) for i in loaded.ip_groups[0].ip],
+                         [str(i.api_format) for i in snap.ip_groups[0].ip])
+        self.assertEqual([p.plan_id for p in loaded.bill_plans], [p.plan_id for p in snap.bill_plans])
+        self.assertEqual(len(loaded.devices), 2)
+        self.assertFalse(loaded.ip_groups[0].is_dirty)
+
+    def test02_header(self):
+        snap = Snapshot.capture(session())
+        snap.save(self.path)
+        header = Snapshot.read_header(self.path)
+        self.assertEqual(header['format'], Snapshot.FORMAT_VERSION)
+        self.assertEqual(header['hostname'], 'bench.invalid')
+        self.assertEqual(header['created'], snap.created)
+
+    def test03_failed_save_keeps_previous_file(self):
+        Snapshot.capture(session()).save(self.path)
+        broken = Snapshot.capture(session(groups=5))
+        broken.devices = [lambda: None]
+        with self.assertRaises(Exception):
+            broken.save(self.path)
+
+        #Previous snapshot intact, no temporary files left behind
+        self.assertEqual(len(Snapshot.load(self.path).ip_groups), 3)
+        self.assertEqual(os.listdir(self.directory), ['nfa.snapshot'])
+
+    def test04_stale(self):
+        snap = Snapshot('h', [], [], [], created=0)
+        self.assertTrue(snap.is_stale(60))
+        self.assertFalse(Snapshot('h', [], [], []).is_stale(60))
+
+    def test05_load_or_capture(self):
+        snap = Snapshot.load_or_capture(self.path, session())
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(len(snap.ip_groups), 3)
+
+        #Existing snapshot of same server is loaded, not recaptured
+        loaded = Snapshot.load_or_capture(self.path, session(groups=5))
+        self.assertEqual(len(loaded.ip_groups), 3)
+
+        #Other server is recaptured
+        other = Snapshot.load_or_capture(self.path, session(groups=5, hostname='other.invalid'))
+        self.assertEqual(len(other.ip_groups), 5)
+
+    def test06_stale_refreshed(self):
+        Snapshot('bench.invalid', [], [], [], created=0).save(self.path)
+        snap = Snapshot.load_or_capture(self.path, session(), max_age=60, background=False)
+        self.assertEqual(len(snap.ip_groups), 3)
+        self.assertEqual(len(Snapshot.load(self.path).ip_groups), 3)
+
+    def test07_background_refresh(self):
+        snap = Snapshot('bench.invalid', [], [], [], created=0)
+        snap.refresh_async(session(), self.path).join()
+        self.assertEqual(len(snap.ip_groups), 3)
+        self.assertEqual(len(Snapshot.load(self.path).ip_groups), 3)
+
+    def test08_other_format_rejected(self):
+        Snapshot.capture(session()).save(self.path)
+        version = Snapshot.FORMAT_VERSION
+        Snapshot.FORMAT_VERSION = version + 1
+        try:
+            with self.assertRaises(ValueError):
+                Snapshot.load(self.path)
+        finally:
+            Snapshot.FORMAT_VERSION = version
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from manageengineapi import NFApi
+from manageengineapi.stream import iter_json_array, JSONStreamError
+from manageengineapi.bench import synthetic_ip_groups
+from fakes import scripted_session
+import json
+import unittest
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestIterJsonArray(unittest.TestCase):
+
+    DOCUMENT = {
+        'meta': {'note': 'brackets ] [ and "quotes" in strings', 'items': 'not an array'},
+        'items': [{'a': 1, 'b': [1, 2, {'c': '}'}]}, 'text \\" with escapes', 3.5, None, [], u'ünïcödé'],
+        'after': [1],
+    }
+
+    def items(self, document, key, size):
+        data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        return list(iter_json_array(chunked(data, size), key))
+
+    def test01_every_chunk_size(self):
+        expected = self.DOCUMENT['items']
+        for size in range(1, 40):
+            self.assertEqual(self.items(self.DOCUMENT, 'items', size), expected, size)
+
+    def test02_first_array_under_key(self):
+        self.assertEqual(self.items({'data': {'rows': [1]}, 'rows': [2]}, 'rows', 3), [1])
+
+    def test03_default_key_takes_first_top_level_array(self):
+        self.assertEqual(self.items({'x': 1, 'rows': [1, 2]}, None, 3), [1, 2])
+        self.assertEqual(self.items([4, 5], None, 1), [4, 5])
+
+    def test04_empty_array(self):
+        self.assertEqual(self.items({'items': []}, 'items', 2), [])
+
+    def test05_missing_array_reports_head(self):
+        error = {'error': {'code': 5000, 'message': 'Internal error'}}
+        with self.assertRaises(JSONStreamError) as caught:
+            self.items(error, 'items', 4)
+        self.assertEqual(json.loads(caught.exception.head), error)
+
+    def test06_stops_after_array(self):
+        def chunks():
+            yield b'{"items": [1, 2], "rest": '
+            raise AssertionError('read past end of array')
+        self.assertEqual(list(iter_json_array(chunks(), 'items')), [1, 2])
+
+
+class TestSessionStreaming(unittest.TestCase):
+
+    def test01_iter_ip_groups(self):
+        session = scripted_session([synthetic_ip_groups(5)])
+        self.assertEqual([g.ID for g in session.iter_ip_groups(chunk_size=64)],
+                         [2500000 + g for g in range(5)])
+
+    def test02_iter_conversation_data(self):
+        session = scripted_session([{'total': 2, 'rows': [{'src': 'a'}, {'src': 'b'}]}])
+        rows = list(session.iter_group_conversation_data('2500000', chunk_size=5))
+        self.assertEqual(rows, [{'src': 'a'}, {'src': 'b'}])
+        self.assertEqual(session.request.calls, [('get', NFApi.CONVERSATION_URI.lstrip('/'))])
+
+    def test03_early_stop_closes_response(self):
+        session = scripted_session([synthetic_ip_groups(50)])
+        groups = session.iter_ip_groups(chunk_size=64)
+        next(groups)
+        groups.close()
+        self.assertTrue(session.request.sent[0].raw.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
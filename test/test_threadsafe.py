@@ -0,0 +1,114 @@
+from manageengineapi import NFApi
+from requests.adapters import BaseAdapter
+from concurrent.futures import ThreadPoolExecutor
+import io
+import threading
+import time
+import requests
+import unittest
+
+
+class TokenAdapter(BaseAdapter):
+    '''Answers 200 to requests carrying the valid NFA__SSO cookie, 401 to the rest.'''
+
+    def __init__(self):
+        BaseAdapter.__init__(self)
+        self.valid = None
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self.lock:
+            self.threads.add(threading.current_thread().name)
+        ok = 'NFA__SSO={0}'.format(self.valid) in (request.headers.get('Cookie') or '')
+        response = requests.Response()
+        response.status_code = 200 if ok else 401
+        response.raw = io.BytesIO(b'[]')
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+def token_session(adapter):
+    '''Thread safe NFApi over adapter, login hands out a new token after a short wait.'''
+
+    session = NFApi('nfa.invalid', 'test-api-key', 'test', 'test', thread_safe=True)
+    session.mount_transport(adapter)
+    session.logins = 0
+
+    def login():
+        with session._login_lock:
+            if session.logged_in:
+                return
+            time.sleep(0.05)
+            session.logins += 1
+            session.NFA_SSO = 'token-{0}'.format(session.logins)
+            session._session.cookies['NFA__SSO'] = session.NFA_SSO
+            adapter.valid = session.NFA_SSO
+            session.logged_in = True
+            session._generation += 1
+    session.login = login
+    session.login()
+    return session
+
+
+class TestThreadSafe(unittest.TestCase):
+
+    def in_thread(self, func):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(func()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test01_shared_session_by_default(self):
+        session = NFApi('nfa.invalid', 'k', 'u', 'p')
+        self.assertIs(self.in_thread(lambda: session.request), session.request)
+
+    def test02_per_thread_sessions_share_pools(self):
+        session = NFApi('nfa.invalid', 'k', 'u', 'p', thread_safe=True)
+        session._session.cookies['NFA__SSO'] = 'abc'
+        worker = self.in_thread(lambda: session.request)
+        self.assertIsNot(worker, session.request)
+        self.assertIs(worker.adapters, session._session.adapters)
+        self.assertEqual(worker.cookies['NFA__SSO'], 'abc')
+
+    def test03_same_session_within_thread(self):
+        session = NFApi('nfa.invalid', 'k', 'u', 'p', thread_safe=True)
+        self.assertIs(session.request, session.request)
+
+    def test04_worker_sessions_resync_after_login(self):
+        adapter = TokenAdapter()
+        session = token_session(adapter)
+        pool = ThreadPoolExecutor(max_workers=1)
+        try:
+            pool.submit(session._get, '/api/json/nfaipgroup/listIPGroups').result()
+            session.logged_in = False
+            session.login()
+            response = pool.submit(session._get, '/api/json/nfaipgroup/listIPGroups').result()
+        finally:
+            pool.shutdown()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.logins, 2)
+
+    def test05_concurrent_expiry_logs_in_once(self):
+        adapter = TokenAdapter()
+        session = token_session(adapter)
+
+        #Server forgets the token, every worker bounces off it at once
+        adapter.valid = 'expired'
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(
+                lambda _: session._get('/api/json/nfaipgroup/listIPGroups'), range(16)))
+
+        self.assertEqual([r.status_code for r in responses], [200] * 16)
+        self.assertEqual(session.logins, 2)
+        self.assertGreater(len(adapter.threads), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
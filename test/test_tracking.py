@@ -0,0 +1,95 @@
+from manageengineapi import NFApi, IPGroup, IPNetwork, BillPlan
+from manageengineapi.bench import bench_session
+import pickle
+import unittest
+
+
+class TestChangeTracking(unittest.TestCase):
+
+    def setUp(self):
+        self.group = IPGroup(name='g', speed=1000)
+        self.group.add_ip(IPNetwork(u'10.0.0.0/24'))
+        self.group.mark_clean()
+
+    def test01_assignment_tracked(self):
+        self.assertFalse(self.group.is_dirty)
+        self.group.speed = 2000
+        self.assertTrue(self.group.is_dirty)
+        self.assertEqual(self.group.changed, frozenset(['speed']))
+
+    def test02_ip_list_mutation_tracked(self):
+        self.group.ip.append(IPNetwork(u'10.0.1.0/24'))
+        self.assertEqual(self.group.changed, frozenset(['ip']))
+        self.group.mark_clean()
+        del self.group.ip[0]
+        self.assertTrue(self.group.is_dirty)
+
+    def test03_assigned_list_stays_tracked(self):
+        self.group.ip = []
+        self.group.mark_clean()
+        self.group.ip.append(IPNetwork(u'10.0.1.0/24'))
+        self.assertTrue(self.group.is_dirty)
+
+    def test04_untracked_attribute(self):
+        self.group.parts = []
+        self.assertFalse(self.group.is_dirty)
+
+    def test05_payload_cached_until_change(self):
+        first = self.group.api_payload()
+        self.assertEqual(self.group.api_payload(), first)
+
+        #Callers get copies
+        first['apiKey'] = 'x'
+        self.assertNotIn('apiKey', self.group.api_payload())
+
+        self.group.ip.append(IPNetwork(u'10.0.1.0/24'))
+        self.assertEqual(self.group.api_payload()['IPData'], '10.0.0.0,255.255.255.0-10.0.1.0,255.255.255.0')
+
+    def test06_bill_plan_variants(self):
+        plan = BillPlan(name='p', plan_id='10', period_type='Monthly')
+        self.assertEqual(plan.api_payload('modify')['planid'], '10')
+        self.assertNotIn('planid', plan.api_payload())
+        self.assertEqual(plan.api_payload()['periodType'], 'Monthly')
+
+    def test07_pickle_keeps_tracking(self):
+        group = pickle.loads(pickle.dumps(self.group))
+        self.assertFalse(group.is_dirty)
+        group.ip.append(IPNetwork(u'10.0.1.0/24'))
+        self.assertTrue(group.is_dirty)
+        self.assertEqual(len(group.ip), 2)
+
+
+class TestSessionTracking(unittest.TestCase):
+
+    def setUp(self):
+        self.session = bench_session({})
+
+    def test01_clean_modify_skipped(self):
+        group = IPGroup(name='g')
+        group.mark_clean()
+        self.assertEqual(self.session.modify_ip_group(group), {'message': NFApi.UNCHANGED_MESSAGE})
+        plan = BillPlan(name='p')
+        plan.mark_clean()
+        self.assertEqual(self.session.modify_bill_plan(plan), {'message': NFApi.UNCHANGED_MESSAGE})
+
+    def test02_forced_modify_sent(self):
+        group = IPGroup(name='g')
+        group.mark_clean()
+        self.assertEqual(self.session.modify_ip_group(group, force=True), {'message': 'ok'})
+
+    def test03_push_marks_clean(self):
+        group = IPGroup(name='g')
+        group.speed = 5
+        self.session.modify_ip_group(group)
+        self.assertFalse(group.is_dirty)
+
+    def test04_failed_push_stays_dirty(self):
+        session = bench_session({NFApi.MODIFYIPGROUP_URI: {'error': {'code': 5000, 'message': 'Bad group'}}})
+        group = IPGroup(name='g')
+        group.speed = 5
+        session.modify_ip_group(group)
+        self.assertTrue(group.is_dirty)
+
+
+if __name__ == '__main__':
+    unittest.main()
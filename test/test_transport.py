@@ -0,0 +1,118 @@
+from manageengineapi import NFApi
+from manageengineapi.loadtest import StandInServer
+from manageengineapi.transport import Cassette, RecordingAdapter, ReplayAdapter, request_key, SCRUBBED
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def exchange(key, body, status=200, headers=()):
+    return {
+        'key': key,
+        'method': key.split()[0],
+        'url': 'http://nfa.invalid' + key.split()[1].split('?')[0],
+        'request_headers': [],
+        'status': status,
+        'reason': 'OK',
+        'headers': [list(h) for h in headers],
+        'body': {'text': body},
+        'elapsed': 0.01,
+    }
+
+
+class TestRequestKey(unittest.TestCase):
+
+    def test01_secrets_scrubbed_and_sorted(self):
+        key = request_key('get', 'http://a:8080/api/x?b=2&apiKey=secret&a=1', None)
+        self.assertEqual(key, 'GET /api/x?a=1&apiKey={0}&b=2|'.format(SCRUBBED))
+
+    def test02_host_and_volatile_fields_ignored(self):
+        first = request_key('POST', 'http://a/servlets/Settings/Serverlet', 'sid=0.1&EncryptPassword=pw')
+        second = request_key('POST', 'http://b/servlets/Settings/Serverlet', b'sid=0.2&EncryptPassword=other')
+        self.assertEqual(first, second)
+
+    def test03_jsessionid_scrubbed(self):
+        key = request_key('POST', 'http://a/j_security_check;jsessionid=ABC', 'j_password=pw')
+        self.assertNotIn('ABC', key)
+        self.assertNotIn('pw', key)
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        key = request_key('GET', 'http://a/api/json/nfaipgroup/listIPGroups?apiKey=k', None)
+        self.cassette = Cassette([exchange(key, '[]'), exchange(key, '[1]')])
+
+    def replay_session(self, **kwargs):
+        session = NFApi('nfa.invalid', 'k', 'u', 'p')
+        session.mount_transport(ReplayAdapter(self.cassette, **kwargs))
+        return session
+
+    def test01_successive_recordings_then_last_repeats(self):
+        request = self.replay_session().request
+        url = 'http://other/api/json/nfaipgroup/listIPGroups?apiKey=other'
+        self.assertEqual([request.get(url).text for _ in range(3)], ['[]', '[1]', '[1]'])
+
+    def test02_fallback_to_path(self):
+        request = self.replay_session().request
+        url = 'http://other/api/json/nfaipgroup/listIPGroups?apiKey=k&extra=1'
+        self.assertEqual(request.get(url).text, '[]')
+
+    def test03_strict_raises(self):
+        request = self.replay_session(strict=True).request
+        with self.assertRaises(LookupError):
+            request.get('http://other/api/json/nfaipgroup/listIPGroups?apiKey=k&extra=1')
+
+    def test04_cookies_from_recorded_headers(self):
+        key = request_key('GET', 'http://a/', None)
+        self.cassette = Cassette([exchange(key, '', headers=[('Set-Cookie', 'JSESSIONID=abc; Path=/')])])
+        response = self.replay_session().request.get('http://other/')
+        self.assertEqual(response.cookies['JSESSIONID'], 'abc')
+
+
+class TestRecordReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.server = StandInServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
+    def test01_record_save_load_replay(self):
+        recorder = RecordingAdapter()
+        live = NFApi(self.server.address, 'secret-key', 'user', 'secret-password')
+        live.mount_transport(recorder)
+        live.login()
+        self.assertTrue(live.logged_in)
+        groups = live.get_ip_groups()
+
+        path = os.path.join(self.tmp, 'nfa.cassette.json')
+        recorder.cassette.save(path)
+        with open(path) as f:
+            text = f.read()
+        for secret in ('secret-key', 'secret-password', 'NFA__SSO=standin'):
+            self.assertNotIn(secret, text)
+
+        #anyhost doesn't resolve, everything has to come from the cassette
+        requests_before = self.server.requests
+        replay = NFApi('anyhost', 'key', 'user', 'password')
+        replay.mount_transport(ReplayAdapter(Cassette.load(path)))
+        replay.login()
+        self.assertTrue(replay.logged_in)
+        self.assertEqual([g.name for g in replay.get_ip_groups()], [g.name for g in groups])
+        self.assertEqual(self.server.requests, requests_before)
+
+    def test02_unknown_format_rejected(self):
+        path = os.path.join(self.tmp, 'old.json')
+        with open(path, 'w') as f:
+            json.dump({'format': 0, 'exchanges': []}, f)
+        with self.assertRaises(ValueError):
+            Cassette.load(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
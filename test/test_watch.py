@@ -0,0 +1,129 @@
+from manageengineapi import IPGroup, IPNetwork, BillPlan
+from manageengineapi.watch import ConfigWatcher, EventLog, object_state
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def group(ID, name, speed=1000, *cidrs):
+    g = IPGroup(name=name, ID=ID, speed=speed)
+    for cidr in cidrs:
+        g.add_ip(IPNetwork(cidr))
+    return g
+
+
+class ConfigSession(object):
+    '''Lists whatever groups/plans the test put in, fails while broken is set.'''
+
+    def __init__(self, groups=(), plans=()):
+        self.groups = list(groups)
+        self.plans = list(plans)
+        self.broken = False
+
+    def get_ip_groups(self):
+        if self.broken:
+            raise ValueError('down')
+        return list(self.groups)
+
+    def get_bill_plans(self):
+        return list(self.plans)
+
+
+class TestConfigWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.session = ConfigSession([group(1, 'a', 1000, u'10.0.0.0/24'), group(2, 'b')],
+                                     [BillPlan(name='p', plan_id='7')])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test01_first_poll_is_baseline(self):
+        watcher = ConfigWatcher(self.session)
+        self.assertEqual(watcher.poll(), [])
+        initial = ConfigWatcher(self.session, emit_initial=True).poll()
+        self.assertEqual(sorted((e.kind, e.action, e.key) for e in initial),
+                         [('billplan', 'add', '7'), ('ipgroup', 'add', '1'), ('ipgroup', 'add', '2')])
+
+    def test02_add_modify_delete(self):
+        watcher = ConfigWatcher(self.session)
+        watcher.poll()
+        self.session.groups = [group(1, 'a', 2000, u'10.0.0.0/24', u'10.0.1.0/24'), group(3, 'c')]
+        events = dict((e.key, e) for e in watcher.poll())
+
+        self.assertEqual(sorted((e.action, k) for k, e in events.items()),
+                         [('add', '3'), ('delete', '2'), ('modify', '1')])
+        modified = events['1']
+        self.assertEqual(sorted(modified.changes), ['ip', 'speed'])
+        self.assertEqual(modified.changes['speed'], [1000, 2000])
+        self.assertEqual(modified.old.speed, 1000)
+        self.assertIsNone(events['2'].new)
+        self.assertEqual(events['2'].changes['name'], ['b', None])
+        self.assertEqual([e.sequence for e in sorted(events.values())], [1, 2, 3])
+
+        self.assertEqual(watcher.poll(), [])
+
+    def test03_same_object_not_diffed(self):
+        watcher = ConfigWatcher(self.session, kinds=('ipgroup',))
+        watcher.poll()
+        #Unchanged entries from the parse cache are the same objects
+        self.session.groups[0].speed = 5
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(object_state(self.session.groups[0])['speed'], 5)
+
+    def test04_subscribers_filtered_and_isolated(self):
+        watcher = ConfigWatcher(self.session, emit_initial=True)
+        plans, everything = [], []
+
+        def broken(event):
+            raise RuntimeError('subscriber bug')
+        watcher.subscribe(plans.append, kinds=('billplan',))
+        watcher.subscribe(broken)
+        token = watcher.subscribe(everything.append)
+        watcher.poll()
+        self.assertEqual([e.name for e in plans], ['p'])
+        self.assertEqual(len(everything), 3)
+        self.assertEqual(watcher.subscriber_errors, 3)
+
+        watcher.unsubscribe(token)
+        self.session.groups = []
+        watcher.poll()
+        self.assertEqual(len(everything), 3)
+
+    def test05_failed_fetch_keeps_baseline(self):
+        watcher = ConfigWatcher(self.session)
+        watcher.poll()
+        self.session.broken = True
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.errors, 1)
+        self.session.broken = False
+        self.assertEqual(watcher.poll(), [])
+
+    def test06_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            ConfigWatcher(self.session, kinds=('device',))
+
+    def test07_event_log_resume(self):
+        path = os.path.join(self.tmp, 'changes.jsonl')
+        watcher = ConfigWatcher(self.session, log=EventLog(path), emit_initial=True)
+        watcher.poll()
+        self.assertEqual([e['sequence'] for e in EventLog.read(path, after=1)], [2, 3])
+
+        #Crash mid-write, then a restarted watcher carries on numbering
+        with open(path, 'a') as f:
+            f.write('{"sequence": 4, "ki')
+        log = EventLog(path)
+        self.assertEqual(log.last_sequence, 3)
+        watcher = ConfigWatcher(self.session, log=log)
+        watcher.poll()
+        self.session.groups = []
+        events = watcher.poll()
+        self.assertEqual([e.sequence for e in events], [4, 5])
+        self.assertEqual([e['sequence'] for e in EventLog.read(path)], [1, 2, 3, 4, 5])
+        self.assertEqual(list(EventLog.read(path))[-1]['changes']['name'][0], 'b')
+
+
+if __name__ == '__main__':
+    unittest.main()
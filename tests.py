@@ -95,12 +95,9 @@ class TestNFApi(unittest.TestCase):
     def test04_modify_bill_plan(self):
 
         #Modify API endpoint requires a plan ID which is not returned to us when
-        #creating the bill plan. Have to query for all then select which bill
-        #plan is ours. 
-        bps = self.session.get_bill_plans()
-        for bp in bps:
-            if bp.name == self.bp.name:
-                mod_bp = bp
+        #creating the bill plan. add_bill_plan reads it back and registers the plan.
+        mod_bp = self.session.get_bill_plan(self.bp.name)
+        self.assertTrue(mod_bp.plan_id)
 
         #Add all known IP groups to bill plan
         mod_bp.ipg_id = ','.join([str(i.ID) for i in self.session.get_ip_groups()])
@@ -116,10 +113,7 @@ class TestNFApi(unittest.TestCase):
     def test06_delete_bill_plan(self):
 
         #Grab unit test bill plan
-        all_bps = self.session.get_bill_plans()
-        for bp in all_bps:
-            if bp.name == 'Unit Test Bill Plan':
-                test_bp = bp
+        test_bp = self.session.get_bill_plan('Unit Test Bill Plan')
         
         #Delete unit test plan
         resp = self.session.delete_bill_plan(test_bp)